@@ -0,0 +1,235 @@
+"""
+Write-behind queue between the packet sniffer and the market database.
+"""
+import sys
+import os
+import threading
+import logging
+from collections import deque
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.constants import INGEST_QUEUE_SIZE, INGEST_FLUSH_INTERVAL, INGEST_BACKPRESSURE, SNAPSHOT_REFRESH_INTERVAL
+from shared.order_book import to_ladder
+from shared.database import now_ms
+
+BACKPRESSURE_POLICIES = ("drop_oldest", "block")
+
+
+class IngestQueue:
+    """
+    Bounded queue of parsed orders drained by a dedicated writer thread.
+
+    The sniff thread only appends to the queue. The writer wakes up once per
+    flush window, groups everything queued by (location, side) and hands each
+    group to MarketDatabase.apply_orders, which keeps the best price per item.
+    Order book levels are kept per item, a newer page replaces a queued one,
+    and are only packed into ladders by the writer. When a price snapshot is
+    given, the writer refreshes it after every flush, and once per
+    SNAPSHOT_REFRESH_INTERVAL while idle so writes of other processes and
+    deletions show up too.
+
+    The price history is given every observed price, including the orders
+    the collector left out of the database write because they could not
+    change it, so its OHLC buckets see each page that was received.
+    """
+
+    def __init__(self, db, max_size=INGEST_QUEUE_SIZE, flush_interval=INGEST_FLUSH_INTERVAL,
+                 backpressure=INGEST_BACKPRESSURE, history=None, snapshot=None, on_written=None):
+        """
+        Initialize the queue and start the writer thread.
+
+        Args:
+            db: MarketDatabase used by the writer thread
+            max_size: Maximum number of queued orders
+            flush_interval: Seconds to collect orders before writing them
+            backpressure: "drop_oldest" to discard old orders when full,
+                "block" to make producers wait for free space
+            history: Optional PriceHistory that records the best observed price
+                per item of every flush
+            snapshot: Optional SnapshotWriter kept in sync with the database
+            on_written: Optional function called by the writer thread with
+                (location, side, orders, epoch ms) after orders were written,
+                such as PageDeduplicator.mark_applied
+        """
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+
+        self.db = db
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.backpressure = backpressure
+        self.history = history
+        self.snapshot = snapshot
+        self.on_written = on_written
+        self.stats = {
+            "enqueued": 0,   # orders accepted by put()
+            "dropped": 0,    # orders discarded because the queue was full
+            "written": 0,    # distinct items passed to the database
+            "coalesced": 0,  # orders merged into another order for the same item
+            "batches": 0,    # flushes performed by the writer
+            "ladders": 0,    # order book ladders written
+            "snapshot_rows": 0,  # price rows copied into the snapshot
+            "errors": 0,     # failed database writes
+        }
+
+        self._items = deque()
+        self._ladders = {}
+        self._observed = {}
+        self._cond = threading.Condition()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="IngestWriter", daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self):
+        """Number of orders currently waiting to be written."""
+        return len(self._items)
+
+    def put(self, location, side, orders, levels=None, observed=None):
+        """
+        Queue the orders of one packet.
+
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            side: Either "sell" or "buy"
+            orders: List of (item_id, price, quality, enchant) tuples to write
+            levels: Optional dict of (item_id, quality, enchant) -> order book levels
+                from shared.order_book.group_levels
+            observed: Optional list of every (item_id, price, quality, enchant)
+                order of the packet for the price history, defaults to orders
+        """
+        with self._cond:
+            if levels:
+                self._ladders.setdefault((location, side), {}).update(levels)
+            if self.history is not None:
+                best = self._observed.setdefault((location, side), {})
+                for item_id, price, quality, enchant in (orders if observed is None else observed):
+                    key = (item_id, quality, enchant)
+                    current = best.get(key)
+                    if current is None or (price < current if side == "sell" else price > current):
+                        best[key] = price
+            for item_id, price, quality, enchant in orders:
+                if len(self._items) >= self.max_size:
+                    if self.backpressure == "block" and not self._stopping.is_set():
+                        # Wake the writer before waiting for it to make room
+                        self._cond.notify_all()
+                        while len(self._items) >= self.max_size and not self._stopping.is_set():
+                            self._cond.wait()
+                    else:
+                        self._items.popleft()
+                        self.stats["dropped"] += 1
+                self._items.append((location, side, item_id, price, quality, enchant))
+                self.stats["enqueued"] += 1
+            self._cond.notify_all()
+
+    def flush(self):
+        """
+        Write everything currently queued.
+
+        Returns:
+            Number of distinct items written
+        """
+        with self._cond:
+            batch = list(self._items)
+            self._items.clear()
+            ladders, self._ladders = self._ladders, {}
+            observed, self._observed = self._observed, {}
+            self._cond.notify_all()
+
+        for (location, side), page in ladders.items():
+            try:
+                page = {key: to_ladder(rows, side) for key, rows in page.items()}
+                self.stats["ladders"] += self.db.replace_ladders(location, side, page)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Writing {len(page)} {side} ladders for {location}: {str(e)}", exc_info=True)
+
+        for (location, side), best in observed.items():
+            try:
+                self.history.record(location, side, [(item_id, price, quality, enchant)
+                                                     for (item_id, quality, enchant), price in best.items()])
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Recording price history for {location}: {str(e)}", exc_info=True)
+
+        if not batch:
+            return 0
+
+        groups = {}
+        for location, side, item_id, price, quality, enchant in batch:
+            groups.setdefault((location, side), []).append((item_id, price, quality, enchant))
+
+        written = 0
+        for (location, side), orders in groups.items():
+            try:
+                written += self.db.apply_orders(location, side, orders)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Writing {len(orders)} {side} orders for {location}: {str(e)}", exc_info=True)
+                continue
+            if self.on_written is not None:
+                self.on_written(location, side, orders, now_ms())
+
+        self._refresh_snapshot()
+        self.stats["batches"] += 1
+        self.stats["written"] += written
+        self.stats["coalesced"] += len(batch) - written
+        logger.debug(f"Flushed {len(batch)} orders as {written} items, {self.depth} still queued")
+        return written
+
+    def _refresh_snapshot(self):
+        """Copy the rows changed in the database into the price snapshot."""
+        if self.snapshot is None:
+            return
+        try:
+            self.stats["snapshot_rows"] += self.snapshot.refresh()
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Refreshing the price snapshot: {str(e)}", exc_info=True)
+
+    def _pending(self):
+        """Whether orders, ladders or history prices are waiting for the writer."""
+        return bool(self._items or self._ladders or self._observed)
+
+    def _run(self):
+        """Writer thread loop."""
+        idle_timeout = SNAPSHOT_REFRESH_INTERVAL if self.snapshot is not None else None
+        while not self._stopping.is_set():
+            with self._cond:
+                while not self._pending() and not self._stopping.is_set():
+                    if not self._cond.wait(idle_timeout):
+                        break
+            if not self._pending() and not self._stopping.is_set():
+                self._refresh_snapshot()
+                continue
+
+            # Give the sniffer a flush window to queue more orders for the same items,
+            # cut short when the queue fills up so blocked producers wait for one write only
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopping.is_set() or len(self._items) >= self.max_size,
+                                    self.flush_interval)
+            self.flush()
+
+    def stop(self, timeout=None):
+        """
+        Stop the writer thread after writing the remaining orders.
+
+        Args:
+            timeout: Optional number of seconds to wait for the writer thread
+        """
+        self._stopping.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self.flush()
+        logger.info(f"Ingest queue stopped: {self.stats}")
@@ -3,6 +3,7 @@ Main entry point for the Albion Online market data collector.
 """
 import sys
 import os
+import argparse
 import logging
 
 # Set up logging
@@ -18,22 +19,54 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from network import photon
 from collector.market_collector import MarketCollector
+from collector.pcap_import import import_pcaps
+from shared.constants import CAPTURE_BACKEND, DATABASE_PATH
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Albion Online market data collector")
+    parser.add_argument("--record", metavar="PATH",
+                        help="also record raw UDP payloads to a capture file for collector/replay.py")
+    parser.add_argument("--backend", default=CAPTURE_BACKEND,
+                        help="capture backend: auto (default), raw, scapy or a .pcap file to read")
+
+    commands = parser.add_subparsers(dest="command")
+    import_pcap = commands.add_parser("import-pcap", help="import pcap files captured earlier, e.g. with tcpdump")
+    import_pcap.add_argument("paths", nargs="+", metavar="PCAP",
+                             help="pcap files, in capture order when a session spans several files")
+    import_pcap.add_argument("--workers", type=int, default=None,
+                             help="number of parser processes (default: number of CPUs)")
+    import_pcap.add_argument("--db", default=DATABASE_PATH, help="market database to write to")
+    return parser.parse_args()
+
+def run_import(args):
+    """Import pcap files into the market database."""
+    stats = import_pcaps(args.paths, workers=args.workers, db_path=args.db)
+    logger.info(
+        f"Imported {stats['packets']} packets from {stats['flows']} flows in {stats['seconds']:.1f}s: "
+        f"{stats['orders']} orders, {stats['written']} items written"
+    )
+    if stats["orders_without_location"]:
+        logger.warning(f"Skipped {stats['orders_without_location']} orders seen before a location change in their flow")
 
 def main():
     """Main entry point for the data collector application."""
+    args = parse_args()
+    if args.command == "import-pcap":
+        run_import(args)
+        return
+
     logger.info("Starting Albion Online Market Data Collector")
     logger.info("Please zone to another map before start collecting data")
-    logger.info("All data will be saved to Market.db database with separate tables per location")
+    logger.info("All data will be saved to the market_prices table of the Market.db database")
     
     # Create the collector instance
     collector = MarketCollector()
     
     # Set up the photon packet handlers
     logger.info("Setting up photon packet handlers")
-    p = photon.Photon()
-    p.map_request(75, collector.process_sell_orders)  # Sell order packets
-    p.map_request(76, collector.process_buy_orders)   # Buy order packets
-    p.map_request(2, lambda params: collector.set_player_location(params[8]))  # Location update packets
+    p = photon.Photon(record_path=args.record, backend=args.backend)
+    collector.attach(p)
     
     logger.info("Collector is running")
     try:
@@ -41,6 +74,7 @@ def main():
     except KeyboardInterrupt:
         logger.info("Collector stopped by user")
     finally:
+        p.stop()
         collector.close()
         logger.info("Collector has been stopped")
 
@@ -2,7 +2,6 @@
 Core functionality for collecting market data from Albion Online.
 """
 import json
-import pandas as pd
 from datetime import datetime, timezone
 import sys
 import os
@@ -20,8 +19,14 @@ logging.basicConfig(
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from shared.database import MarketDatabase
-from shared.constants import LOCATIONS
+from shared.database import MarketDatabase, now_ms
+from shared.price_history import PriceHistory
+from shared.order_book import group_levels, parse_expires
+from collector.ingest_queue import IngestQueue
+from collector.page_dedup import PageDeduplicator
+from shared.item_catalog import get_item_catalog
+from shared.price_snapshot import SnapshotWriter
+from shared.constants import LOCATIONS, DATABASE_PATH, DATABASE_AVG_PATH, PRICE_SNAPSHOT_PATH
 
 class MarketCollector:
     """
@@ -29,14 +34,41 @@ class MarketCollector:
     Uses photon networking interception to gather market orders.
     """
     
-    def __init__(self):
-        """Initialize the market data collector."""
+    def __init__(self, db_path=DATABASE_PATH, history_path=DATABASE_AVG_PATH, snapshot_path=PRICE_SNAPSHOT_PATH):
+        """
+        Initialize the market data collector.
+        
+        Args:
+            db_path: Path of the market database
+            history_path: Path of the price history database
+            snapshot_path: Path of the live price snapshot read by the market app, empty to disable it
+        """
         logger.info("Initializing MarketCollector")
-        self.db = MarketDatabase()
+        self.db = MarketDatabase(db_path)
+        self.history = PriceHistory(history_path)
+        self.history.start_compaction()
+        self.snapshot = None
+        if snapshot_path:
+            try:
+                self.snapshot = SnapshotWriter(self.db, get_item_catalog(), snapshot_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Price snapshot {snapshot_path} unavailable, the market app will read SQLite: {str(e)}")
+        self.dedup = PageDeduplicator()
+        self.queue = IngestQueue(self.db, history=self.history, snapshot=self.snapshot,
+                                 on_written=self.dedup.mark_applied)
         self.player_location = None
         self.location_name = None
-        self.items_info = pd.read_csv("shared/items.csv")
-        logger.debug(f"Loaded {len(self.items_info)} items from items.csv")
+    
+    def attach(self, photon):
+        """
+        Register the collector's packet handlers on a Photon instance.
+        
+        Args:
+            photon: The network.photon.Photon packet handler
+        """
+        photon.map_request(75, self.process_sell_orders)  # Sell order packets
+        photon.map_request(76, self.process_buy_orders)   # Buy order packets
+        photon.map_request(2, lambda params: self.set_player_location(params[8]))  # Location update packets
     
     def set_player_location(self, location_code):
         """
@@ -49,13 +81,12 @@ class MarketCollector:
         self.location_name = None if location_code not in LOCATIONS else LOCATIONS[location_code]
         
         if self.location_name:
-            # Create the table for this location if it doesn't exist
-            self.db.ensure_table_exists(self.location_name)
             logger.info(f"Update player location: {self.player_location} ({self.location_name})")
         else:
             logger.info(f"Update player location: {self.player_location} (Unknown location)")
     
-    def parse_order(self, data: Union[List[str], Dict, Any]) -> List[Tuple[str, int, int, int]]:
+    @staticmethod
+    def parse_order(data: Union[List[str], Dict, Any]) -> List[Tuple[str, int, int, int]]:
         """
         Parse order data from the network packets.
         
@@ -65,6 +96,20 @@ class MarketCollector:
         Returns:
             List of tuples containing (item_id, price, quality, enchant)
         """
+        return [record[:4] for record in MarketCollector.parse_order_depth(data)]
+    
+    @staticmethod
+    def parse_order_depth(data: Union[List[str], Dict, Any]) -> List[Tuple[str, float, int, int, int, int, int]]:
+        """
+        Parse order data from the network packets, keeping the order book details.
+        
+        Args:
+            data: Order data in various formats (list, dict, or single item)
+            
+        Returns:
+            List of tuples containing (item_id, price, quality, enchant, amount,
+            expires, order_id), expires in epoch milliseconds
+        """
         result = []
         
         # Debug logging to understand data structure
@@ -81,7 +126,10 @@ class MarketCollector:
                         price = item.get("UnitPriceSilver") / 10000
                         quality = item.get("QualityLevel", 0)
                         enchant = item.get("EnchantmentLevel", 0)
-                        result.append((item_id, price, quality, enchant))
+                        amount = item.get("Amount", 0)
+                        expires = parse_expires(item.get("Expires"))
+                        order_id = item.get("Id", 0)
+                        result.append((item_id, price, quality, enchant, amount, expires, order_id))
                     else:
                         logger.warning(f"Unexpected item format: {item}")
                         print(f"[WARN] Unexpected item format: {item}")
@@ -104,17 +152,31 @@ class MarketCollector:
             return
         
         try:
-            # Extract order data from parameters
-            orders = self.parse_order(parameters[0])
+            # Drop pages the game re-sent while scrolling before decoding them
+            now = now_ms()
+            digest = self.dedup.digest(parameters[0])
+            count = len(parameters[0]) if isinstance(parameters[0], list) else 0
+            if self.dedup.is_duplicate(self.location_name, "sell", digest, count, now):
+                # The prices were seen again, so they still go to the price history
+                self.queue.put(self.location_name, "sell", [],
+                               observed=self.dedup.page_orders(self.location_name, "sell", digest))
+                logger.debug(f"SELL_ORDER: Skipped duplicate page of {count} orders")
+                return
             
-            if not orders:
+            # Extract order data from parameters, keeping the full depth of the page
+            records = self.parse_order_depth(parameters[0])
+            
+            if not records:
                 logger.debug("SELL_ORDER: No valid orders to process")
                 return
-                
-            for item_id, price, quality, enchant in orders:
-                self.db.update_sell_order(self.location_name, item_id, quality, enchant, price)
             
-            logger.info(f"[{self.player_location}] SELL_ORDER: Processed {len(orders)} orders")
+            levels = group_levels(records)
+            observed = [record[:4] for record in records]
+            self.dedup.remember_page(self.location_name, "sell", digest, observed, now)
+            orders = self.dedup.changed_orders(self.location_name, "sell", observed, now)
+            self.queue.put(self.location_name, "sell", orders, levels, observed)
+            
+            logger.info(f"[{self.player_location}] SELL_ORDER: Queued {len(orders)} of {len(records)} orders (queue depth {self.queue.depth})")
         except Exception as e:
             logger.error(f"Processing sell orders: {str(e)}", exc_info=True)
     
@@ -130,22 +192,43 @@ class MarketCollector:
             return
         
         try:
-            # Extract order data from parameters
-            orders = self.parse_order(parameters[0])
+            # Drop pages the game re-sent while scrolling before decoding them
+            now = now_ms()
+            digest = self.dedup.digest(parameters[0])
+            count = len(parameters[0]) if isinstance(parameters[0], list) else 0
+            if self.dedup.is_duplicate(self.location_name, "buy", digest, count, now):
+                # The prices were seen again, so they still go to the price history
+                self.queue.put(self.location_name, "buy", [],
+                               observed=self.dedup.page_orders(self.location_name, "buy", digest))
+                logger.debug(f"BUY_ORDER: Skipped duplicate page of {count} orders")
+                return
             
-            if not orders:
+            # Extract order data from parameters, keeping the full depth of the page
+            records = self.parse_order_depth(parameters[0])
+            
+            if not records:
                 logger.debug("BUY_ORDER: No valid orders to process")
                 return
-                
-            for item_id, price, quality, enchant in orders:
-                self.db.update_buy_order(self.location_name, item_id, quality, enchant, price)
             
-            logger.info(f"[{self.player_location}] BUY_ORDER: Processed {len(orders)} orders")
+            levels = group_levels(records)
+            observed = [record[:4] for record in records]
+            self.dedup.remember_page(self.location_name, "buy", digest, observed, now)
+            orders = self.dedup.changed_orders(self.location_name, "buy", observed, now)
+            self.queue.put(self.location_name, "buy", orders, levels, observed)
+            
+            logger.info(f"[{self.player_location}] BUY_ORDER: Queued {len(orders)} of {len(records)} orders (queue depth {self.queue.depth})")
         except Exception as e:
             logger.error(f"Processing buy orders: {str(e)}", exc_info=True)
     
     def close(self):
-        """Close the database connection."""
+        """Write any queued orders and close the database connection."""
+        if self.queue:
+            self.queue.stop()
+        if self.snapshot:
+            self.snapshot.close()
+        logger.info(f"Duplicate suppression: {self.dedup.stats}")
         logger.info("Closing database connection")
+        if self.history:
+            self.history.close()
         if self.db:
             self.db.close()
\ No newline at end of file
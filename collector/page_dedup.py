@@ -0,0 +1,237 @@
+"""
+Suppression of repeated order pages and order updates that cannot change the database.
+"""
+import sys
+import os
+import threading
+import logging
+from collections import OrderedDict
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.constants import DEDUP_WINDOW_SECONDS, PAGE_DIGEST_CACHE_SIZE, APPLIED_PRICE_CACHE_SIZE
+
+
+class PageDeduplicator:
+    """
+    Remembers recently seen order pages and the last price applied per item.
+
+    Applied prices are only recorded by mark_applied(), which the ingest
+    queue calls once the orders were written. Orders the queue dropped or
+    failed to write are therefore not suppressed when the game sends them
+    again.
+
+    Scrolling the market UI makes the game send the same pages again and
+    again. A page is a duplicate when the same payload was seen for the same
+    location and side within the window, no other page replaced the order
+    book of its items since, and none of its prices is better than the last
+    price applied for its item. Duplicates are dropped before their JSON is
+    decoded, but the orders remembered with the page can still be given to
+    the price history with page_orders().
+
+    For other pages, an order is unchanged when it is not better than the
+    last price applied for its item within the window. The database would
+    keep its current price and timestamp for such an order, so it is not
+    queued. Both caches are bounded LRUs, and entries older than the window
+    are ignored, so a stale price in the database is refreshed at most one
+    window later than without the cache. The sniff thread and the writer
+    thread of the ingest queue may use the caches at the same time.
+    """
+
+    def __init__(self, window_seconds=DEDUP_WINDOW_SECONDS, page_cache_size=PAGE_DIGEST_CACHE_SIZE,
+                 price_cache_size=APPLIED_PRICE_CACHE_SIZE):
+        """
+        Initialize empty caches.
+
+        Args:
+            window_seconds: Seconds a remembered page or price stays valid, 0 to disable
+            page_cache_size: Page digests remembered per location and side
+            price_cache_size: Item prices remembered over all locations and sides
+        """
+        self.window_ms = int(window_seconds * 1000)
+        self.page_cache_size = page_cache_size
+        self.price_cache_size = price_cache_size
+        self.stats = {
+            "pages": 0,             # order pages seen
+            "duplicate_pages": 0,   # pages dropped before parsing
+            "orders": 0,            # orders seen, including those in duplicate pages
+            "skipped_orders": 0,    # orders in duplicate pages
+            "unchanged_orders": 0,  # parsed orders that would not change the database
+        }
+        self._pages = {}
+        self._applied = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(data):
+        """
+        Fingerprint the raw order list of a packet.
+
+        Args:
+            data: Order data as received, normally a list of JSON strings
+
+        Returns:
+            Integer digest, or None if the payload is not a list of strings
+        """
+        if not isinstance(data, list) or not all(isinstance(item, str) for item in data):
+            return None
+        return hash(tuple(data))
+
+    def is_duplicate(self, location, side, digest, count, now):
+        """
+        Check whether a page can be dropped, counting it either way.
+
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            side: Either "sell" or "buy"
+            digest: Page digest from digest(), None if unknown
+            count: Number of orders in the page
+            now: Current time in epoch milliseconds
+
+        Returns:
+            True if the page is a recent repeat whose items were not overwritten since
+        """
+        with self._lock:
+            self.stats["pages"] += 1
+            self.stats["orders"] += count
+            if digest is None or not self.window_ms:
+                return False
+
+            pages = self._pages.get((location, side))
+            seen = pages.get(digest) if pages else None
+            if seen is None:
+                return False
+            best, seen_at, _ = seen
+            if now - seen_at > self.window_ms:
+                return False
+            for key, price in best.items():
+                entry = self._applied.get((location, side) + key)
+                if entry is None or entry[2] != digest or not self._unchanged(entry, side, price, now):
+                    return False
+
+            pages.move_to_end(digest)
+            self.stats["duplicate_pages"] += 1
+            self.stats["skipped_orders"] += count
+            return True
+
+    def remember_page(self, location, side, digest, orders, now):
+        """
+        Record a processed page and make it the owner of its items' order books.
+
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            side: Either "sell" or "buy"
+            digest: Page digest from digest(), None if unknown
+            orders: List of (item_id, price, quality, enchant) tuples in the page
+            now: Current time in epoch milliseconds
+        """
+        if digest is None or not self.window_ms:
+            return
+
+        orders = tuple(orders)
+        best = {}
+        for item_id, price, quality, enchant in orders:
+            key = (item_id, quality, enchant)
+            current = best.get(key)
+            if current is None or (price < current if side == "sell" else price > current):
+                best[key] = price
+
+        with self._lock:
+            for key in best:
+                entry = self._entry((location, side) + key)
+                entry[2] = digest
+
+            pages = self._pages.setdefault((location, side), OrderedDict())
+            pages[digest] = (best, now, orders)
+            pages.move_to_end(digest)
+            if len(pages) > self.page_cache_size:
+                pages.popitem(last=False)
+
+    def page_orders(self, location, side, digest):
+        """
+        Get the orders of a remembered page, such as one is_duplicate() dropped.
+
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            side: Either "sell" or "buy"
+            digest: Page digest from digest()
+
+        Returns:
+            Tuple of (item_id, price, quality, enchant) tuples, empty if the page is not remembered
+        """
+        with self._lock:
+            pages = self._pages.get((location, side))
+            seen = pages.get(digest) if pages else None
+            return seen[2] if seen is not None else ()
+
+    def changed_orders(self, location, side, orders, now):
+        """
+        Keep only the orders that could change the stored best price.
+
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            side: Either "sell" or "buy"
+            orders: List of (item_id, price, quality, enchant) tuples
+            now: Current time in epoch milliseconds
+
+        Returns:
+            List of the orders that improve on, or refresh, the last applied price
+        """
+        if not self.window_ms:
+            return orders
+
+        changed = []
+        with self._lock:
+            for order in orders:
+                item_id, price, quality, enchant = order
+                entry = self._applied.get((location, side, item_id, quality, enchant))
+                if entry is not None and self._unchanged(entry, side, price, now):
+                    self.stats["unchanged_orders"] += 1
+                    continue
+                changed.append(order)
+        return changed
+
+    def mark_applied(self, location, side, orders, now):
+        """
+        Remember the prices of orders written to the database.
+
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            side: Either "sell" or "buy"
+            orders: List of (item_id, price, quality, enchant) tuples that were written
+            now: Time of the write in epoch milliseconds
+        """
+        if not self.window_ms:
+            return
+
+        with self._lock:
+            for item_id, price, quality, enchant in orders:
+                entry = self._entry((location, side, item_id, quality, enchant))
+                if not self._unchanged(entry, side, price, now):
+                    entry[0], entry[1] = price, now
+
+    def _unchanged(self, entry, side, price, now):
+        """Whether a price is not better than the applied price of an entry within the window."""
+        last_price, applied_at = entry[0], entry[1]
+        return (last_price is not None and now - applied_at <= self.window_ms
+                and not (price < last_price if side == "sell" else price > last_price))
+
+    def _entry(self, key):
+        """Get or create the [price, applied_ms, page digest] entry of an item, called with the lock held."""
+        entry = self._applied.get(key)
+        if entry is None:
+            entry = self._applied[key] = [None, 0, None]
+            if len(self._applied) > self.price_cache_size:
+                self._applied.popitem(last=False)
+        else:
+            self._applied.move_to_end(key)
+        return entry
@@ -0,0 +1,208 @@
+"""
+Offline import of pcap captures into the market database.
+
+Usage:
+    python collector/main.py import-pcap session.pcap [more.pcap ...] [--workers N]
+
+UDP flows are sharded across a process pool. Every worker scans all files in
+order but only parses the flows of its shard, each with its own Photon parser
+and current location, so location changes stay ordered within a flow and
+fragmented messages are reassembled as in a live capture. Every order keeps
+the capture time of its packet. The main process sorts the orders of all
+shards by capture time and writes them through MarketDatabase.apply_orders,
+which applies the best price and staleness rules in that order, so stored
+prices keep the time they were seen and an old capture never overwrites
+fresher prices.
+"""
+import sys
+import os
+import time
+import zlib
+import itertools
+import logging
+from multiprocessing import Pool
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from photon_packet_parser import PhotonPacketParser
+from network.capture import PcapFileBackend
+from collector.market_collector import MarketCollector
+from shared.database import MarketDatabase
+from shared.constants import LOCATIONS, DATABASE_PATH
+
+# Photon request codes handled by the collector
+REQUEST_SELL_ORDERS = 75
+REQUEST_BUY_ORDERS = 76
+REQUEST_JOIN_LOCATION = 2
+ORDER_REQUESTS = {REQUEST_SELL_ORDERS: "sell", REQUEST_BUY_ORDERS: "buy"}
+
+
+def flow_key(src, src_port, dst, dst_port):
+    """
+    Build a direction-independent key for a UDP flow.
+
+    Args:
+        src: Source address bytes
+        src_port: Source port
+        dst: Destination address bytes
+        dst_port: Destination port
+
+    Returns:
+        Bytes identifying both directions of the flow
+    """
+    a = bytes(src) + src_port.to_bytes(2, "big")
+    b = bytes(dst) + dst_port.to_bytes(2, "big")
+    return a + b if a < b else b + a
+
+
+def flow_shard(key, shards):
+    """Stable shard number of a flow, identical in every worker process."""
+    return zlib.crc32(key) % shards
+
+
+class FlowState:
+    """Photon parser and current location of one UDP flow."""
+
+    def __init__(self, result, stats):
+        """
+        Args:
+            result: Shared dict of (location, side) -> list of
+                (item_id, price, quality, enchant, seen_ms) orders in capture order
+            stats: Shared dict of worker counters
+        """
+        self.location = None
+        self.timestamp = 0
+        self.result = result
+        self.stats = stats
+        self.parser = PhotonPacketParser(self.on_event, self.on_request, self.on_response)
+
+    def on_request(self, data):
+        params = data.parameters
+        request_id = params.get(253)
+        if request_id == REQUEST_JOIN_LOCATION and 8 in params:
+            self.location = LOCATIONS.get(params[8])
+            self.stats["location_changes"] += 1
+        elif request_id in ORDER_REQUESTS:
+            side = ORDER_REQUESTS[request_id]
+            orders = MarketCollector.parse_order(params.get(0))
+            if self.location is None:
+                self.stats["orders_without_location"] += len(orders)
+                return
+            self.stats["orders"] += len(orders)
+            self.result.setdefault((self.location, side), []).extend(
+                order + (self.timestamp,) for order in orders)
+
+    def on_event(self, data):
+        pass
+
+    def on_response(self, data):
+        pass
+
+
+def parse_shard(paths, shard, shards):
+    """
+    Parse the flows of one shard from a series of pcap files.
+
+    Args:
+        paths: pcap files in capture order
+        shard: Shard number handled by this worker
+        shards: Total number of shards
+
+    Returns:
+        Tuple of (orders with their capture time by (location, side), counters)
+    """
+    result = {}
+    stats = {"packets": 0, "flows": 0, "orders": 0, "orders_without_location": 0,
+             "location_changes": 0, "parse_errors": 0}
+    flows = {}
+    for path in paths:
+        for (src, src_port, dst, dst_port, payload), ts in PcapFileBackend(path).datagrams():
+            key = flow_key(src, src_port, dst, dst_port)
+            flow = flows.get(key)
+            if flow is None:
+                if flow_shard(key, shards) != shard:
+                    flows[key] = False
+                    continue
+                flow = flows[key] = FlowState(result, stats)
+                stats["flows"] += 1
+            elif flow is False:
+                continue
+
+            stats["packets"] += 1
+            flow.timestamp = int(ts * 1000)
+            try:
+                flow.parser.HandlePayload(bytes(payload))
+            except Exception:
+                stats["parse_errors"] += 1
+    return result, stats
+
+
+def _parse_shard_task(args):
+    """Pool entry point unpacking the parse_shard arguments."""
+    return parse_shard(*args)
+
+
+def import_pcaps(paths, workers=None, db_path=DATABASE_PATH):
+    """
+    Import pcap files into the market database.
+
+    Args:
+        paths: pcap files, in capture order when a session spans several files
+        workers: Number of worker processes, defaults to the number of CPUs
+        db_path: Market database to write to
+
+    Returns:
+        Dict of counters summed over all workers, plus items written and elapsed seconds
+    """
+    for path in paths:
+        PcapFileBackend(path)  # fail early on unreadable or non-pcap files
+
+    workers = max(1, workers or os.cpu_count() or 1)
+    start = time.perf_counter()
+    logger.info(f"Importing {len(paths)} capture file(s) with {workers} worker(s)")
+
+    merged = {}
+    totals = {}
+    tasks = [(list(paths), shard, workers) for shard in range(workers)]
+    if workers == 1:
+        results = map(_parse_shard_task, tasks)
+    else:
+        pool = Pool(workers)
+        results = pool.imap_unordered(_parse_shard_task, tasks)
+
+    try:
+        for result, stats in results:
+            for name, value in stats.items():
+                totals[name] = totals.get(name, 0) + value
+            for location_side, orders in result.items():
+                merged.setdefault(location_side, []).append(orders)
+    finally:
+        if workers > 1:
+            pool.close()
+            pool.join()
+
+    db = MarketDatabase(db_path)
+    written = 0
+    try:
+        for (location, side), shards in merged.items():
+            # Files may overlap in time, so sort rather than merge the shards.
+            # Orders seen in the same millisecond give the same result in any order.
+            orders = sorted(itertools.chain.from_iterable(shards), key=lambda order: order[4])
+            items = db.apply_orders(location, side, orders)
+            written += items
+            logger.info(f"[{location}] {side.upper()}_ORDER: Imported {len(orders)} orders of {items} items")
+    finally:
+        db.close()
+
+    totals["written"] = written
+    totals["seconds"] = time.perf_counter() - start
+    return totals
@@ -0,0 +1,170 @@
+"""
+Replay a recorded capture through the packet parser and market collector.
+
+Usage:
+    python collector/replay.py capture.lcap [--speed 1.0] [--db replay.db]
+
+Records are made with `python collector/main.py --record capture.lcap`.
+A speed of 0 replays as fast as possible, 1.0 at the original pace.
+"""
+import sys
+import os
+import time
+import argparse
+import tempfile
+import logging
+from collections import defaultdict
+import numpy as np
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from network import photon
+from network.capture_file import CaptureReader
+from collector.market_collector import MarketCollector
+
+
+class StageTimer:
+    """Collects per-call latencies of wrapped functions, grouped by stage name."""
+
+    def __init__(self):
+        """Initialize empty timings."""
+        self.samples = defaultdict(list)
+
+    def wrap(self, stage, func):
+        """
+        Wrap a function so each call's duration is recorded under a stage.
+
+        Args:
+            stage: Stage name used in the report
+            func: Function to wrap
+
+        Returns:
+            The wrapping function
+        """
+        samples = self.samples[stage]
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                samples.append(time.perf_counter() - start)
+        return timed
+
+    def report(self):
+        """
+        Summarize the collected latencies.
+
+        Returns:
+            List of (stage, calls, p50, p90, p99, max) with times in milliseconds
+        """
+        rows = []
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+            ms = np.array(samples) * 1000
+            p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+            rows.append((stage, len(ms), p50, p90, p99, ms.max()))
+        return rows
+
+
+def replay(capture_path, speed=0.0, db_path=None):
+    """
+    Feed a capture file through Photon and MarketCollector.
+
+    Args:
+        capture_path: Path of the capture file
+        speed: Replay speed factor, 0 for maximum speed
+        db_path: Market database to write to, a temporary file by default
+
+    Returns:
+        Dict with packet, order and timing statistics
+    """
+    workdir = None
+    if db_path is None:
+        workdir = tempfile.mkdtemp(prefix="replay-")
+        db_path = os.path.join(workdir, "Market.db")
+    history_path = os.path.join(os.path.dirname(os.path.abspath(db_path)), "Average.replay.db")
+    snapshot_path = os.path.join(os.path.dirname(os.path.abspath(db_path)), "Market.replay.snapshot")
+
+    collector = MarketCollector(db_path=db_path, history_path=history_path, snapshot_path=snapshot_path)
+    # Never drop orders, a replay must write the same data every run
+    collector.queue.backpressure = "block"
+    p = photon.Photon(sniff=False)
+
+    # Instrument every ingest stage before the handlers are registered
+    timer = StageTimer()
+    collector.parse_order_depth = timer.wrap("parse_order", collector.parse_order_depth)
+    collector.queue.put = timer.wrap("enqueue", collector.queue.put)
+    collector.db.apply_orders = timer.wrap("db_write", collector.db.apply_orders)
+    collector.db.replace_ladders = timer.wrap("ladder_write", collector.db.replace_ladders)
+    collector.history.record = timer.wrap("history_write", collector.history.record)
+    collector.attach(p)
+    handle_payload = timer.wrap("packet", p.handle_payload)
+
+    packets = 0
+    first_ts = None
+    start = time.perf_counter()
+    for ts, payload in CaptureReader(capture_path):
+        if first_ts is None:
+            first_ts = ts
+        if speed > 0:
+            delay = (ts - first_ts) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        handle_payload(payload)
+        packets += 1
+    ingest_time = time.perf_counter() - start
+
+    # Include the final queue flush in the end-to-end time
+    collector.close()
+    total_time = time.perf_counter() - start
+    # Counted before duplicate pages are dropped, so runs with and without suppression compare
+    orders = collector.dedup.stats["orders"]
+
+    return {
+        "packets": packets,
+        "orders": orders,
+        "ingest_seconds": ingest_time,
+        "total_seconds": total_time,
+        "packets_per_second": packets / ingest_time if ingest_time else 0.0,
+        "orders_per_second": orders / total_time if total_time else 0.0,
+        "queue": dict(collector.queue.stats),
+        "dedup": dict(collector.dedup.stats),
+        "stages": timer.report(),
+        "db_path": db_path,
+    }
+
+
+def main():
+    """Main entry point for the replay benchmark."""
+    parser = argparse.ArgumentParser(description="Replay a collector capture file")
+    parser.add_argument("capture", help="capture file written by collector/main.py --record")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="replay speed factor, 0 for maximum speed (default), 1.0 for original speed")
+    parser.add_argument("--db", default=None, help="market database to write to (default: temporary file)")
+    args = parser.parse_args()
+
+    stats = replay(args.capture, args.speed, args.db)
+
+    print(f"\nReplayed {stats['packets']} packets with {stats['orders']} orders into {stats['db_path']}")
+    print(f"  Ingest time:   {stats['ingest_seconds']:.3f} s ({stats['packets_per_second']:.0f} packets/s)")
+    print(f"  Total time:    {stats['total_seconds']:.3f} s ({stats['orders_per_second']:.0f} orders/s)")
+    print(f"  Ingest queue:  {stats['queue']}")
+    print(f"  Dedup:         {stats['dedup']}")
+    print(f"\n  {'stage':<14}{'calls':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, calls, p50, p90, p99, worst in stats["stages"]:
+        print(f"  {stage:<14}{calls:>8}{p50:>10.3f}{p90:>10.3f}{p99:>10.3f}{worst:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Command line entry point: python -m market_app [serve].
+
+Without a command the interactive CLI is started, "serve" runs the
+headless HTTP query service.
+"""
+import sys
+import os
+import argparse
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.constants import SERVER_HOST, SERVER_PORT, REQUEST_WORKERS
+
+
+def main():
+    """Run the command given on the command line."""
+    parser = argparse.ArgumentParser(prog="python -m market_app",
+                                     description="Albion Online market analysis")
+    commands = parser.add_subparsers(dest="command")
+    serve = commands.add_parser("serve", help="run the HTTP JSON query service")
+    serve.add_argument("--host", default=SERVER_HOST, help=f"interface to listen on (default {SERVER_HOST})")
+    serve.add_argument("--port", type=int, default=SERVER_PORT, help=f"port to listen on (default {SERVER_PORT})")
+    serve.add_argument("--workers", type=int, default=REQUEST_WORKERS,
+                       help=f"threads running analyzer queries (default {REQUEST_WORKERS})")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        from market_app.server import serve as run_server
+        logger.info("Starting Albion Online Market Query Service")
+        run_server(args.host, args.port, args.workers)
+    else:
+        from market_app.main import main as run_cli
+        run_cli()
+
+
+if __name__ == "__main__":
+    main()
@@ -27,7 +27,7 @@ class MarketCLI:
         self.analyzer = MarketAnalyzer()
         self.filter = Filter()
         logger.info("Market Application initialized")
-        logger.info("Using Market.db database with separate tables")
+        logger.info("Using the market_prices table of the Market.db database")
     
     def run(self):
         """Run the CLI command loop."""
@@ -56,8 +56,16 @@ class MarketCLI:
                     self._handle_set_command(args[1:])
                 elif command == "bulk":
                     self._handle_bulk_command(args[1:])
+                elif command == "arb":
+                    self._handle_arb_command(args[1:])
+                elif command == "plan":
+                    self._handle_plan_command(args[1:])
+                elif command == "depth":
+                    self._handle_depth_command(args[1:])
                 elif command == "show":
                     self._handle_show_command(args[1:])
+                elif command == "history":
+                    self._handle_history_command(args[1:])
                 else:
                     logger.error(f"Unknown command: {command}")
             
@@ -73,10 +81,18 @@ class MarketCLI:
   set tier [tiers]     - Set tier filter (e.g., '4.0 5.1 6.2')
   set quality [quals]  - Set quality filter (e.g., '1 2 3')
   set diff [num]       - Set minimum profit ratio (e.g., '1.3')
+  set age [minutes]    - Only use prices newer than this (0 for any age)
   bulk [locations]     - Compare black market with royal cities
+  arb [buy] [sell]     - Rank trades between any two cities ('-' for any city)
+  depth [buy] [sell]   - Show order book depth for a trade (sell defaults to bm)
+  plan [buy] [sell] [silver] [slots] [order]
+                       - Plan purchases for a budget (e.g., 'plan lh bm 5m 48'),
+                         'order' sells through sell orders instead of buy orders
   show                 - Show current filter settings
   show [locations]     - Show market data for specified locations
   show all             - Show market data for all locations
+  history [loc] [item] [qual] [sell|buy]
+                       - Show price history for an item (e.g., 'history lh T4_BAG 1')
   exit                 - Exit the application
 
 Location shortcuts:"""
@@ -169,6 +185,17 @@ Location shortcuts:"""
             except ValueError:
                 logger.error("Diff value must be a number")
                 
+        elif filter_type == "age":
+            # Set maximum price age in minutes (e.g., "60")
+            try:
+                if filter_values:
+                    self.filter.set_max_age(int(filter_values[0]))
+                    logger.info(f"Set maximum price age to: {self.filter.max_age} minutes")
+                else:
+                    logger.info(f"Current maximum price age: {self.filter.max_age} minutes")
+            except ValueError:
+                logger.error("Age value must be an integer number of minutes")
+                
         else:
             logger.error(f"Unknown filter type: {filter_type}")
     
@@ -225,6 +252,96 @@ Location shortcuts:"""
                 pd.set_option('display.max_rows', None)
                 print(df_so)
 
+    def _handle_arb_command(self, args):
+        """
+        Handle the any-city arbitrage command.
+        
+        Args:
+            args: Command arguments, optional buy and sell locations
+        """
+        locations = [None if loc in ("-", "all") else SHORTNAME.get(loc, loc) for loc in args[:2]]
+        buy_city, sell_city = (locations + [None, None])[:2]
+        logger.info(f"Arbitrage requested from {buy_city or 'any city'} to {sell_city or 'any city'}")
+        
+        self.analyzer.compare_all(self.filter)
+        df = self.analyzer.query_opportunities(buy_city, sell_city, min_ratio=self.filter.diff_show)
+        
+        if df.empty:
+            logger.info("No opportunities found")
+            return
+        
+        logger.info(f"Found {len(df)} opportunities")
+        pd.set_option('display.max_rows', None)
+        print(df[["name", "enchant", "quality", "buy_city", "sell_city", "buy_price",
+                  "quick_sell_price", "diff_quick_sell", "sell_order_price", "diff_sell_order"]])
+
+    def _handle_plan_command(self, args):
+        """
+        Handle the trade plan command.
+        
+        Args:
+            args: Command arguments: buy location, optional sell location,
+                silver budget (k and m suffixes allowed), inventory slots and
+                an optional 'order' flag
+        """
+        sell_orders = bool(args) and args[-1].lower() == "order"
+        if sell_orders:
+            args = args[:-1]
+        if len(args) == 3:
+            args = [args[0], "bm"] + args[1:]
+        if len(args) != 4:
+            logger.error("Usage: plan [buy] [sell] [silver] [slots] [order]")
+            return
+        
+        buy_city = SHORTNAME.get(args[0], args[0])
+        sell_city = SHORTNAME.get(args[1], args[1])
+        try:
+            amount = args[2].lower()
+            scale = {"k": 1_000, "m": 1_000_000}.get(amount[-1:], 1)
+            budget = float(amount.rstrip("km")) * scale
+            slots = int(args[3])
+        except ValueError:
+            logger.error("Silver must be a number (e.g., '5m') and slots an integer")
+            return
+        logger.info(f"Trade plan requested from {buy_city} to {sell_city} with {budget:,.0f} silver and {slots} slots")
+        
+        df = self.analyzer.plan_trades(buy_city, sell_city, budget, slots, self.filter, sell_orders)
+        if df.empty:
+            logger.info("No profitable trades found")
+            return
+        
+        pd.set_option('display.max_rows', None)
+        print(df[["name", "enchant", "quality", "units", "max_buy_price", "min_sell_price",
+                  "spend", "revenue", "profit"]])
+        print(f"\nTotal: {int(df['units'].sum())} units, {df['spend'].sum():,.0f} spent, "
+              f"{df['profit'].sum():,.0f} profit")
+
+    def _handle_depth_command(self, args):
+        """
+        Handle the order book depth command.
+        
+        Args:
+            args: Command arguments, the buy location and an optional sell location
+        """
+        if not args:
+            logger.error("Please specify the location to buy in")
+            return
+        
+        buy_city = SHORTNAME.get(args[0], args[0])
+        sell_city = SHORTNAME.get(args[1], args[1]) if len(args) > 1 else "BlackMarket"
+        logger.info(f"Order book depth requested from {buy_city} to {sell_city}")
+        
+        df = self.analyzer.depth_metrics(buy_city, sell_city, self.filter)
+        if df.empty:
+            logger.info("No order book depth found")
+            return
+        
+        df = df[df["matched_units"] > 0]
+        logger.info(f"Found {len(df)} items with profitable depth")
+        pd.set_option('display.max_rows', None)
+        print(df[["name", "enchant", "quality", "best_ask", "ask_units", "best_bid", "bid_units",
+                  "units_below_bid", "matched_units", "matched_cost", "matched_profit"]])
+
     def _handle_show_command(self, args):
         """
 
@@ -238,7 +355,11 @@ Location shortcuts:"""
             print(f"Current filter settings:\n"
                   f"    Tier: {self.filter.get_tier()}\n"
                   f"    Quality: {self.filter.get_quality()}\n"
-                  f"    Minimum Price Difference: {self.filter.get_diff()}")
+                  f"    Minimum Price Difference: {self.filter.get_diff()}\n"
+                  f"    Maximum Price Age: {self.filter.get_max_age() or 'any'} minutes")
+            stats = self.analyzer.cache_stats()
+            print(f"Result cache: {stats['hits']} hits, {stats['misses']} misses, "
+                  f"{stats['entries']} entries")
             return
         
         if args[0].lower() == "all":
@@ -246,14 +367,13 @@ Location shortcuts:"""
             logger.info("Showing data for all locations")
             # Show data for all locations
             locations = list(set(LOCATIONS.values()))  # Use set to remove duplicates
-            for loc in locations:
-                df = self.analyzer.get_location_data(loc, self.filter)
-                if df.empty:
-                    continue
-                
+            data = self.analyzer.get_locations_data(locations, self.filter)
+            if data.empty:
+                return
+            for loc, df in data.groupby("location", sort=False):
                 # Display the data
                 print(f"\nData for {loc}:")
-                print(df)
+                print(df.drop(columns="location").reset_index(drop=True))
         else:
             for loc in args:
                 loc = SHORTNAME.get(loc, loc)
@@ -269,6 +389,38 @@ Location shortcuts:"""
                 print(df)
 
 
+    def _handle_history_command(self, args):
+        """
+        Handle the price history command.
+        
+        Args:
+            args: Command arguments
+        """
+        if len(args) < 2:
+            logger.error("Usage: history [location] [item] [quality] [sell|buy]")
+            return
+        
+        location = SHORTNAME.get(args[0], args[0])
+        item_id = args[1].upper()
+        try:
+            quality = int(args[2]) if len(args) > 2 else 1
+        except ValueError:
+            logger.error("Quality value must be an integer (1-5)")
+            return
+        side = args[3].lower() if len(args) > 3 else "sell"
+        if side not in ("sell", "buy"):
+            logger.error("Side must be 'sell' or 'buy'")
+            return
+        
+        df = self.analyzer.get_price_history(location, item_id, quality, side)
+        if df.empty:
+            logger.info(f"No price history for {item_id} at {location}")
+            return
+        
+        print(f"\n{side.capitalize()} price history for {item_id} (quality {quality}) at {location}:")
+        pd.set_option('display.max_rows', None)
+        print(df)
+
     def close(self):
         """Close the analyzer and clean up resources."""
         logger.info("Closing CLI resources")
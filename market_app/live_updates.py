@@ -0,0 +1,160 @@
+"""
+Live updates of the tables shown in the GUI.
+"""
+import time
+import threading
+import logging
+from shared.constants import LIVE_UPDATE_INTERVAL
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class LiveUpdates:
+    """
+    Pushes the changed rows of the tables open in the GUI.
+
+    Every watched table remembers the price versions and filter it was last
+    built for, and the rows it had then. A poll only compares versions,
+    which the price snapshot answers without touching SQLite. When they or
+    the filter changed, the table is rebuilt and only the rows that are new,
+    changed or removed are pushed.
+    """
+
+    def __init__(self, analyzer, filter_obj, push, interval=LIVE_UPDATE_INTERVAL):
+        """
+        Initialize without any watched table.
+
+        Args:
+            analyzer: MarketAnalyzer building the tables
+            filter_obj: Filter object the tables are shown with, read on every poll
+            push: Function called with (table, delta) for every changed table,
+                delta being a dict with the location, the new total number of
+                rows, the number of added rows, the new and changed rows and
+                the keys of the removed rows as DataFrames
+            interval: Seconds between polls
+        """
+        self.analyzer = analyzer
+        self.filter = filter_obj
+        self.push = push
+        self.interval = interval
+        self.stats = {"polls": 0, "pushes": 0, "rows": 0, "errors": 0}
+        self._views = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def _state(self, table, location, filter_obj):
+        """Versions and filter fingerprint a table depends on."""
+        return self.analyzer.table_versions(table, location), filter_obj.fingerprint()
+
+    def watch(self, table, location):
+        """
+        Start pushing changes of a table, replacing what it showed before.
+
+        Call this before fetching the first rows, so no change between the
+        fetch and the first poll is missed.
+
+        Args:
+            table: Table name, see MarketAnalyzer.table_view
+            location: The location name (e.g., "Lymhurst")
+        """
+        with self._lock:
+            generation = self._generations[table] = self._generations.get(table, 0) + 1
+        filter_obj = self.filter.snapshot()
+        state = self._state(table, location, filter_obj)
+        frame = self.analyzer.table_view(table, location, filter_obj)
+        with self._lock:
+            # A newer watch or unwatch of the table may have finished first
+            if self._generations[table] != generation:
+                return
+            self._views[table] = (location, state, frame)
+        logger.debug(f"Watching the {table} table of {location}")
+
+    def unwatch(self, table=None):
+        """
+        Stop pushing changes of a table.
+
+        Args:
+            table: Table name, None for all tables
+        """
+        with self._lock:
+            for name in list(self._generations) if table is None else [table]:
+                self._generations[name] = self._generations.get(name, 0) + 1
+                self._views.pop(name, None)
+
+    def collect(self):
+        """
+        Rebuild every watched table whose data may have changed.
+
+        Safe to call from a worker thread, nothing is pushed.
+
+        Returns:
+            List of (table, delta) tuples for the tables with changed rows
+        """
+        self.stats["polls"] += 1
+        with self._lock:
+            views = list(self._views.items())
+
+        filter_obj = self.filter.snapshot()
+        deltas = []
+        for table, (location, state, frame) in views:
+            try:
+                current = self._state(table, location, filter_obj)
+                if current == state:
+                    continue
+                new_frame = self.analyzer.table_view(table, location, filter_obj)
+                changed, removed = self.analyzer.table_delta(frame, new_frame, table)
+                with self._lock:
+                    # Skip the result if the table was watched again meanwhile
+                    if self._views.get(table, (None, None, None))[2] is not frame:
+                        continue
+                    self._views[table] = (location, current, new_frame)
+                if changed.empty and removed.empty:
+                    continue
+                added = len(new_frame) - len(frame) + len(removed)
+                deltas.append((table, {"location": location, "total": len(new_frame), "added": added,
+                                       "changed": changed, "removed": removed}))
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Updating the {table} table: {str(e)}", exc_info=True)
+        return deltas
+
+    def _push(self, deltas):
+        """Push collected deltas, returns the number of tables pushed."""
+        for table, delta in deltas:
+            self.push(table, delta)
+            self.stats["pushes"] += 1
+            self.stats["rows"] += len(delta["changed"]) + len(delta["removed"])
+            logger.debug(f"Pushed {len(delta['changed'])} changed and {len(delta['removed'])} removed {table} rows")
+        return len(deltas)
+
+    def poll(self):
+        """
+        Push the changes of every watched table whose data may have changed.
+
+        Returns:
+            Number of tables pushed
+        """
+        return self._push(self.collect())
+
+    def run(self, sleep=time.sleep, call=None):
+        """
+        Poll until stop() is called.
+
+        Args:
+            sleep: Function sleeping for a number of seconds, e.g. eel.sleep
+                when running in an eel greenlet
+            call: Function calling collect() and returning its result, e.g. to
+                rebuild the tables in a worker thread while pushing from the
+                calling thread. By default collect() is called directly.
+        """
+        if not self.interval:
+            return
+        while not self._stopping.is_set():
+            self._push(call(self.collect) if call else self.collect())
+            sleep(self.interval)
+
+    def stop(self):
+        """Make run() return after the current poll."""
+        self._stopping.set()
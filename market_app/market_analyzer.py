@@ -3,6 +3,8 @@ Market analyzer component for analyzing Albion Online market data.
 """
 import sys
 import os
+import time
+import threading
 import pandas as pd
 import numpy as np
 import logging
@@ -20,9 +22,31 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 pd.set_option("future.no_silent_downcasting", True)
 
-from shared.database import MarketDatabase
+from shared.database import MarketDatabase, depth_key, now_ms
+from shared.order_book import ladder_from_bytes, live_levels, depth_below, match_ladders
+from shared.price_history import PriceHistory
+from shared.item_catalog import get_item_catalog
+from shared.price_cube import PriceCube
+from shared.price_snapshot import SnapshotReader, SnapshotUnavailable
+from market_app.result_cache import ResultCache
+from market_app import trade_planner
 from shared.filter import Filter, regex_filter
-from shared.constants import MARKET_TAX, SETUP_FEE, TOTAL_FEE
+from shared.constants import (MARKET_TAX, SETUP_FEE, TOTAL_FEE, LOCATIONS, PRICE_SNAPSHOT_PATH,
+                              SNAPSHOT_REFRESH_INTERVAL, TABLE_PAGE_SIZE, TABLE_PAGE_LIMIT)
+
+# Columns of the tables shown by the GUI, see MarketAnalyzer.table_page
+TABLE_COLUMNS = {
+    "market": ["id", "name", "enchant", "quality", "sell_min", "buy_max"],
+    "quick_sell": ["id", "name", "enchant", "sell_min_rl", "buy_max_bm", "diff_quick_sell", "quick_sell_desired"],
+    "sell_order": ["id", "name", "enchant", "sell_min_rl", "sell_min_bm", "diff_sell_order", "sell_order_desired"],
+}
+
+# Columns identifying a row of each GUI table
+TABLE_KEYS = {
+    "market": ["id", "quality"],
+    "quick_sell": ["id"],
+    "sell_order": ["id"],
+}
 
 class MarketAnalyzer:
     """
@@ -34,8 +58,116 @@ class MarketAnalyzer:
         """Initialize the market analyzer."""
         logger.info("Initializing MarketAnalyzer")
         self.db = MarketDatabase()
-        self.items_info = pd.read_csv("shared/items.csv")
-        logger.debug(f"Loaded {len(self.items_info)} items from items.csv")
+        self.history = PriceHistory()
+        self.catalog = get_item_catalog()
+        self.cube = PriceCube(self.db, self.catalog)
+        self.snapshot = None
+        self._snapshot_checked = 0.0
+        self._snapshot_lock = threading.Lock()
+        self.opportunities = pd.DataFrame()
+        self.cache = ResultCache()
+    
+    def _price_cube(self):
+        """
+        Choose where prices are read from.
+        
+        While a collector keeps the price snapshot file current, prices are
+        read from it. Otherwise they come from the analyzer's own price cube,
+        which reads SQLite. A missing or stale snapshot is looked for again at
+        most once per SNAPSHOT_REFRESH_INTERVAL. Safe to call from several threads.
+        
+        Returns:
+            SnapshotReader or PriceCube
+        """
+        with self._snapshot_lock:
+            if self.snapshot is not None and not self.snapshot.live():
+                logger.info("Price snapshot is no longer updated, reading prices from the database")
+                # Not closed, requests still reading it keep the file mapped until they finish
+                self.snapshot = None
+            if self.snapshot is None and PRICE_SNAPSHOT_PATH:
+                now = time.monotonic()
+                if now - self._snapshot_checked >= SNAPSHOT_REFRESH_INTERVAL:
+                    self._snapshot_checked = now
+                    self.snapshot = SnapshotReader.attach(self.db, self.catalog, PRICE_SNAPSHOT_PATH)
+            return self.snapshot or self.cube
+    
+    def _read_prices(self, read):
+        """
+        Read from the price cube chosen by _price_cube.
+        
+        A snapshot that stops being live during the read has detached
+        itself, the read is then repeated on the analyzer's own price cube.
+        
+        Args:
+            read: Function taking the SnapshotReader or PriceCube and reading from it
+            
+        Returns:
+            The result of read
+        """
+        try:
+            return read(self._price_cube())
+        except SnapshotUnavailable:
+            return read(self._price_cube())
+    
+    def _cached(self, operation, locations, filter_obj, compute, versions=None):
+        """
+        Run a computation through the result cache.
+        
+        Args:
+            operation: Name of the cached operation
+            locations: Locations whose data the result depends on
+            filter_obj: Filter object used by the computation, or None
+            compute: Function producing the result on a cache miss
+            versions: Function returning the versions of the locations,
+                by default the versions of the prices currently read
+            
+        Returns:
+            The cached or freshly computed result
+        """
+        locations = tuple(locations)
+        key = (operation, locations, filter_obj.fingerprint() if filter_obj else None)
+        versions = versions(locations) if versions else self._read_prices(lambda cube: cube.versions(locations))
+        return self.cache.get_or_compute(key, versions, compute)
+    
+    def _load_location(self, location, filter_obj):
+        """
+        Load the filtered rows of a location, reusing them while the location is unchanged.
+        
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            filter_obj: Filter object to filter the data
+            
+        Returns:
+            DataFrame containing the filtered data
+        """
+        return self._cached("rows", [location], filter_obj,
+                            lambda: self._read_prices(lambda cube: cube.location_data(location, filter_obj)))
+    
+    def _load_locations(self, locations, filter_obj):
+        """
+        Load the filtered rows of several locations from the price cube,
+        reusing them while none of the locations changed.
+        
+        Args:
+            locations: Location names
+            filter_obj: Filter object to filter the data
+            
+        Returns:
+            DataFrame containing the filtered data with a location column
+        """
+        return self._cached("rows_multi", locations, filter_obj,
+                            lambda: self._read_prices(lambda cube: cube.locations_data(locations, filter_obj)))
+    
+    def cache_stats(self):
+        """
+        Get result cache and price cube statistics.
+        
+        Returns:
+            Dict with hits, misses, hit_rate, entries, the price cube size in MB
+            and whether prices are read from the collector's snapshot
+        """
+        cube = self._price_cube()
+        return dict(self.cache.stats(), cube_mb=round(cube.nbytes / 1e6, 1), snapshot=cube is self.snapshot)
     
     def export_location_to_csv(self, location, filter_obj=None):
         """
@@ -76,7 +208,7 @@ class MarketAnalyzer:
             DataFrame containing filtered Black Market data
         """
         logger.debug("Preparing Black Market data")
-        df = self.db.get_location_data("BlackMarket", filter_obj)
+        df = self._load_location("BlackMarket", filter_obj)
         
         if df.empty:
             logger.warning("No Black Market data found")
@@ -110,7 +242,7 @@ class MarketAnalyzer:
             DataFrame containing filtered Royal City data
         """
         logger.debug(f"Preparing {location} data")
-        df = self.db.get_location_data(location, filter_obj)
+        df = self._load_location(location, filter_obj)
         
         if df.empty:
             logger.warning(f"No data found for {location}")
@@ -143,6 +275,11 @@ class MarketAnalyzer:
         Returns:
             DataFrame containing market comparison results
         """
+        return self._cached("compare_markets", [royal_city, "BlackMarket"], filter_obj,
+                            lambda: self._compare_markets(royal_city, filter_obj))
+    
+    def _compare_markets(self, royal_city, filter_obj):
+        """Uncached implementation of compare_markets."""
         
         # Prepare data for both markets
         bm_df = self._prepare_black_market_data(filter_obj)
@@ -179,8 +316,11 @@ class MarketAnalyzer:
         merge = merge[merge[["diff_sell_order", "diff_quick_sell"]].notna().any(axis=1)]
         logger.debug(f"After filtering, data contains {len(merge)} profitable items")
         
-        # Add item names from item info
-        merge = self.items_info.merge(merge, how="right", on="id")
+        # Add item names and numeric IDs from the item catalog
+        codes = self.catalog.codes(merge["id"])
+        merge.insert(0, "id_num", self.catalog.take(self.catalog.id_nums, codes))
+        merge.insert(0, "name", self.catalog.take(self.catalog.names, codes))
+        merge.insert(0, "id", merge.pop("id"))
         logger.info(f"Market comparison completed with {len(merge)} items")
 
         # Sort results by item name
@@ -188,6 +328,390 @@ class MarketAnalyzer:
         
         return merge
     
+    def compare_all(self, filter_obj):
+        """
+        Compare every location with every other location in one pass.
+        
+        The prices of all locations are taken from the price cube as aligned
+        arrays of shape (item, quality) x city. Quick sell and sell order ratios
+        are then computed for every buy city / sell city pair at once. Every
+        profitable pair is kept in self.opportunities, use query_opportunities
+        to slice it without recomputing.
+        
+        Args:
+            filter_obj: Filter object to filter the data
+            
+        Returns:
+            DataFrame of opportunities ranked by their best profit ratio
+        """
+        cities = sorted(set(LOCATIONS.values()))
+        self.opportunities = self._cached("compare_all", cities, filter_obj,
+                                          lambda: self._compare_all(cities, filter_obj))
+        return self.opportunities
+    
+    def _compare_all(self, cities, filter_obj):
+        """Uncached implementation of compare_all, prices come straight from the price cube."""
+        cube, (items, qualities, sell, buy) = self._read_prices(lambda cube: (cube, cube.prices(cities, filter_obj)))
+        
+        if not len(items):
+            logger.warning("Cannot compare markets: No market data found")
+            return pd.DataFrame()
+        
+        # Aligned (key, city) price arrays, missing or zero prices are NaN
+        sell[sell <= 0] = np.nan
+        buy[buy <= 0] = np.nan
+        
+        # Ratios indexed [key, buy city, sell city]
+        with np.errstate(invalid="ignore"):
+            diff_quick_sell = buy[:, None, :] * (1 - MARKET_TAX) / sell[:, :, None]
+            diff_sell_order = sell[:, None, :] * (1 - TOTAL_FEE) / sell[:, :, None]
+            same_city = np.eye(len(cities), dtype=bool)
+            diff_quick_sell[:, same_city] = np.nan
+            diff_sell_order[:, same_city] = np.nan
+            key_idx, buy_idx, sell_idx = np.nonzero((diff_quick_sell > 1) | (diff_sell_order > 1))
+        
+        city_names = np.array(cities)
+        # Cube item codes are catalog codes, IDs appended after the catalog have no name
+        items = items[key_idx]
+        result = pd.DataFrame({
+            "id": np.array(cube.ids, dtype=object)[items],
+            "name": self.catalog.take(self.catalog.names, np.where(items < len(self.catalog), items, -1)),
+            "enchant": cube.enchants[items],
+            "quality": qualities[key_idx].astype(np.int64),
+            "buy_city": city_names[buy_idx],
+            "sell_city": city_names[sell_idx],
+            "buy_price": sell[key_idx, buy_idx],
+            "quick_sell_price": buy[key_idx, sell_idx],
+            "sell_order_price": sell[key_idx, sell_idx],
+            "diff_quick_sell": diff_quick_sell[key_idx, buy_idx, sell_idx],
+            "diff_sell_order": diff_sell_order[key_idx, buy_idx, sell_idx],
+        })
+        result["profit_quick_sell"] = result["quick_sell_price"] * (1 - MARKET_TAX) - result["buy_price"]
+        result["profit_sell_order"] = result["sell_order_price"] * (1 - TOTAL_FEE) - result["buy_price"]
+        result["best_ratio"] = result[["diff_quick_sell", "diff_sell_order"]].max(axis=1)
+        
+        result = result.sort_values(by="best_ratio", ascending=False, ignore_index=True)
+        
+        logger.info(f"Compared {len(cities)} locations, found {len(result)} profitable routes")
+        return result
+    
+    def depth_metrics(self, buy_city, sell_city, filter_obj):
+        """
+        Measure how much of an opportunity the order books can actually fill.
+        
+        The sell order ladder of the buy city is matched against the buy order
+        ladder of the sell city for the same item, enchantment and quality.
+        Expired orders are ignored.
+        
+        Args:
+            buy_city: Location to buy in (e.g., "Lymhurst")
+            sell_city: Location whose buy orders are sold into (e.g., "BlackMarket")
+            filter_obj: Filter object to filter the data
+            
+        Returns:
+            DataFrame with, per item, the depth on both sides, the units and
+            silver available below the best buy price after tax, and the units,
+            cost and profit of all profitable trades, ranked by profit
+        """
+        return self._cached("depth_metrics", [depth_key(buy_city), depth_key(sell_city)], filter_obj,
+                            lambda: self._depth_metrics(buy_city, sell_city, filter_obj),
+                            self.db.get_location_versions)
+    
+    def _live_ladders(self, buy_city, sell_city, sell_side, filter_obj):
+        """
+        Load the unexpired ladders of the items traded in both cities.
+        
+        Args:
+            buy_city: Location whose sell orders are bought from
+            sell_city: Location to sell in
+            sell_side: Side of the sell city's ladders to load, "buy" or "sell"
+            filter_obj: Filter object to filter the data
+            
+        Returns:
+            Tuple of (DataFrame of id, enchant and quality, list of ask ladders,
+            list of sell city ladders), aligned by row
+        """
+        keys = ["id", "enchant", "quality"]
+        asks = self.db.get_ladders([buy_city], "sell", filter_obj)
+        other = self.db.get_ladders([sell_city], sell_side, filter_obj)
+        if asks.empty or other.empty:
+            return pd.DataFrame(columns=keys), [], []
+        
+        pairs = asks[keys + ["levels"]].merge(other[keys + ["levels"]], on=keys, suffixes=("_ask", "_other"))
+        now = now_ms()
+        ask_ladders = [live_levels(ladder_from_bytes(blob), now) for blob in pairs["levels_ask"]]
+        other_ladders = [live_levels(ladder_from_bytes(blob), now) for blob in pairs["levels_other"]]
+        return pairs[keys], ask_ladders, other_ladders
+    
+    def _depth_metrics(self, buy_city, sell_city, filter_obj):
+        """Uncached implementation of depth_metrics."""
+        keys, asks, bids = self._live_ladders(buy_city, sell_city, "buy", filter_obj)
+        if keys.empty:
+            logger.warning(f"No order book depth for {buy_city} -> {sell_city}")
+            return pd.DataFrame()
+        
+        rows = []
+        for ask, bid in zip(asks, bids):
+            best_bid = bid["price"][0] if len(bid) else np.nan
+            units_below, silver_below = depth_below(ask, best_bid * (1 - MARKET_TAX)) if len(bid) else (0, 0.0)
+            rows.append((
+                int(ask["amount"].sum()), ask["price"][0] if len(ask) else np.nan,
+                int(bid["amount"].sum()), best_bid,
+                units_below, silver_below,
+                *match_ladders(ask, bid, MARKET_TAX),
+            ))
+        
+        metrics = pd.DataFrame(rows, columns=[
+            "ask_units", "best_ask", "bid_units", "best_bid", "units_below_bid", "silver_below_bid",
+            "matched_units", "matched_cost", "matched_profit",
+        ])
+        result = pd.concat([keys, metrics], axis=1)
+        result.insert(1, "name", self.catalog.take(self.catalog.names, self.catalog.codes(result["id"])))
+        result = result.sort_values(by="matched_profit", ascending=False, ignore_index=True)
+        
+        logger.info(f"Measured order book depth of {len(result)} items for {buy_city} -> {sell_city}")
+        return result
+    
+    def plan_trades(self, buy_city, sell_city, budget, slots, filter_obj, sell_orders=False):
+        """
+        Plan what to buy in one city with a silver budget and limited inventory.
+        
+        By default every unit is sold instantly into the sell city's buy
+        orders and pays the market tax. With sell_orders, units are listed at
+        the sell city's lowest sell order price and pay the setup fee as well,
+        assuming the market absorbs as many units as are currently listed.
+        
+        Args:
+            buy_city: Location to buy in (e.g., "Lymhurst")
+            sell_city: Location to sell in (e.g., "BlackMarket")
+            budget: Silver available
+            slots: Inventory slots available, one unit per slot
+            filter_obj: Filter object to filter the data
+            sell_orders: Sell through sell orders instead of buy orders
+            
+        Returns:
+            DataFrame with one row per item to buy: units, the highest price
+            to pay, the lowest sale price, silver spent, revenue after fees
+            and profit, ranked by profit
+        """
+        key = ("plan", budget, slots, sell_orders)
+        return self._cached(key, [depth_key(buy_city), depth_key(sell_city)], filter_obj,
+                            lambda: self._plan_trades(buy_city, sell_city, budget, slots, filter_obj, sell_orders),
+                            self.db.get_location_versions)
+    
+    def _plan_trades(self, buy_city, sell_city, budget, slots, filter_obj, sell_orders):
+        """Uncached implementation of plan_trades."""
+        start = time.perf_counter()
+        keys, asks, others = self._live_ladders(buy_city, sell_city, "sell" if sell_orders else "buy", filter_obj)
+        if keys.empty:
+            logger.warning(f"No order book depth for {buy_city} -> {sell_city}")
+            return pd.DataFrame()
+        
+        if sell_orders:
+            # One level per item: the cheapest listing, as deep as everything listed
+            others = [np.array([(ladder["price"][0], ladder["amount"].sum(), 0, 0)], dtype=ladder.dtype)
+                      if len(ladder) else ladder for ladder in others]
+        sell_fee = TOTAL_FEE if sell_orders else MARKET_TAX
+        items, units, spend, revenue, max_buy, min_sell = trade_planner.plan(asks, others, budget, slots, sell_fee)
+        
+        result = keys.iloc[items].reset_index(drop=True)
+        result.insert(1, "name", self.catalog.take(self.catalog.names, self.catalog.codes(result["id"])))
+        result["units"] = units
+        result["max_buy_price"] = max_buy
+        result["min_sell_price"] = min_sell
+        result["spend"] = spend
+        result["revenue"] = revenue
+        result["profit"] = revenue - spend
+        result = result.sort_values(by="profit", ascending=False, ignore_index=True)
+        
+        logger.info(f"Planned {int(units.sum())} units of {len(result)} items for {buy_city} -> {sell_city}, "
+                    f"spending {spend.sum():,.0f} for {result['profit'].sum():,.0f} profit "
+                    f"in {time.perf_counter() - start:.3f}s")
+        return result
+    
+    def query_opportunities(self, buy_city=None, sell_city=None, min_ratio=None, kind=None, limit=None,
+                            opportunities=None):
+        """
+        Slice the opportunity table built by the last compare_all call.
+        
+        Args:
+            buy_city: Optional location to buy in (e.g., "Lymhurst")
+            sell_city: Optional location to sell in (e.g., "BlackMarket")
+            min_ratio: Optional minimum profit ratio
+            kind: Optional "quick_sell" or "sell_order" to rank by that ratio only
+            limit: Optional maximum number of rows
+            opportunities: Optional table returned by compare_all to slice instead,
+                for callers in other threads that must not see each other's filters
+            
+        Returns:
+            DataFrame of matching opportunities, best first
+        """
+        df = self.opportunities if opportunities is None else opportunities
+        if df.empty:
+            return df
+        
+        ratio = "best_ratio" if kind is None else f"diff_{kind}"
+        if buy_city:
+            df = df[df["buy_city"] == buy_city]
+        if sell_city:
+            df = df[df["sell_city"] == sell_city]
+        if min_ratio is not None:
+            df = df[df[ratio] > min_ratio]
+        if kind is not None:
+            df = df.sort_values(by=ratio, ascending=False)
+        if limit:
+            df = df.head(limit)
+        return df
+    
+    def table_view(self, table, location, filter_obj):
+        """
+        Build one of the tables shown by the GUI.
+        
+        Args:
+            table: "market" for the data of a location, "quick_sell" or
+                "sell_order" for the opportunities of a royal city against
+                the Black Market above the filter's minimum profit ratio
+            location: The location name (e.g., "Lymhurst")
+            filter_obj: Filter object to filter the data
+            
+        Returns:
+            DataFrame with the TABLE_COLUMNS of the table
+            
+        Raises:
+            ValueError: If the table is unknown
+        """
+        if table not in TABLE_COLUMNS:
+            raise ValueError(f"Unknown table: {table}")
+        if table == "market":
+            df = self.get_location_data(location, filter_obj)
+        else:
+            df = self.compare_markets(location, filter_obj)
+            if not df.empty:
+                df = df[df[f"diff_{table}"] > filter_obj.diff_show]
+        if df.empty:
+            return pd.DataFrame(columns=TABLE_COLUMNS[table])
+        return df[TABLE_COLUMNS[table]].reset_index(drop=True)
+    
+    def table_page(self, table, location, filter_obj, offset=0, limit=TABLE_PAGE_SIZE,
+                   sort_by=None, descending=False, search=None):
+        """
+        Get one page of a GUI table, searched and sorted on the server.
+        
+        The table and its row order for a sort column, direction and search
+        text are kept in the result cache, so scrolling through the pages of
+        an unchanged table only slices the cached order.
+        
+        Args:
+            table: Table name, see table_view
+            location: The location name (e.g., "Lymhurst")
+            filter_obj: Filter object to filter the data
+            offset: Position of the first row to return
+            limit: Number of rows to return, at most TABLE_PAGE_LIMIT
+            sort_by: Optional column to sort by, missing values always go last
+            descending: True to sort from the largest value
+            search: Optional text the item name or ID must contain, ignoring case
+            
+        Returns:
+            Tuple of (DataFrame with the rows of the page, total number of rows)
+            
+        Raises:
+            ValueError: If the table or the sort column is unknown
+        """
+        if table not in TABLE_COLUMNS:
+            raise ValueError(f"Unknown table: {table}")
+        if sort_by and sort_by not in TABLE_COLUMNS[table]:
+            raise ValueError(f"Cannot sort {table} by {sort_by}")
+        
+        search = (search or "").strip().lower() or None
+        key = ("table", table, sort_by or None, bool(descending), search)
+        view, order = self._cached(key, self._table_locations(table, location), filter_obj,
+                                   lambda: self._table_order(table, location, filter_obj, sort_by, descending, search))
+        
+        offset = max(int(offset), 0)
+        limit = min(max(int(limit), 0), TABLE_PAGE_LIMIT)
+        return view.iloc[order[offset:offset + limit]], len(order)
+    
+    @staticmethod
+    def _table_locations(table, location):
+        """Locations whose prices a GUI table is built from."""
+        return [location] if table == "market" else [location, "BlackMarket"]
+    
+    def data_versions(self, locations):
+        """
+        Get the versions of the prices of locations.
+        
+        Args:
+            locations: Location names
+            
+        Returns:
+            Tuple of location versions, it changes whenever their data may have
+        """
+        return self._read_prices(lambda cube: cube.versions(tuple(locations)))
+    
+    def table_versions(self, table, location):
+        """
+        Get the versions of the prices a GUI table is built from.
+        
+        Args:
+            table: Table name, see table_view
+            location: The location name (e.g., "Lymhurst")
+            
+        Returns:
+            Tuple of location versions, it changes whenever the table may have
+        """
+        return self.data_versions(self._table_locations(table, location))
+    
+    @staticmethod
+    def table_delta(previous, current, table):
+        """
+        Find the rows of a GUI table that changed between two versions of it.
+        
+        Args:
+            previous: Earlier DataFrame from table_view, or None
+            current: Current DataFrame from table_view
+            table: Table name, see table_view
+            
+        Returns:
+            Tuple of (DataFrame of the rows that are new or have different
+            values, DataFrame with the key columns of the removed rows)
+        """
+        keys = TABLE_KEYS[table]
+        if previous is None or previous.empty:
+            return current, pd.DataFrame(columns=keys)
+        
+        old = previous.set_index(keys)
+        new = current.set_index(keys)
+        common = new.index.intersection(old.index)
+        before, after = old.loc[common, new.columns], new.loc[common]
+        same = ((before == after) | (before.isna() & after.isna())).all(axis=1).to_numpy()
+        
+        changed = new.index.difference(old.index).append(common[~same])
+        removed = old.index.difference(new.index)
+        return (new.loc[changed].reset_index()[current.columns],
+                removed.to_frame(index=False) if len(removed) else pd.DataFrame(columns=keys))
+    
+    def _table_order(self, table, location, filter_obj, sort_by, descending, search):
+        """
+        Compute the row order of a table page query.
+        
+        Returns:
+            Tuple of (table DataFrame, array of row positions in display order)
+        """
+        view = self.table_view(table, location, filter_obj)
+        order = np.arange(len(view))
+        if search and len(view):
+            names = view["name"].fillna("").str.lower()
+            ids = view["id"].fillna("").str.lower()
+            match = names.str.contains(search, regex=False) | ids.str.contains(search, regex=False)
+            order = order[match.to_numpy()]
+        if sort_by and len(order):
+            values = view[sort_by].iloc[order].reset_index(drop=True)
+            if values.dtype == object:
+                values = values.str.lower()
+            ranked = values.sort_values(ascending=not descending, na_position="last", kind="stable")
+            order = order[ranked.index.to_numpy()]
+        return view, order
+    
     def get_location_data(self, location, filter_obj=None):
         """
         Get market data for a specific location with optional filtering.
@@ -200,20 +724,78 @@ class MarketAnalyzer:
             DataFrame containing the filtered data
         """
         logger.info(f"Getting market data for {location}")
-        df = self.db.get_location_data(location, filter_obj)
+        return self._cached("location_data", [location], filter_obj,
+                            lambda: self._get_location_data(location, filter_obj))
+    
+    def _get_location_data(self, location, filter_obj):
+        """Uncached implementation of get_location_data."""
+        df = self._load_location(location, filter_obj)
         
         if df.empty:
             logger.warning(f"No data found for {location}")
             return pd.DataFrame()
             
         # Sort results by item name and quality
-        df = df.sort_values(by=["id", "quality"])
-        df = df.merge(self.items_info, how="left", on="id")
+        df = df.sort_values(by=["id", "quality"], ignore_index=True)
+        codes = self.catalog.codes(df["id"])
+        df["name"] = self.catalog.take(self.catalog.names, codes)
+        df["id_num"] = self.catalog.take(self.catalog.id_nums, codes)
         df = df.drop_duplicates()
         return df
     
+    def get_locations_data(self, locations, filter_obj=None):
+        """
+        Get market data for several locations with a single query.
+        
+        Args:
+            locations: Location names
+            filter_obj: Optional Filter object to filter the data
+            
+        Returns:
+            DataFrame containing the filtered data with a location column
+        """
+        locations = sorted(set(locations))
+        logger.info(f"Getting market data for {len(locations)} locations")
+        return self._cached("locations_data", locations, filter_obj,
+                            lambda: self._get_locations_data(locations, filter_obj))
+    
+    def _get_locations_data(self, locations, filter_obj):
+        """Uncached implementation of get_locations_data."""
+        df = self._load_locations(locations, filter_obj)
+        
+        if df.empty:
+            logger.warning(f"No data found for {locations}")
+            return pd.DataFrame()
+        
+        codes = self.catalog.codes(df["id"])
+        df = df.assign(name=self.catalog.take(self.catalog.names, codes),
+                       id_num=self.catalog.take(self.catalog.id_nums, codes))
+        return df
+    
+    def get_price_history(self, location, item_id, quality=1, side="sell", days=None):
+        """
+        Get the recorded price history of an item.
+        
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            item_id: The item identifier (e.g., "T4_BAG@1")
+            quality: The quality level
+            side: Either "sell" or "buy"
+            days: Optional number of days to look back
+            
+        Returns:
+            DataFrame with time, resolution, open, high, low, close and samples columns
+        """
+        logger.info(f"Getting {side} price history for {item_id} at {location}")
+        since = int(time.time() - days * 86400) if days else None
+        return self.history.get_history(location, item_id, quality, side, since)
+    
     def close(self):
         """Close the database connection."""
         logger.info("Closing database connection")
+        if self.snapshot:
+            self.snapshot.close()
+        if self.history:
+            self.history.close()
         if self.db:
             self.db.close()
\ No newline at end of file
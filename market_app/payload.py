@@ -0,0 +1,110 @@
+"""
+Compact column-oriented encoding of analyzer results sent to the GUI.
+"""
+import logging
+import numpy as np
+import pandas as pd
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Floats up to this magnitude are exact as JSON integers and JavaScript numbers
+MAX_SAFE_INTEGER = 2 ** 53
+
+
+def _with_nulls(values, missing):
+    """
+    Convert an array to a list with None where missing is set.
+
+    Returns:
+        List of native Python values
+    """
+    result = values.tolist()
+    for index in np.flatnonzero(missing).tolist():
+        result[index] = None
+    return result
+
+
+def encode_column(series):
+    """
+    Encode one column as a JSON-serializable list.
+
+    Floats holding whole numbers, such as prices, are sent as integers.
+    Strings are dictionary encoded: the list holds indexes into a list of
+    the distinct values. Missing values, NaN and infinities become None.
+
+    Args:
+        series: Column to encode
+
+    Returns:
+        Tuple of (values, dictionary), dictionary being None unless the
+        column is dictionary encoded
+    """
+    dtype = series.dtype
+    if pd.api.types.is_bool_dtype(dtype) and not series.hasnans:
+        return series.to_numpy(dtype=bool).tolist(), None
+
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        # Epoch milliseconds, like the timestamps stored in the database
+        values = series.to_numpy(dtype="datetime64[ms]")
+        return _with_nulls(values.astype(np.int64), np.isnat(values)), None
+
+    if pd.api.types.is_integer_dtype(dtype) and not series.hasnans:
+        return series.to_numpy(dtype=np.int64).tolist(), None
+
+    if pd.api.types.is_numeric_dtype(dtype):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        finite = np.isfinite(values)
+        present = values[finite]
+        if (present == np.trunc(present)).all() and (np.abs(present) < MAX_SAFE_INTEGER).all():
+            return _with_nulls(np.where(finite, values, 0).astype(np.int64), ~finite), None
+        return _with_nulls(values, ~finite), None
+
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    return _with_nulls(codes, codes < 0), list(uniques)
+
+
+def encode_frame(df):
+    """
+    Encode a DataFrame column by column for the GUI.
+
+    Unlike a list of records this does not repeat the column names on
+    every row, and sends every distinct item name once. app.js decodes the
+    result with ColumnarRows.
+
+    Args:
+        df: DataFrame to encode, its index is not sent
+
+    Returns:
+        Dict with the number of rows as length, the column names as columns,
+        one list of values per column as values, and the dictionaries of
+        the dictionary encoded columns by name as dicts
+    """
+    columns, values, dicts = [], [], {}
+    for name in df.columns:
+        column_values, dictionary = encode_column(df[name])
+        columns.append(str(name))
+        values.append(column_values)
+        if dictionary is not None:
+            dicts[str(name)] = dictionary
+    return {"length": len(df), "columns": columns, "values": values, "dicts": dicts}
+
+
+def encode_records(df):
+    """
+    Encode a DataFrame as a list of row dicts, with the same value rules as encode_frame.
+
+    Args:
+        df: DataFrame to encode, its index is not sent
+
+    Returns:
+        List with one dict per row, mapping column names to values
+    """
+    frame = encode_frame(df)
+    columns = []
+    for name, values in zip(frame["columns"], frame["values"]):
+        dictionary = frame["dicts"].get(name)
+        if dictionary is not None:
+            values = [None if code is None else dictionary[code] for code in values]
+        columns.append(values)
+    return [dict(zip(frame["columns"], row)) for row in zip(*columns)]
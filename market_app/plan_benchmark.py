@@ -0,0 +1,124 @@
+"""
+Benchmark the trade planner on synthetic order books.
+
+Usage:
+    python market_app/plan_benchmark.py [--levels 50000] [--items 10000] [--budget 5000000] [--slots 48]
+
+Every item gets a sell ladder in the buy city and a buy ladder in the sell
+city, together holding the requested number of levels. The report shows the
+planning time and how far the plan is from the Lagrangian upper bound.
+"""
+import sys
+import os
+import time
+import argparse
+import logging
+import numpy as np
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_app import trade_planner
+from shared.order_book import LADDER_DTYPE, batch_segments
+from shared.constants import MARKET_TAX
+
+
+def synthetic_books(levels, items, seed=0):
+    """
+    Generate matching sell and buy ladders with overlapping prices.
+
+    Args:
+        levels: Total number of levels over all ladders
+        items: Number of items
+        seed: Random seed
+
+    Returns:
+        Tuple of (list of sell ladders, list of buy ladders)
+    """
+    rng = np.random.default_rng(seed)
+    base = rng.lognormal(mean=9.5, sigma=1.5, size=items)
+    depth = rng.multinomial(levels - 2 * items, np.full(2 * items, 1 / (2 * items))) + 1
+
+    asks, bids = [], []
+    for i in range(items):
+        for ladders, count, direction in ((asks, depth[2 * i], 1), (bids, depth[2 * i + 1], -1)):
+            ladder = np.zeros(count, dtype=LADDER_DTYPE)
+            # Half of the books cross, so some trades are profitable
+            start = base[i] * rng.uniform(0.8, 1.1) if direction > 0 else base[i] * rng.uniform(0.9, 1.3)
+            ladder["price"] = np.round(start * (1 + direction * np.cumsum(rng.uniform(0, 0.03, count))))
+            ladder["amount"] = rng.integers(1, 30, count)
+            ladders.append(ladder)
+    return asks, bids
+
+
+def upper_bound(asks, bids, budget, slots, sell_fee, steps=60):
+    """
+    Best Lagrangian bound on the profit of any plan.
+
+    For a silver multiplier m, filling the slots with the units of highest
+    profit - m * cost and adding m * budget bounds every feasible plan.
+
+    Returns:
+        Smallest bound found by ternary search over m
+    """
+    _, units, buy_price, sell_price = batch_segments(asks, bids, sell_fee)
+    profit = sell_price * (1 - sell_fee) - buy_price
+
+    def bound(multiplier):
+        value = profit - multiplier * buy_price
+        order = np.argsort(-value)
+        order = order[value[order] > 0]
+        wanted = units[order]
+        taken = np.clip(slots - (np.cumsum(wanted) - wanted), 0, wanted)
+        return multiplier * budget + float((taken * value[order]).sum())
+
+    low, high = 0.0, float((profit / buy_price).max()) if len(units) else 0.0
+    for _ in range(steps):
+        left, right = low + (high - low) / 3, high - (high - low) / 3
+        if bound(left) <= bound(right):
+            high = right
+        else:
+            low = left
+    return min(bound(0.0), bound(low))
+
+
+def main():
+    """Main entry point for the planner benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the trade planner on synthetic order books")
+    parser.add_argument("--levels", type=int, default=50000, help="total order book levels (default 50000)")
+    parser.add_argument("--items", type=int, default=10000, help="number of items (default 10000)")
+    parser.add_argument("--budget", type=float, default=5_000_000, help="silver budget (default 5000000)")
+    parser.add_argument("--slots", type=int, default=48, help="inventory slots (default 48)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs (default 5)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    asks, bids = synthetic_books(args.levels, min(args.items, args.levels // 2), args.seed)
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        items, units, spend, revenue, _, _ = trade_planner.plan(asks, bids, args.budget, args.slots, MARKET_TAX)
+        timings.append(time.perf_counter() - start)
+
+    profit = float((revenue - spend).sum())
+    bound = upper_bound(asks, bids, args.budget, args.slots, MARKET_TAX)
+    segments = len(batch_segments(asks, bids, MARKET_TAX)[0])
+
+    print(f"\nPlanned over {len(asks)} items, {args.levels} levels, {segments} profitable segments")
+    print(f"  Time:    best {min(timings) * 1000:.1f} ms, median {np.median(timings) * 1000:.1f} ms")
+    print(f"  Plan:    {int(units.sum())} units of {len(items)} items, "
+          f"{spend.sum():,.0f} / {args.budget:,.0f} silver")
+    print(f"  Profit:  {profit:,.0f} (upper bound {bound:,.0f}, gap {100 * (1 - profit / bound) if bound else 0:.3f}%)")
+
+
+if __name__ == "__main__":
+    main()
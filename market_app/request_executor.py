@@ -0,0 +1,137 @@
+"""
+Thread pool running GUI requests, superseding outdated requests for the same view.
+"""
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from shared.constants import REQUEST_WORKERS
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class RequestCancelled(Exception):
+    """Raised by the future of a request that a newer request for its view replaced."""
+
+
+class _Request:
+    """A submitted request and whether it was superseded."""
+
+    __slots__ = ("future", "cancelled")
+
+    def __init__(self):
+        self.future = Future()
+        self.cancelled = threading.Event()
+
+
+class RequestExecutor:
+    """
+    Runs requests on a pool of worker threads.
+
+    Every request belongs to a view, such as a table of the GUI. Submitting
+    a request for a view supersedes the earlier requests for that view
+    unless they were submitted with an equal query, like other pages of the
+    same sorted table. A superseded request that has not started is
+    skipped. One that is running finishes in its thread, as pandas and
+    SQLite cannot be interrupted, but its future fails with
+    RequestCancelled at once, so the caller does not wait for it.
+
+    Requests read the database through the pooled read-only connections
+    of the analyzer, so a slow comparison does not hold up a quick lookup.
+    """
+
+    def __init__(self, workers=REQUEST_WORKERS):
+        """
+        Start the worker threads on demand.
+
+        Args:
+            workers: Maximum number of requests running at once
+        """
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="request")
+        self._views = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "superseded": 0, "skipped": 0, "errors": 0}
+
+    def submit(self, view, function, *args, query=None, **kwargs):
+        """
+        Run a function in the pool.
+
+        Args:
+            view: Hashable name of what the request shows, None for a request
+                that is never superseded
+            function: Function to call
+            *args: Positional arguments of the function
+            query: Hashable description of the request, requests for the same
+                view with an equal query do not supersede each other. None
+                supersedes every earlier request for the view.
+            **kwargs: Keyword arguments of the function
+
+        Returns:
+            concurrent.futures.Future with the result of the function
+        """
+        request = _Request()
+        with self._lock:
+            self.stats["requests"] += 1
+            if view is not None:
+                current = self._views.get(view)
+                if current is None or query is None or current[0] != query:
+                    if current is not None:
+                        for earlier in current[1]:
+                            self._cancel(earlier)
+                    current = self._views[view] = (query, set())
+                current[1].add(request)
+        self._pool.submit(self._run, view, request, function, args, kwargs)
+        return request.future
+
+    def _cancel(self, request):
+        """Supersede a request, called with the lock held."""
+        request.cancelled.set()
+        if not request.future.done():
+            request.future.set_exception(RequestCancelled())
+            self.stats["superseded"] += 1
+
+    def _run(self, view, request, function, args, kwargs):
+        """Call the function of a request in a worker thread unless it was superseded."""
+        try:
+            if request.cancelled.is_set():
+                with self._lock:
+                    self.stats["skipped"] += 1
+                return
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                logger.error(f"Error running request for {view}: {str(e)}", exc_info=True)
+                return
+            with self._lock:
+                if not request.future.done():
+                    request.future.set_result(result)
+        finally:
+            with self._lock:
+                current = self._views.get(view)
+                if current is not None:
+                    current[1].discard(request)
+
+    def cancel(self, view):
+        """
+        Supersede every pending request for a view.
+
+        Args:
+            view: View name given to submit()
+        """
+        with self._lock:
+            current = self._views.pop(view, None)
+            if current is not None:
+                for request in current[1]:
+                    self._cancel(request)
+
+    def shutdown(self):
+        """Cancel every request and wait for the running ones to finish."""
+        with self._lock:
+            for view in list(self._views):
+                for request in self._views.pop(view)[1]:
+                    self._cancel(request)
+        self._pool.shutdown(wait=True)
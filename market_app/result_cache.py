@@ -0,0 +1,84 @@
+"""
+Result cache for market analyzer queries.
+"""
+import threading
+import logging
+from collections import OrderedDict
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    LRU cache of analyzer results validated against location data versions.
+
+    Each entry remembers the change counters of the locations it was built
+    from. A lookup is a hit only when those counters are unchanged, so
+    results are recomputed exactly when the underlying data was written.
+    """
+
+    def __init__(self, max_entries=64):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_entries: Maximum number of results kept before evicting the oldest
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, versions, compute):
+        """
+        Return the cached result for a key or compute and store it.
+
+        Cached values are shared between callers and must not be modified in place.
+
+        Args:
+            key: Hashable cache key, e.g. (operation, locations, filter fingerprint)
+            versions: Tuple of location versions the result depends on
+            compute: Function returning the result on a miss
+
+        Returns:
+            The cached or freshly computed result
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = (versions, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Get hit/miss statistics.
+
+        Returns:
+            Dict with hits, misses, hit_rate and the number of cached entries
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
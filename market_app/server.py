@@ -0,0 +1,439 @@
+"""
+Headless HTTP JSON service answering market queries for scripts and bots.
+"""
+import json
+import gzip
+import math
+import asyncio
+import hashlib
+import logging
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs, unquote
+from market_app.market_analyzer import MarketAnalyzer
+from market_app.request_executor import RequestExecutor
+from market_app.result_cache import ResultCache
+from market_app.payload import encode_frame, encode_records
+from shared.filter import Filter, parse_tiers
+from shared.constants import (SHORTNAME, LOCATIONS, REQUEST_WORKERS, SERVER_HOST, SERVER_PORT,
+                              SERVER_KEEPALIVE_SECONDS, SERVER_MAX_HEADER_BYTES, SERVER_GZIP_MIN_BYTES,
+                              SERVER_MAX_WAIT_SECONDS, SERVER_WAIT_POLL_SECONDS)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Query parameters that do not change the response body
+WAIT_PARAMS = ("wait",)
+
+
+class HTTPError(Exception):
+    """Error answered with its status code and a JSON message."""
+
+    def __init__(self, status, message):
+        """
+        Args:
+            status: HTTPStatus of the response
+            message: Explanation sent to the client
+        """
+        super().__init__(message)
+        self.status = status
+
+
+class MarketServer:
+    """
+    Answers GET requests for market data with JSON.
+
+    Endpoints:
+        /locations                  Short and full location names
+        /locations/<location>       Prices of a location
+        /compare/<royal city>       Quick sell and sell order opportunities against the Black Market
+        /opportunities              Opportunities between every pair of locations, best first
+        /stats                      Cache and server statistics
+
+    The data endpoints take the filter as tiers, qualities, diff and max_age
+    parameters, and format=columns for the compact encoding the GUI uses
+    instead of a list of records.
+
+    Connections are kept alive between requests, and bodies are gzipped
+    for clients accepting it. Every data response carries an ETag made from
+    the request, the age cutoff of its filter and the versions of the
+    locations it is built from, so a client revalidating with If-None-Match
+    gets 304 Not Modified without anything being computed. With
+    wait=<seconds> the server holds such a request until the data changes or
+    the time is up, so bots can follow the opportunities without polling. The analyzer runs on a RequestExecutor,
+    the event loop only parses and writes.
+    """
+
+    def __init__(self, analyzer, requests=None):
+        """
+        Initialize the server without listening yet.
+
+        Args:
+            analyzer: MarketAnalyzer answering the queries
+            requests: RequestExecutor running the analyzer, a new one by default
+        """
+        self.analyzer = analyzer
+        self.requests = requests or RequestExecutor()
+        self.stats = {"connections": 0, "requests": 0, "not_modified": 0, "gzip": 0, "errors": 0}
+        self._bodies = ResultCache()
+        self._known = set(LOCATIONS.values())
+        self._server = None
+
+    async def start(self, host=SERVER_HOST, port=SERVER_PORT):
+        """
+        Start listening.
+
+        Args:
+            host: Interface to listen on
+            port: TCP port, 0 for any free port
+
+        Returns:
+            The port listened on
+        """
+        self._server = await asyncio.start_server(self._connection, host, port, limit=SERVER_MAX_HEADER_BYTES)
+        port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Serving market queries on http://{host}:{port}")
+        return port
+
+    async def serve_forever(self, host=SERVER_HOST, port=SERVER_PORT):
+        """Start listening and answer requests until cancelled."""
+        await self.start(host, port)
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        """Stop the worker threads, call after the event loop stopped."""
+        self.requests.shutdown()
+
+    async def _connection(self, reader, writer):
+        """Answer the requests of one connection until it is closed or idle."""
+        self.stats["connections"] += 1
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), SERVER_KEEPALIVE_SECONDS)
+                except HTTPError as e:
+                    await self._send(writer, self._error(e.status, str(e)), keep_alive=False, head=False)
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+
+                method, target, version, headers = request
+                connection = headers.get("connection", "").lower()
+                keep_alive = "close" not in connection and (version == "HTTP/1.1" or "keep-alive" in connection)
+                response = await self._handle(method, target, headers)
+                await self._send(writer, response, keep_alive, method == "HEAD")
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader):
+        """
+        Read the request line and headers, and skip the body.
+
+        Returns:
+            Tuple of (method, target, version, headers with lower case names),
+            or None if the client closed the connection
+
+        Raises:
+            HTTPError: If the request is malformed or too large
+        """
+        try:
+            line = await reader.readline()
+            if not line.endswith(b"\n"):
+                return None
+            parts = line.decode("latin-1").split()
+            if len(parts) != 3 or not parts[2].startswith("HTTP/1."):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+            method, target, version = parts
+
+            size = len(line)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                size += len(line)
+                if size > SERVER_MAX_HEADER_BYTES:
+                    raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Request head is too large")
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, separator, value = line.decode("latin-1").partition(":")
+                if not separator:
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed header line")
+                headers[name.strip().lower()] = value.strip()
+        except ValueError:
+            # A line longer than the stream limit
+            raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Request head is too large")
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(HTTPStatus.NOT_IMPLEMENTED, "Chunked request bodies are not supported")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length > SERVER_MAX_HEADER_BYTES:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body is too large")
+        if length > 0:
+            await reader.readexactly(length)
+        return method, target, version, headers
+
+    async def _handle(self, method, target, headers):
+        """
+        Answer one request.
+
+        Returns:
+            Tuple of (status, headers, body)
+        """
+        self.stats["requests"] += 1
+        if method not in ("GET", "HEAD"):
+            status, response_headers, body = self._error(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not supported")
+            response_headers["Allow"] = "GET, HEAD"
+            return status, response_headers, body
+
+        url = urlsplit(target)
+        params = {name: values[-1] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+        try:
+            name, locations, filter_obj, compute = self._route(url.path, params)
+            wait = float(params.get("wait") or 0)
+            if not math.isfinite(wait):
+                raise ValueError(f"wait must be a finite number of seconds, not {params['wait']}")
+            wait = min(max(wait, 0.0), SERVER_MAX_WAIT_SECONDS)
+        except HTTPError as e:
+            return self._error(e.status, str(e))
+        except ValueError as e:
+            return self._error(HTTPStatus.BAD_REQUEST, f"Invalid parameter: {str(e)}")
+
+        etags = {tag.strip().removeprefix("W/") for tag in headers.get("if-none-match", "").split(",") if tag.strip()}
+        use_gzip = self._accepts_gzip(headers.get("accept-encoding", ""))
+        key = (name, tuple(sorted((k, v) for k, v in params.items() if k not in WAIT_PARAMS)))
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            future = self.requests.submit(None, self._answer, key, locations, filter_obj, compute, etags, use_gzip)
+            try:
+                response = await asyncio.wrap_future(future)
+            except Exception:
+                self.stats["errors"] += 1
+                return self._error(HTTPStatus.INTERNAL_SERVER_ERROR, "Internal server error")
+            remaining = deadline - loop.time()
+            if response[0] != HTTPStatus.NOT_MODIFIED or remaining <= 0:
+                break
+            await asyncio.sleep(min(SERVER_WAIT_POLL_SECONDS, remaining))
+
+        if response[0] == HTTPStatus.NOT_MODIFIED:
+            self.stats["not_modified"] += 1
+        elif response[1].get("Content-Encoding") == "gzip":
+            self.stats["gzip"] += 1
+        return response
+
+    def _route(self, path, params):
+        """
+        Find what a request asks for, parsing its parameters.
+
+        Returns:
+            Tuple of (endpoint name, locations the data depends on or None if
+            it must not be cached, filter snapshot or None, function
+            computing the JSON payload)
+
+        Raises:
+            HTTPError: If there is no such endpoint or location
+            ValueError: If a parameter is invalid
+        """
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        encode = self._encoder(params)
+
+        if parts == ["locations"]:
+            return "locations", (), None, lambda: {"locations": SHORTNAME}
+
+        if len(parts) == 2 and parts[0] == "locations":
+            location = self._location(parts[1])
+            filter_obj = self._filter(params)
+            return f"locations/{location}", [location], filter_obj, lambda: {
+                "location": location,
+                "data": encode(self.analyzer.get_location_data(location, filter_obj))
+            }
+
+        if len(parts) == 2 and parts[0] == "compare":
+            city = self._location(parts[1])
+            if city == "BlackMarket":
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Cannot compare the Black Market with itself")
+            filter_obj = self._filter(params)
+            return f"compare/{city}", [city, "BlackMarket"], filter_obj, lambda: {
+                "city": city,
+                "quick_sell": encode(self.analyzer.table_view("quick_sell", city, filter_obj)),
+                "sell_order": encode(self.analyzer.table_view("sell_order", city, filter_obj))
+            }
+
+        if parts == ["opportunities"]:
+            filter_obj = self._filter(params)
+            buy_city = self._location(params["buy_city"]) if params.get("buy_city") else None
+            sell_city = self._location(params["sell_city"]) if params.get("sell_city") else None
+            min_ratio = float(params["min_ratio"]) if params.get("min_ratio") else None
+            kind = params.get("kind") or None
+            if kind not in (None, "quick_sell", "sell_order"):
+                raise ValueError(f"kind must be quick_sell or sell_order, not {kind}")
+            limit = int(params["limit"]) if params.get("limit") else None
+
+            def opportunities():
+                table = self.analyzer.compare_all(filter_obj)
+                df = self.analyzer.query_opportunities(buy_city, sell_city, min_ratio, kind, limit,
+                                                       opportunities=table)
+                return {"count": len(df), "data": encode(df)}
+
+            return "opportunities", sorted(self._known), filter_obj, opportunities
+
+        if parts == ["stats"]:
+            return "stats", None, None, lambda: {
+                "server": dict(self.stats),
+                "requests": dict(self.requests.stats),
+                "cache": self.analyzer.cache_stats()
+            }
+
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No endpoint at {path}")
+
+    def _location(self, name):
+        """Resolve a short or full location name, raising HTTPError for unknown ones."""
+        location = SHORTNAME.get(name.lower(), name)
+        if location not in self._known:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown location: {name}")
+        return location
+
+    @staticmethod
+    def _accepts_gzip(accept_encoding):
+        """Check whether an Accept-Encoding header allows gzip."""
+        for coding in accept_encoding.split(","):
+            name, _, options = coding.partition(";")
+            if name.strip().lower() not in ("gzip", "*"):
+                continue
+            quality = 1.0
+            for option in options.split(";"):
+                option_name, _, value = option.strip().partition("=")
+                if option_name == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            return quality > 0
+        return False
+
+    @staticmethod
+    def _filter(params):
+        """Build a filter snapshot from the tiers, qualities, diff and max_age parameters."""
+        defaults = Filter()
+        qualities = params.get("qualities")
+        tiers = " ".join(params["tiers"].replace(",", " ").split()) if "tiers" in params else defaults.tiers
+        if tiers and parse_tiers(tiers) is None:
+            raise ValueError(f"tiers must be tier or tier.enchant numbers like 4.0 5.1, not {params['tiers']}")
+        filter_obj = Filter(
+            tiers=tiers,
+            diff_show=float(params["diff"]) if params.get("diff") else defaults.diff_show,
+            qualities=[int(q) for q in qualities.replace(",", " ").split()] if qualities is not None
+            else defaults.qualities,
+            max_age=int(params["max_age"]) if params.get("max_age") else defaults.max_age
+        )
+        return filter_obj.snapshot()
+
+    @staticmethod
+    def _encoder(params):
+        """Choose how DataFrames are encoded from the format parameter."""
+        fmt = params.get("format") or "records"
+        if fmt == "records":
+            return encode_records
+        if fmt == "columns":
+            return encode_frame
+        raise ValueError(f"format must be records or columns, not {fmt}")
+
+    def _answer(self, key, locations, filter_obj, compute, etags, use_gzip):
+        """
+        Build a response in a worker thread.
+
+        The versions of the locations and the age cutoff of the filter are
+        read first. The cutoff moves every minute, so prices aging out of
+        max_age change the ETag even when no location changed. If the client
+        already has the response they identify, 304 is returned without
+        computing it. Encoded bodies are cached by their ETag.
+
+        Returns:
+            Tuple of (status, headers, body)
+        """
+        headers = {"Content-Type": "application/json; charset=utf-8", "Cache-Control": "no-cache",
+                   "Vary": "Accept-Encoding"}
+        if locations is None:
+            body, gzipped = self._encode(compute(), use_gzip)
+        else:
+            versions = self.analyzer.data_versions(locations)
+            cutoff = filter_obj.cutoff() if filter_obj is not None else None
+            etag = '"' + hashlib.blake2b(repr((key, cutoff, versions)).encode(), digest_size=12).hexdigest() + '"'
+            headers["ETag"] = etag
+            if etag in etags or "*" in etags:
+                return HTTPStatus.NOT_MODIFIED, headers, b""
+            body, gzipped = self._bodies.get_or_compute((etag, use_gzip), (), lambda: self._encode(compute(), use_gzip))
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+        return HTTPStatus.OK, headers, body
+
+    @staticmethod
+    def _encode(payload, use_gzip):
+        """
+        Serialize a payload, compressing it if worthwhile.
+
+        Returns:
+            Tuple of (body bytes, whether they are gzipped)
+        """
+        body = json.dumps(payload, separators=(",", ":"), allow_nan=False).encode("utf-8")
+        if use_gzip and len(body) >= SERVER_GZIP_MIN_BYTES:
+            return gzip.compress(body, compresslevel=5), True
+        return body, False
+
+    @staticmethod
+    def _error(status, message):
+        """Build an error response with a JSON message."""
+        body = json.dumps({"error": message}).encode("utf-8")
+        return status, {"Content-Type": "application/json; charset=utf-8"}, body
+
+    async def _send(self, writer, response, keep_alive, head):
+        """Write a response, without its body for HEAD requests."""
+        status, headers, body = response
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Date: {formatdate(usegmt=True)}",
+                 "Server: albion-market"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        if status != HTTPStatus.NOT_MODIFIED:
+            lines.append(f"Content-Length: {len(body)}")
+        if keep_alive:
+            lines.append("Connection: keep-alive")
+            lines.append(f"Keep-Alive: timeout={SERVER_KEEPALIVE_SECONDS}")
+        else:
+            lines.append("Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if body and not head and status != HTTPStatus.NOT_MODIFIED:
+            writer.write(body)
+        await writer.drain()
+
+
+def serve(host=SERVER_HOST, port=SERVER_PORT, workers=REQUEST_WORKERS):
+    """
+    Run the query service until interrupted.
+
+    Args:
+        host: Interface to listen on
+        port: TCP port to listen on
+        workers: Number of threads running analyzer queries
+    """
+    analyzer = MarketAnalyzer()
+    server = MarketServer(analyzer, RequestExecutor(workers))
+    try:
+        asyncio.run(server.serve_forever(host, port))
+    except KeyboardInterrupt:
+        logger.info("Query service stopped by user")
+    finally:
+        server.close()
+        analyzer.close()
@@ -0,0 +1,184 @@
+"""
+Load test the HTTP query service on localhost.
+
+Usage:
+    python -m market_app serve
+    python market_app/server_load_test.py [--port 8765] [--clients 50] [--requests 5000] [--path /stats ...]
+
+Every client keeps one connection alive and sends its share of the requests
+one after the other, going through the paths in turn. Like a polling bot,
+clients remember the ETag of every path and revalidate with If-None-Match,
+unless --no-etag is given. The report shows requests per second, latency
+percentiles and the status codes received.
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+import logging
+from collections import Counter
+import numpy as np
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.constants import SERVER_PORT
+
+# Requested in turn when no --path is given
+DEFAULT_PATHS = [
+    "/locations",
+    "/locations/Lymhurst",
+    "/compare/Lymhurst",
+    "/compare/Martlock?diff=1.1",
+    "/opportunities?limit=100",
+    "/opportunities?kind=quick_sell&buy_city=Lymhurst&limit=20",
+]
+
+
+class Client:
+    """One keep-alive connection sending requests one after the other."""
+
+    def __init__(self, host, port, use_gzip, use_etag):
+        """
+        Initialize without connecting.
+
+        Args:
+            host: Server host
+            port: Server port
+            use_gzip: Ask for gzipped responses
+            use_etag: Revalidate with the ETags of earlier responses
+        """
+        self.host = host
+        self.port = port
+        self.use_gzip = use_gzip
+        self.use_etag = use_etag
+        self.etags = {}
+        self.connects = 0
+        self._reader = self._writer = None
+
+    async def get(self, path):
+        """
+        Send one GET request, connecting again if the server closed the connection.
+
+        Returns:
+            Tuple of (status code, body size in bytes)
+        """
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            self.connects += 1
+
+        lines = [f"GET {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        if self.use_gzip:
+            lines.append("Accept-Encoding: gzip")
+        if self.use_etag and path in self.etags:
+            lines.append(f"If-None-Match: {self.etags[path]}")
+        self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError("Server closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length:
+            await self._reader.readexactly(length)
+
+        if status == 200 and "etag" in headers:
+            self.etags[path] = headers["etag"]
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, length
+
+    def close(self):
+        """Close the connection."""
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+
+async def run_client(client, paths, count, offset, latencies, statuses, sizes):
+    """Send count requests, going through the paths starting at offset."""
+    try:
+        for i in range(count):
+            path = paths[(offset + i) % len(paths)]
+            start = time.perf_counter()
+            try:
+                status, size = await client.get(path)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                client.close()
+                statuses[f"error: {type(e).__name__}"] += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+            sizes.append(size)
+    finally:
+        client.close()
+
+
+async def load_test(host, port, paths, clients, requests, use_gzip=True, use_etag=True):
+    """
+    Run the clients concurrently.
+
+    Returns:
+        Dict with the wall time, latencies in seconds, status counts, response
+        body sizes and the number of connections opened
+    """
+    latencies, statuses, sizes = [], Counter(), []
+    pool = [Client(host, port, use_gzip, use_etag) for _ in range(clients)]
+    shares = [requests // clients + (1 if i < requests % clients else 0) for i in range(clients)]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(client, paths, share, i, latencies, statuses, sizes)
+                           for i, (client, share) in enumerate(zip(pool, shares))))
+    elapsed = time.perf_counter() - start
+    return {"elapsed": elapsed, "latencies": latencies, "statuses": statuses, "sizes": sizes,
+            "connects": sum(client.connects for client in pool)}
+
+
+def main():
+    """Main entry point for the load test."""
+    parser = argparse.ArgumentParser(description="Load test the HTTP query service on localhost")
+    parser.add_argument("--host", default="127.0.0.1", help="server host (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help=f"server port (default {SERVER_PORT})")
+    parser.add_argument("--clients", type=int, default=50, help="concurrent connections (default 50)")
+    parser.add_argument("--requests", type=int, default=5000, help="total requests (default 5000)")
+    parser.add_argument("--path", action="append", dest="paths",
+                        help="path to request, may be repeated (default: a mix of every endpoint)")
+    parser.add_argument("--no-gzip", action="store_true", help="do not ask for gzipped responses")
+    parser.add_argument("--no-etag", action="store_true", help="do not revalidate with If-None-Match")
+    args = parser.parse_args()
+
+    paths = args.paths or DEFAULT_PATHS
+    result = asyncio.run(load_test(args.host, args.port, paths, max(args.clients, 1), args.requests,
+                                   not args.no_gzip, not args.no_etag))
+
+    done = len(result["latencies"])
+    print(f"\n{done} requests from {args.clients} clients over {result['connects']} connections "
+          f"in {result['elapsed']:.2f}s ({done / result['elapsed']:,.0f} requests/s)")
+    if done:
+        ms = np.array(result["latencies"]) * 1000
+        p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+        print(f"  Latency: p50 {p50:.2f} ms, p90 {p90:.2f} ms, p99 {p99:.2f} ms, max {ms.max():.2f} ms")
+        print(f"  Received {sum(result['sizes']) / 1e6:.2f} MB of bodies")
+    print("  Statuses: " + ", ".join(f"{status}: {count}" for status, count in sorted(result["statuses"].items(),
+                                                                                    key=lambda item: str(item[0]))))
+
+
+if __name__ == "__main__":
+    main()
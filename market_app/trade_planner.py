@@ -0,0 +1,177 @@
+"""
+Budget and inventory constrained trade planning over order book ladders.
+"""
+import logging
+import numpy as np
+from shared.order_book import batch_segments
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Bisection steps for the silver multiplier, enough for float precision
+SEARCH_STEPS = 48
+
+
+def _greedy(units, cost, profit, slots, multiplier):
+    """
+    Fill the slots with the units of highest profit minus multiplier times cost.
+
+    Returns:
+        Tuple of (segment indexes, units taken from each)
+    """
+    value = profit - multiplier * cost
+    order = np.flatnonzero(value > 0)
+    wanted = units[order]
+    if wanted.sum() > slots:
+        order = order[np.argsort(-value[order], kind="stable")]
+        wanted = units[order]
+    before = np.cumsum(wanted) - wanted
+    taken = np.clip(slots - before, 0, wanted)
+    return order, taken
+
+
+def _fill(take, units, cost, profit, budget, slots):
+    """
+    Spend leftover silver and slots on the units of best profit per silver.
+
+    Returns:
+        The completed take array
+    """
+    budget -= float((take * cost).sum())
+    slots -= int(take.sum())
+    candidates = np.flatnonzero(units > take)
+    candidates = candidates[np.argsort(-(profit[candidates] / cost[candidates]), kind="stable")]
+    cheapest = cost[candidates].min() if len(candidates) else np.inf
+    for i in candidates:
+        if slots <= 0 or budget < cheapest:
+            break
+        extra = min(int(units[i] - take[i]), slots, int(budget // cost[i]))
+        if extra > 0:
+            take[i] += extra
+            budget -= extra * cost[i]
+            slots -= extra
+    return take
+
+
+def _trim(take, cost, profit, budget):
+    """
+    Drop the units of worst profit per silver until the plan fits the budget.
+
+    Returns:
+        The trimmed take array
+    """
+    excess = float((take * cost).sum()) - budget
+    chosen = np.flatnonzero(take)
+    for i in chosen[np.argsort(profit[chosen] / cost[chosen], kind="stable")]:
+        if excess <= 0:
+            break
+        drop = min(int(take[i]), int(np.ceil(excess / cost[i])))
+        take[i] -= drop
+        excess -= drop * cost[i]
+    return take
+
+
+def _best_single(units, cost, profit, budget, slots):
+    """
+    Buy as many units as fit from the single most profitable segment.
+
+    Returns:
+        Take array with at most one segment chosen
+    """
+    take = np.zeros(len(units), dtype=np.int64)
+    affordable = budget // np.where(cost > 0, cost, np.inf)
+    fits = np.minimum(np.minimum(units, slots), affordable).astype(np.int64)
+    best = int(np.argmax(fits * profit))
+    take[best] = fits[best]
+    return take
+
+
+def solve(units, cost, profit, budget, slots):
+    """
+    Choose how many units of each segment to trade.
+
+    This is a bounded knapsack with two capacities, silver and inventory
+    slots (one unit per slot). The silver constraint is relaxed with a
+    Lagrange multiplier: for a given multiplier every unit is worth its
+    profit minus multiplier times its cost, and the slots are filled with
+    the most valuable units. The multiplier where the plan starts to fit the
+    budget is found by bisection. The plans on both sides of it are rounded
+    to the budget, dropping and then adding units by profit per silver.
+
+    Rounding can lose most of the profit when only a few expensive units
+    fit, so the best plan buying from a single segment, completed the same
+    way, competes too. The most profitable of these plans is kept, which is
+    at least half of the optimum.
+
+    Args:
+        units: Array of units available per segment
+        cost: Array of silver paid per unit
+        profit: Array of silver earned per unit after fees
+        budget: Silver available
+        slots: Inventory slots available
+
+    Returns:
+        Array of units to trade per segment
+    """
+    take = np.zeros(len(units), dtype=np.int64)
+    usable = (units > 0) & (cost > 0) & (profit > 0)
+    if budget <= 0 or slots <= 0 or not usable.any():
+        return take
+    units = np.where(usable, units, 0)
+
+    order, taken = _greedy(units, cost, profit, slots, 0.0)
+    if (taken * cost[order]).sum() <= budget:
+        take[order] = taken
+        return _fill(take, units, cost, profit, budget, slots)
+
+    low, high = 0.0, float((profit[usable] / cost[usable]).max())
+    for _ in range(SEARCH_STEPS):
+        middle = (low + high) / 2
+        order, taken = _greedy(units, cost, profit, slots, middle)
+        if (taken * cost[order]).sum() > budget:
+            low = middle
+        else:
+            high = middle
+
+    plans = [_fill(_best_single(units, cost, profit, budget, slots), units, cost, profit, budget, slots)]
+    for multiplier in (high, low):
+        plan_take = np.zeros(len(units), dtype=np.int64)
+        order, taken = _greedy(units, cost, profit, slots, multiplier)
+        plan_take[order] = taken
+        plan_take = _trim(plan_take, cost, profit, budget)
+        plans.append(_fill(plan_take, units, cost, profit, budget, slots))
+    return max(plans, key=lambda plan_take: float((plan_take * profit).sum()))
+
+
+def plan(asks, bids, budget, slots, sell_fee):
+    """
+    Plan the most profitable purchases for a budget and inventory.
+
+    Args:
+        asks: Sequence of sell ladders to buy from, lowest price first
+        bids: Sequence of ladders to sell into, aligned with asks, best price first
+        budget: Silver available
+        slots: Inventory slots available
+        sell_fee: Fraction of the sale price lost to fees
+
+    Returns:
+        Tuple of (item, units, spend, revenue, max_buy_price, min_sell_price)
+        arrays with one entry per item in the plan, item being its position
+        in asks and bids, revenue after fees
+    """
+    item, units, buy_price, sell_price = batch_segments(asks, bids, sell_fee)
+    net_price = sell_price * (1 - sell_fee)
+    take = solve(units, buy_price, net_price - buy_price, budget, slots)
+
+    chosen = take > 0
+    item, take = item[chosen], take[chosen]
+    buy_price, sell_price, net_price = buy_price[chosen], sell_price[chosen], net_price[chosen]
+    items, first = np.unique(item, return_index=True)
+    # Segments of one item are contiguous with rising buy and falling sell prices
+    last = np.append(first[1:], len(item)) - 1
+    spend = np.add.reduceat(take * buy_price, first) if len(item) else np.zeros(0)
+    revenue = np.add.reduceat(take * net_price, first) if len(item) else np.zeros(0)
+    units = np.add.reduceat(take, first) if len(item) else np.zeros(0, dtype=np.int64)
+
+    logger.debug(f"Planned {int(units.sum())} units of {len(items)} items from {len(take)} segments")
+    return items, units, spend, revenue, buy_price[last], sell_price[last]
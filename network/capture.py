@@ -0,0 +1,410 @@
+"""
+Packet capture backends delivering batches of Photon UDP payloads.
+
+Every backend implements `run(deliver, stop_event)` and calls
+`deliver(batch)` with lists of (payload bytes, timestamp in seconds) until
+the stop event is set or its source is exhausted.
+
+- RawSocketBackend: Linux AF_PACKET socket with a kernel BPF filter, slices the
+  UDP payload out of a reused receive buffer without dissecting the packet
+- PcapFileBackend: reads a classic libpcap file the same way
+- ScapyBackend: scapy's sniff(), portable fallback for Windows and macOS
+"""
+import sys
+import os
+import time
+import struct
+import socket
+import ctypes
+import mmap
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.constants import PHOTON_PORTS, CAPTURE_BACKEND, CAPTURE_BATCH_SIZE
+
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86DD
+ETH_P_8021Q = 0x8100
+SO_ATTACH_FILTER = 26
+IPPROTO_UDP = 17
+MAX_FRAME = 65536
+
+# pcap link-layer header types
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+PCAP_HEADER = struct.Struct("IHHiIII")
+PCAP_RECORD = struct.Struct("IIII")
+PCAP_MAGIC = {
+    0xA1B2C3D4: 1_000_000,      # microsecond timestamps
+    0xA1B23C4D: 1_000_000_000,  # nanosecond timestamps
+}
+
+
+def udp_datagram(view, offset, ports=PHOTON_PORTS):
+    """
+    Slice the addresses and payload out of a UDP datagram without copying them.
+
+    Args:
+        view: memoryview of the frame
+        offset: Offset of the IPv4/IPv6 header inside the frame
+        ports: UDP ports to accept, as source or destination
+
+    Returns:
+        Tuple of (source address, source port, destination address,
+        destination port, payload) with addresses and payload as memoryviews,
+        or None if the packet is not a matching unfragmented UDP datagram
+    """
+    if len(view) < offset + 20:
+        return None
+    version = view[offset] >> 4
+    if version == 4:
+        if view[offset + 9] != IPPROTO_UDP or (view[offset + 6] & 0x1F or view[offset + 7]):
+            return None  # not UDP, or a non-first fragment
+        udp = offset + (view[offset] & 0x0F) * 4
+        src, dst = view[offset + 12:offset + 16], view[offset + 16:offset + 20]
+    elif version == 6:
+        if len(view) < offset + 40 or view[offset + 6] != IPPROTO_UDP:
+            return None
+        udp = offset + 40
+        src, dst = view[offset + 8:offset + 24], view[offset + 24:offset + 40]
+    else:
+        return None
+
+    if len(view) < udp + 8:
+        return None
+    src_port = view[udp] << 8 | view[udp + 1]
+    dst_port = view[udp + 2] << 8 | view[udp + 3]
+    if src_port not in ports and dst_port not in ports:
+        return None
+    length = view[udp + 4] << 8 | view[udp + 5]
+    payload = view[udp + 8:udp + length] if length >= 8 else view[udp + 8:]
+    return src, src_port, dst, dst_port, payload
+
+
+def udp_payload(view, offset, ports=PHOTON_PORTS):
+    """
+    Slice the UDP payload out of an IP packet without copying it.
+
+    Args:
+        view: memoryview of the frame
+        offset: Offset of the IPv4/IPv6 header inside the frame
+        ports: UDP ports to accept, as source or destination
+
+    Returns:
+        memoryview of the payload, or None if the packet is not a matching
+        unfragmented UDP datagram
+    """
+    datagram = udp_datagram(view, offset, ports)
+    return None if datagram is None else datagram[4]
+
+
+def network_offset(view, linktype):
+    """
+    Find the network header of a captured frame.
+
+    Args:
+        view: memoryview of the frame
+        linktype: pcap link type of the capture
+
+    Returns:
+        Offset of the IP header, or None for non-IP frames
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        if len(view) < 14:
+            return None
+        offset, ethertype = 14, view[12] << 8 | view[13]
+        while ethertype == ETH_P_8021Q and len(view) >= offset + 4:
+            ethertype = view[offset + 2] << 8 | view[offset + 3]
+            offset += 4
+        return offset if ethertype in (ETH_P_IP, ETH_P_IPV6) else None
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        return 0
+    if linktype == LINKTYPE_LINUX_SLL:
+        return 16 if len(view) >= 16 and (view[14] << 8 | view[15]) in (ETH_P_IP, ETH_P_IPV6) else None
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return 20 if len(view) >= 20 and (view[0] << 8 | view[1]) in (ETH_P_IP, ETH_P_IPV6) else None
+    if linktype == LINKTYPE_NULL:
+        return 4
+    return None
+
+
+def photon_bpf(ports=PHOTON_PORTS):
+    """
+    Build a classic BPF program accepting unfragmented IPv4 UDP on the given ports.
+
+    The program runs on packets without link-layer header (AF_PACKET SOCK_DGRAM),
+    so the kernel drops every other packet before it reaches Python.
+
+    Args:
+        ports: UDP ports to accept, as source or destination
+
+    Returns:
+        List of (code, jt, jf, k) instructions
+    """
+    ldb_abs, ldh_abs, ldh_ind, ldxb_msh = 0x30, 0x28, 0x48, 0xB1
+    jeq, jset, ret = 0x15, 0x45, 0x06
+
+    n = len(ports)
+    # Six header instructions, n source port checks, one load, n destination port checks
+    accept = 7 + 2 * n
+    drop = accept + 1
+    prog = [
+        (ldb_abs, 0, 0, 9),                  # 0: A = ip protocol
+        (jeq, 0, drop - 2, IPPROTO_UDP),     # 1
+        (ldh_abs, 0, 0, 6),                  # 2: A = flags and fragment offset
+        (jset, drop - 4, 0, 0x1FFF),         # 3: drop non-first fragments
+        (ldxb_msh, 0, 0, 0),                 # 4: X = ip header length
+        (ldh_ind, 0, 0, 0),                  # 5: A = source port
+    ]
+    for port in ports:
+        pc = len(prog)
+        prog.append((jeq, accept - pc - 1, 0, port))
+    prog.append((ldh_ind, 0, 0, 2))          # A = destination port
+    for i, port in enumerate(ports):
+        pc = len(prog)
+        prog.append((jeq, accept - pc - 1, drop - pc - 1 if i == n - 1 else 0, port))
+    prog.append((ret, 0, 0, MAX_FRAME))      # accept
+    prog.append((ret, 0, 0, 0))              # drop
+    return prog
+
+
+class CaptureBackend:
+    """Interface shared by all capture backends."""
+
+    name = "base"
+
+    def __init__(self, batch_size=CAPTURE_BATCH_SIZE, ports=PHOTON_PORTS):
+        """
+        Args:
+            batch_size: Maximum number of payloads per delivered batch
+            ports: UDP ports to capture
+        """
+        self.batch_size = batch_size
+        self.ports = tuple(ports)
+        self.packets = 0
+
+    def run(self, deliver, stop_event):
+        """
+        Capture until stop_event is set or the source is exhausted.
+
+        Args:
+            deliver: Called with lists of (payload, timestamp) tuples
+            stop_event: threading.Event ending the capture
+        """
+        raise NotImplementedError
+
+
+class RawSocketBackend(CaptureBackend):
+    """
+    Linux AF_PACKET capture with the port filter running in the kernel.
+
+    Requires root or CAP_NET_RAW. Payloads are sliced out of a single reused
+    receive buffer and batched: after a blocking receive, everything already
+    queued in the socket is drained without blocking.
+    """
+
+    name = "raw"
+
+    def __init__(self, batch_size=CAPTURE_BATCH_SIZE, ports=PHOTON_PORTS, poll_interval=0.5):
+        """
+        Open the capture socket.
+
+        Args:
+            batch_size: Maximum number of payloads per delivered batch
+            ports: UDP ports to capture
+            poll_interval: Seconds between checks of the stop event while idle
+
+        Raises:
+            OSError: If raw sockets are unavailable or not permitted
+        """
+        super().__init__(batch_size, ports)
+        if not hasattr(socket, "AF_PACKET"):
+            raise OSError("AF_PACKET sockets are only available on Linux")
+
+        self.poll_interval = poll_interval
+        # SOCK_DGRAM strips the link-layer header, so frames start at the IP header
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_DGRAM, socket.htons(ETH_P_IP))
+        prog = photon_bpf(self.ports)
+        code = ctypes.create_string_buffer(b"".join(struct.pack("HBBI", *ins) for ins in prog))
+        fprog = struct.pack("HP", len(prog), ctypes.addressof(code))
+        self.sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+        self.sock.settimeout(poll_interval)
+
+    def run(self, deliver, stop_event):
+        buf = bytearray(MAX_FRAME)
+        view = memoryview(buf)
+        ports = self.ports
+        try:
+            while not stop_event.is_set():
+                batch = []
+                try:
+                    n = self.sock.recv_into(buf)
+                except socket.timeout:
+                    continue
+                self.sock.setblocking(False)
+                try:
+                    while True:
+                        payload = udp_payload(view[:n], 0, ports)
+                        if payload is not None:
+                            batch.append((bytes(payload), time.time()))
+                        if len(batch) >= self.batch_size:
+                            break
+                        try:
+                            n = self.sock.recv_into(buf)
+                        except BlockingIOError:
+                            break
+                finally:
+                    self.sock.settimeout(self.poll_interval)
+                if batch:
+                    self.packets += len(batch)
+                    deliver(batch)
+        finally:
+            self.sock.close()
+
+
+class PcapFileBackend(CaptureBackend):
+    """Reads Photon payloads from a classic libpcap (.pcap) file."""
+
+    name = "pcap"
+
+    def __init__(self, path, batch_size=CAPTURE_BATCH_SIZE, ports=PHOTON_PORTS):
+        """
+        Args:
+            path: Path of the .pcap file
+            batch_size: Maximum number of payloads per delivered batch
+            ports: UDP ports to capture
+
+        Raises:
+            ValueError: If the file is not a libpcap file (pcapng is not supported)
+        """
+        super().__init__(batch_size, ports)
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(PCAP_HEADER.size)
+        if len(header) < PCAP_HEADER.size:
+            raise ValueError(f"{path} is not a pcap file")
+        for order in ("<", ">"):
+            magic = struct.unpack(order + "I", header[:4])[0]
+            if magic in PCAP_MAGIC:
+                self.byte_order = order
+                self.ticks = PCAP_MAGIC[magic]
+                break
+        else:
+            raise ValueError(f"{path} is not a pcap file")
+        self.linktype = struct.unpack(self.byte_order + PCAP_HEADER.format, header)[6] & 0x0FFFFFFF
+
+    def datagrams(self):
+        """
+        Yield every matching UDP datagram in file order.
+
+        The file is memory-mapped, so captures larger than RAM can be read.
+
+        Yields:
+            Tuples of (udp_datagram() result, timestamp in seconds)
+        """
+        record = struct.Struct(self.byte_order + PCAP_RECORD.format)
+        with open(self.path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(data)
+        offset, end = PCAP_HEADER.size, len(data)
+        linktype, ports, ticks = self.linktype, self.ports, self.ticks
+        while offset + record.size <= end:
+            ts_sec, ts_frac, caplen, _ = record.unpack_from(view, offset)
+            offset += record.size
+            if offset + caplen > end:
+                break  # truncated last record
+            frame = view[offset:offset + caplen]
+            offset += caplen
+            ip = network_offset(frame, linktype)
+            if ip is None:
+                continue
+            datagram = udp_datagram(frame, ip, ports)
+            if datagram is not None:
+                yield datagram, ts_sec + ts_frac / ticks
+
+    def __iter__(self):
+        """
+        Yield every matching payload in file order.
+
+        Yields:
+            Tuples of (payload memoryview, timestamp in seconds)
+        """
+        for datagram, ts in self.datagrams():
+            yield datagram[4], ts
+
+    def run(self, deliver, stop_event):
+        batch = []
+        for payload, ts in self:
+            if stop_event.is_set():
+                return
+            batch.append((bytes(payload), ts))
+            if len(batch) >= self.batch_size:
+                self.packets += len(batch)
+                deliver(batch)
+                batch = []
+        if batch:
+            self.packets += len(batch)
+            deliver(batch)
+
+
+class ScapyBackend(CaptureBackend):
+    """Portable capture through scapy's sniff(), one packet per batch."""
+
+    name = "scapy"
+
+    def run(self, deliver, stop_event):
+        from scapy.all import UDP, sniff
+
+        def on_packet(packet):
+            if UDP in packet:
+                self.packets += 1
+                deliver([(bytes(packet[UDP].payload), float(packet.time))])
+
+        ports = " or ".join(f"port {port}" for port in self.ports)
+        sniff(
+            prn=on_packet, filter=f"udp and ({ports})", store=0,
+            stop_filter=lambda _: stop_event.is_set()
+        )
+
+
+def open_backend(name=CAPTURE_BACKEND, batch_size=CAPTURE_BATCH_SIZE):
+    """
+    Create a capture backend.
+
+    Args:
+        name: "raw", "scapy", a path to a .pcap file, or "auto" to use the raw
+            socket when available and fall back to scapy otherwise
+        batch_size: Maximum number of payloads per delivered batch
+
+    Returns:
+        A CaptureBackend instance
+    """
+    if name == "scapy":
+        return ScapyBackend(batch_size)
+    if name == "raw":
+        return RawSocketBackend(batch_size)
+    if name == "auto":
+        try:
+            return RawSocketBackend(batch_size)
+        except (OSError, AttributeError) as e:
+            logger.info(f"Raw socket capture unavailable ({str(e)}), using scapy")
+            return ScapyBackend(batch_size)
+    if os.path.isfile(name):
+        return PcapFileBackend(name, batch_size)
+    raise ValueError(f"Unknown capture backend: {name}")
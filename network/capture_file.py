@@ -0,0 +1,88 @@
+"""
+Compact length-prefixed file format for recorded UDP payloads.
+
+Layout: an 8 byte magic header followed by records of
+<uint64 timestamp in microseconds><uint32 payload length><payload bytes>,
+all little-endian.
+"""
+import struct
+import threading
+import time
+
+MAGIC = b"LAMCAP01"
+RECORD_HEADER = struct.Struct("<QI")
+
+
+class CaptureWriter:
+    """Appends timestamped payloads to a capture file, safe to share between threads."""
+
+    def __init__(self, path):
+        """
+        Open a capture file for writing, replacing any existing file.
+
+        Args:
+            path: Path of the capture file
+        """
+        self.path = path
+        self.count = 0
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._lock = threading.Lock()
+
+    def write(self, payload, timestamp=None):
+        """
+        Append one payload.
+
+        Args:
+            payload: Raw UDP payload bytes
+            timestamp: Optional capture time in seconds, defaults to now
+        """
+        ts = time.time() if timestamp is None else timestamp
+        header = RECORD_HEADER.pack(int(ts * 1_000_000), len(payload))
+        with self._lock:
+            self._file.write(header)
+            self._file.write(payload)
+            self.count += 1
+
+    def close(self):
+        """Flush and close the file."""
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class CaptureReader:
+    """Iterates over the (timestamp, payload) records of a capture file."""
+
+    def __init__(self, path):
+        """
+        Open a capture file for reading.
+
+        Args:
+            path: Path of the capture file
+        """
+        self.path = path
+
+    def __iter__(self):
+        """
+        Yield records in file order.
+
+        Yields:
+            Tuples of (timestamp in seconds, payload bytes)
+        """
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a capture file")
+
+        view = memoryview(data)
+        offset = len(MAGIC)
+        end = len(data)
+        while offset + RECORD_HEADER.size <= end:
+            ts, length = RECORD_HEADER.unpack_from(view, offset)
+            offset += RECORD_HEADER.size
+            if offset + length > end:
+                break  # truncated last record
+            yield ts / 1_000_000, bytes(view[offset:offset + length])
+            offset += length
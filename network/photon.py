@@ -3,7 +3,9 @@ import sys
 import threading
 import logging
 from photon_packet_parser import PhotonPacketParser
-from scapy.all import UDP, sniff
+from network.capture import open_backend
+from network.capture_file import CaptureWriter
+from shared.constants import CAPTURE_BACKEND
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -14,39 +16,57 @@ logging.basicConfig(
 )
 
 class Photon:
-    def __init__(self) -> None:
+    def __init__(self, record_path=None, sniff=True, backend=CAPTURE_BACKEND) -> None:
+        """
+        Args:
+            record_path: Optional capture file receiving every UDP payload
+            sniff: Start the capture thread, False to feed payloads manually
+            backend: Capture backend name passed to network.capture.open_backend
+        """
         logger.info("Initializing Photon packet handler")
         self.parser = PhotonPacketParser(
             self.on_event, self.on_request, self.on_response
         )
+        self.function_request_map = {}
+        self.function_event_map = {}
+
+        self.recorder = CaptureWriter(record_path) if record_path else None
+        if self.recorder:
+            logger.info(f"Recording UDP payloads to {record_path}")
+
+        self.backend = open_backend(backend) if sniff else None
         self.stop_sniffing = threading.Event()
         self.sniffing_thread = threading.Thread(target=self.start_sniffing)
         self.sniffing_thread.daemon = True
-        self.sniffing_thread.start()
-        logger.info("Photon sniffing thread started")
-
-        self.function_request_map = {}
-        self.function_event_map = {}
+        if sniff:
+            self.sniffing_thread.start()
+            logger.info("Photon sniffing thread started")
 
         signal.signal(signal.SIGINT, self.handle_exit)
 
     def start_sniffing(self):
-        logger.info("Starting UDP packet capture on ports 5056 and 5055")
+        ports = " and ".join(str(port) for port in self.backend.ports)
+        logger.info(f"Starting UDP packet capture on ports {ports} ({self.backend.name} backend)")
         try:
-            sniff(
-                prn=self.packet_callback, filter="udp and (port 5056 or port 5055)", store=0
-            )
+            self.backend.run(self.handle_batch, self.stop_sniffing)
         except Exception as e:
             logger.error(f"Error in packet sniffing: {str(e)}", exc_info=True)
 
-    def packet_callback(self, packet):
-        if UDP in packet:
-            udp_payload = bytes(packet[UDP].payload)
+    def handle_batch(self, batch):
+        """
+        Args:
+            batch: List of (udp payload, capture timestamp) tuples
+        """
+        for payload, timestamp in batch:
+            if self.recorder:
+                self.recorder.write(payload, timestamp)
+            self.handle_payload(payload)
 
-            try:
-                self.parser.HandlePayload(udp_payload)
-            except Exception as e:
-                logger.debug(f"Error handling payload: {str(e)}")
+    def handle_payload(self, payload):
+        try:
+            self.parser.HandlePayload(payload)
+        except Exception as e:
+            logger.debug(f"Error handling payload: {str(e)}")
 
     def map_request(self, id, func):
         logger.debug(f"Mapping request handler for ID: {id}")
@@ -59,12 +79,19 @@ class Photon:
     def handle_exit(self, signum, frame):
         logger.info("Received exit signal, shutting down")
         self.stop_sniffing.set()
+        if self.recorder:
+            self.recorder.close()
         sys.exit(0)
 
     def stop(self):
         logger.info("Stopping packet sniffing")
         self.stop_sniffing.set()
-        self.sniffing_thread.join()
+        if self.sniffing_thread.is_alive():
+            # scapy only checks stop_filter when the next packet arrives
+            self.sniffing_thread.join(timeout=1.0)
+        if self.recorder:
+            self.recorder.close()
+            logger.info(f"Recorded {self.recorder.count} payloads to {self.recorder.path}")
         logger.info("Packet sniffing stopped")
 
     def on_event(self, data):
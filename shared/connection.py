@@ -0,0 +1,131 @@
+"""
+SQLite connection management shared by the collector and market_app components.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from .constants import DATABASE_READERS, DATABASE_BUSY_TIMEOUT_MS
+from .migrations import migrate
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+class ConnectionManager:
+    """
+    Owns one writer connection and a small pool of read-only connections.
+
+    The database is switched to WAL journaling so readers see a consistent
+    snapshot while the writer commits, and every connection waits on
+    busy_timeout instead of failing with "database is locked".
+    """
+
+    def __init__(self, db_path, readers=DATABASE_READERS, busy_timeout=DATABASE_BUSY_TIMEOUT_MS,
+                 migrate=migrate):
+        """
+        Initialize the manager, connections are opened on first use.
+
+        Args:
+            db_path: Path to the SQLite database file
+            readers: Maximum number of pooled read-only connections
+            busy_timeout: Milliseconds to wait for a lock before giving up
+            migrate: Function bringing the schema up to date on the writer connection
+        """
+        self.db_path = db_path
+        self.migrate = migrate
+        self.max_readers = readers
+        self.busy_timeout = busy_timeout
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._readers = queue.LifoQueue()
+        self._all_readers = []
+        self._readers_lock = threading.Lock()
+
+    def _open(self):
+        """Open a connection with the shared pragmas applied."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=self.busy_timeout / 1000)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        return conn
+
+    def writer(self):
+        """
+        Get the writer connection, creating the database if needed.
+
+        Returns:
+            The sqlite3 connection used for all writes
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                directory = os.path.dirname(self.db_path)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory, exist_ok=True)
+                conn = self._open()
+                mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+                # NORMAL is durable across application crashes in WAL mode
+                conn.execute("PRAGMA synchronous = NORMAL")
+                self.migrate(conn)
+                logger.debug(f"Opened writer connection to {self.db_path} (journal_mode={mode})")
+                self._writer = conn
+            return self._writer
+
+    @contextmanager
+    def write(self):
+        """
+        Run a block in a write transaction on the writer connection.
+
+        Writes from different threads are serialized, the transaction is
+        committed when the block exits and rolled back on error.
+        """
+        with self._writer_lock:
+            conn = self.writer()
+            with conn:
+                yield conn
+
+    @contextmanager
+    def reader(self):
+        """
+        Borrow a read-only connection from the pool.
+
+        Blocks until a connection is free once the pool is at its maximum size.
+        """
+        # Make sure the file exists and is migrated before anyone reads it
+        self.writer()
+
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._readers_lock:
+                if len(self._all_readers) < self.max_readers:
+                    conn = self._open()
+                    conn.execute("PRAGMA query_only = ON")
+                    self._all_readers.append(conn)
+            if conn is None:
+                conn = self._readers.get()
+
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    def close(self):
+        """Close the writer and every pooled reader connection."""
+        with self._readers_lock:
+            for conn in self._all_readers:
+                conn.close()
+            self._all_readers.clear()
+            self._readers = queue.LifoQueue()
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
@@ -40,11 +40,63 @@ SHORTNAME = {
 DATABASE_PATH = "Market.db"
 DATABASE_AVG_PATH = "Average.db"
 EXPORT_DIR = "Databases"
+ITEMS_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "items.csv")
+ITEMS_CACHE_PATH = ITEMS_CSV_PATH + ".cache.npz"  # rebuilt whenever items.csv changes
+DATABASE_READERS = 4  # pooled read-only connections per process
+DATABASE_BUSY_TIMEOUT_MS = 5000
+
+# Orders older than this are overwritten regardless of price
+ORDER_STALE_MINUTES = int(os.getenv("ORDER_STALE_MINUTES", "30"))
+
+# Price history retention in Average.db
+HISTORY_RAW_RETENTION_HOURS = 48  # raw points are rolled into hourly buckets after this
+HISTORY_HOURLY_RETENTION_DAYS = 30  # hourly buckets are rolled into daily buckets after this
+HISTORY_DAILY_RETENTION_DAYS = 365  # daily buckets are deleted after this
+HISTORY_COMPACT_INTERVAL = 600  # seconds between background compactions
+
+# Packet capture
+PHOTON_PORTS = (5056, 5055)  # UDP ports used by the game servers
+CAPTURE_BACKEND = os.getenv("CAPTURE_BACKEND", "auto")  # "auto", "raw", "scapy" or a .pcap file path
+CAPTURE_BATCH_SIZE = 64  # max payloads handed to the parser at once
+
+# Collector write-behind queue
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "50000"))  # max queued orders
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "0.5"))  # seconds
+INGEST_BACKPRESSURE = os.getenv("INGEST_BACKPRESSURE", "drop_oldest")  # "drop_oldest" or "block"
+
+# Collector duplicate page suppression
+DEDUP_WINDOW_SECONDS = float(os.getenv("DEDUP_WINDOW_SECONDS", "60"))  # 0 disables it
+PAGE_DIGEST_CACHE_SIZE = 256  # recent pages remembered per location and side
+APPLIED_PRICE_CACHE_SIZE = 200000  # last applied prices remembered over all items
+
+# Live price snapshot shared by the collector and the market app
+PRICE_SNAPSHOT_PATH = os.getenv("PRICE_SNAPSHOT_PATH", "Market.snapshot")  # empty disables it
+SNAPSHOT_LOCATIONS = 16  # location codes the snapshot file has room for
+SNAPSHOT_REFRESH_INTERVAL = 1.0  # seconds between refreshes of an idle collector
+SNAPSHOT_STALE_SECONDS = 5.0  # readers fall back to SQLite when the collector is silent this long
+SNAPSHOT_BUSY_SECONDS = 0.5  # longest a read waits for an update in progress before falling back to SQLite
+
+# GUI tables
+TABLE_PAGE_SIZE = 200  # rows per page when no limit is given
+TABLE_PAGE_LIMIT = 1000  # most rows returned by one page request
+LIVE_UPDATE_INTERVAL = float(os.getenv("LIVE_UPDATE_INTERVAL", "0.5"))  # seconds between checks, 0 disables
+REQUEST_WORKERS = int(os.getenv("REQUEST_WORKERS", "4"))  # threads running GUI requests
+REQUEST_POLL_INTERVAL = 0.005  # seconds between checks whether a request finished
+
+# Headless HTTP query service (python -m market_app serve)
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")  # only local clients by default
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8765"))
+SERVER_KEEPALIVE_SECONDS = 15  # idle keep-alive connections are closed after this
+SERVER_MAX_HEADER_BYTES = 16384  # larger request heads are refused
+SERVER_GZIP_MIN_BYTES = 1024  # smaller responses are sent uncompressed
+SERVER_MAX_WAIT_SECONDS = 60  # longest a client may wait for changed data
+SERVER_WAIT_POLL_SECONDS = 0.25  # seconds between version checks while a client waits
 
 # Default settings
 DEFAULT_TIER = os.getenv("SET_FILTER_TIER", "")
 DEFAULT_DIFF_SHOW = float(os.getenv("LEAST_DIFF_SHOW", "1.3"))
 DEFAULT_QUALITIES = [int(i) for i in os.getenv("SET_FILTER_QUALITY", "1,2,3").split(",")]
+DEFAULT_MAX_AGE = int(os.getenv("SET_FILTER_MAX_AGE", "0"))  # minutes, 0 shows prices of any age
 
 # Market fee constants
 MARKET_TAX = 0.04  # 4% market tax
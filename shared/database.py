@@ -1,12 +1,13 @@
 """
 Shared database operations for both collector and market_app components.
 """
-import sqlite3
 import pandas as pd
 import os
-from datetime import datetime, timezone
-from .constants import DATABASE_PATH, DATABASE_AVG_PATH, EXPORT_DIR
-from .filter import regex_filter
+import time
+from .constants import DATABASE_PATH, DATABASE_AVG_PATH, EXPORT_DIR, ORDER_STALE_MINUTES
+from .filter import parse_item_id
+from .connection import ConnectionManager
+from .price_history import SIDE_CODES
 import logging
 
 # Set up logging
@@ -17,49 +18,323 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
+# Price column, timestamp column and "better price" operator for each order side
+ORDER_SIDES = {
+    "sell": ("sell_min", "sell_min_datetime", "<"),
+    "buy": ("buy_max", "buy_max_datetime", ">"),
+}
+
+# Columns returned for a location, in the order of the former per-location tables
+PRICE_COLUMNS = "id, quality, enchant, sell_min, buy_max, sell_min_datetime, buy_max_datetime, tier"
+
+# Same columns with prices older than a cutoff blanked out
+FRESH_COLUMNS = """id, quality, enchant,
+    CASE WHEN sell_min_datetime >= ? THEN sell_min END AS sell_min,
+    CASE WHEN buy_max_datetime >= ? THEN buy_max END AS buy_max,
+    sell_min_datetime, buy_max_datetime, tier"""
+
+# Columns of CSV exports, as written before prices were stored in one table
+EXPORT_COLUMNS = ["id", "quality", "enchant", "sell_min", "buy_max", "sell_min_datetime", "buy_max_datetime"]
+
+
+def depth_key(location):
+    """Key under which the version of a location's order book ladders is counted."""
+    return f"{location}:depth"
+
+
+def cleared_key(location):
+    """Key under which the number of times a location was cleared is counted."""
+    return f"{location}:cleared"
+
+
+def now_ms():
+    """Current time as integer epoch milliseconds, the format of stored order timestamps."""
+    return int(time.time() * 1000)
+
 
 class MarketDatabase:
     """Handles database operations for the market data system."""
     
-    def __init__(self, db_path=DATABASE_PATH):
-        """Initialize the database connection."""
+    def __init__(self, db_path=DATABASE_PATH, stale_minutes=ORDER_STALE_MINUTES):
+        """
+        Initialize the database connection manager.
+        
+        Args:
+            db_path: Path of the market database
+            stale_minutes: Age after which a stored price is replaced even by a worse one
+        """
         self.db_path = db_path
-        self.conn = None
+        self.stale_ms = int(stale_minutes * 60000)
+        self.connections = ConnectionManager(db_path)
+        self._location_codes = {}
     
     def connect(self):
-        """Connect to the database."""
-        if not self.conn:
-            if not os.path.exists(os.path.dirname(self.db_path)) and os.path.dirname(self.db_path):
-                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        return self.conn
+        """Connect to the database and return the writer connection."""
+        return self.connections.writer()
     
     def close(self):
-        """Close the database connection."""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
+        """Close all database connections."""
+        self.connections.close()
+        self._location_codes.clear()
+    
+    def location_code(self, location, create=False):
+        """
+        Get the integer code a location is stored under in market_prices.
+        
+        Codes never change once assigned, so they are cached per instance.
+        
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            create: Assign a new code if the location has never been written
+            
+        Returns:
+            The location code, or None for unknown locations when create is False
+        """
+        code = self._location_codes.get(location)
+        if code is not None:
+            return code
+        
+        if create:
+            with self.connections.write() as conn:
+                conn.execute("INSERT OR IGNORE INTO locations(name) VALUES(?)", (location,))
+                rows = conn.execute("SELECT name, code FROM locations").fetchall()
+        else:
+            with self.connections.reader() as conn:
+                rows = conn.execute("SELECT name, code FROM locations").fetchall()
+        self._location_codes.update(rows)
+        return self._location_codes.get(location)
+    
+    def apply_orders(self, location, side, orders, timestamp=None):
+        """
+        Write a batch of orders for one location in a single transaction.
+        
+        Orders are reduced per item with the same rules the upsert applies,
+        in the order given, before being upserted. A price replaces the
+        stored one only if it was seen at the same time or later, and is
+        better or the stored price is stale. The rules are evaluated by
+        SQLite on the integer epoch millisecond timestamps, so an older
+        observation never replaces a newer one.
+        
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            side: Either "sell" or "buy"
+            orders: Iterable of (item_id, price, quality, enchant) tuples, or
+                (item_id, price, quality, enchant, seen_ms) tuples for orders
+                seen at different times, in the order they were seen. The
+                stored enchantment level is taken from the item ID.
+            timestamp: Epoch milliseconds the orders without their own time
+                were seen at, now by default
+            
+        Returns:
+            Number of distinct items written
+        """
+        price_col, time_col, better = ORDER_SIDES[side]
+        now = now_ms() if timestamp is None else int(timestamp)
+        
+        # Keep the lowest sell / highest buy price for each item,
+        # tier and enchantment are derived from the item ID so filters can use them
+        best = {}
+        for order in orders:
+            item_id, price, quality = order[0], order[1], order[2]
+            if item_id is None or quality is None:
+                continue
+            seen = int(order[4]) if len(order) > 4 else now
+            key = (item_id, quality) + parse_item_id(item_id)
+            current = best.get(key)
+            if current is None or (seen >= current[1] and (
+                    (price < current[0] if side == "sell" else price > current[0])
+                    or seen - current[1] > self.stale_ms)):
+                best[key] = (price, seen)
+        
+        if not best:
+            return 0
+        
+        code = self.location_code(location, create=True)
+        with self.connections.write() as conn:
+            # Take the write lock first so no other process can use the same row version
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT version FROM location_versions WHERE location = ?", (location,)).fetchone()
+            version = (row[0] if row else 0) + 1
+            changes = conn.total_changes
+            conn.executemany(
+                f"""
+                INSERT INTO market_prices(location, id, quality, tier, enchant, {price_col}, {time_col}, version)
+                VALUES({code}, ?, ?, ?, ?, ?, ?, {version})
+                ON CONFLICT(location, id, quality, enchant) DO UPDATE SET
+                    {price_col} = excluded.{price_col},
+                    {time_col} = excluded.{time_col},
+                    version = excluded.version
+                WHERE {price_col} IS NULL
+                   OR {time_col} IS NULL
+                   OR (excluded.{time_col} >= {time_col}
+                       AND (excluded.{price_col} {better} {price_col}
+                            OR excluded.{time_col} - {time_col} > {self.stale_ms}))
+                """,
+                [key + best_price for key, best_price in best.items()]
+            )
+            # Upserts rejected by the WHERE clause do not count as changes,
+            # changed rows carry the version the location is bumped to
+            if conn.total_changes > changes:
+                self._bump_version(conn, location)
+        
+        logger.debug(f"Applied {len(best)} {side} orders at location {location}.")
+        return len(best)
+    
+    def replace_ladders(self, location, side, ladders, updated=None):
+        """
+        Replace the order book ladders of some items in a single transaction.
+        
+        Each ladder fully replaces the one stored for its item, so readers
+        see either the previous or the refreshed page, never a mix.
+        
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            side: Either "sell" or "buy"
+            ladders: Dict of (item_id, quality, enchant) -> ladder array,
+                see shared.order_book.to_ladder
+            updated: Optional epoch milliseconds of the refresh, defaults to now
+            
+        Returns:
+            Number of ladders written
+        """
+        if not ladders:
+            return 0
+        
+        code = self.location_code(location, create=True)
+        updated = now_ms() if updated is None else updated
+        rows = []
+        for (item_id, quality, _), ladder in ladders.items():
+            tier, enchant = parse_item_id(item_id)
+            rows.append((code, SIDE_CODES[side], item_id, quality, enchant, tier, updated, ladder.tobytes()))
+        
+        with self.connections.write() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO order_book(location, side, id, quality, enchant, tier, updated, levels) "
+                "VALUES(?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._bump_version(conn, depth_key(location))
+        
+        logger.debug(f"Replaced {len(rows)} {side} ladders at location {location}.")
+        return len(rows)
+    
+    def get_ladders(self, locations, side, filter_obj=None):
+        """
+        Get the stored order book ladders of several locations.
+        
+        Args:
+            locations: Iterable of location names
+            side: Either "sell" or "buy"
+            filter_obj: Optional Filter object, the age filter applies to the
+                time the ladder was last refreshed
+            
+        Returns:
+            DataFrame with location, id, quality, enchant, updated and levels
+            columns, levels holding the raw ladder bytes
+        """
+        codes = {}
+        for location in locations:
+            code = self.location_code(location)
+            if code is not None:
+                codes[code] = location
+        if not codes:
+            return pd.DataFrame()
+        
+        params = [SIDE_CODES[side]] + list(codes)
+        clause = f"side = ? AND location IN ({', '.join('?' * len(codes))})"
+        needs_regex = False
+        if filter_obj:
+            filter_clause, filter_params, needs_regex = filter_obj.to_sql(time_columns=("updated",))
+            clause += f" AND {filter_clause}"
+            params += filter_params
+        
+        query = (f"SELECT location, id, quality, enchant, updated, levels FROM order_book "
+                 f"WHERE {clause} ORDER BY location, id, quality")
+        with self.connections.reader() as conn:
+            df = pd.read_sql_query(query, conn, params=params)
+        if df.empty:
+            return pd.DataFrame()
+        
+        if needs_regex:
+            df = df[filter_obj.mask(df["id"])].reset_index(drop=True)
+        
+        df["location"] = df["location"].map(codes)
+        return df
+    
+    def _bump_version(self, conn, location):
+        """
+        Increment the change counter of a location inside the current transaction.
+        
+        Args:
+            conn: Writer connection inside a transaction
+            location: The location name (e.g., "BlackMarket")
+        """
+        conn.execute(
+            "INSERT INTO location_versions(location, version) VALUES(?, 1) "
+            "ON CONFLICT(location) DO UPDATE SET version = version + 1",
+            (location,)
+        )
+    
+    def get_location_versions(self, locations):
+        """
+        Get the change counters of some locations.
+        
+        The counter grows every time a write changes the location's data,
+        from this process or any other one using the same database file.
+        
+        Args:
+            locations: Iterable of location names
+            
+        Returns:
+            Tuple of versions in the same order, 0 for locations never written
+        """
+        locations = list(locations)
+        with self.connections.reader() as conn:
+            rows = conn.execute(
+                f"SELECT location, version FROM location_versions "
+                f"WHERE location IN ({', '.join('?' * len(locations))})",
+                locations
+            ).fetchall()
+        versions = dict(rows)
+        return tuple(versions.get(location, 0) for location in locations)
     
-    def ensure_table_exists(self, location):
+    def get_price_changes(self, location, since_version=-1):
         """
-        Make sure the table for a given location exists.
+        Get the rows of a location changed after a location version.
+        
+        Every write stamps the rows it changes with the version the location
+        is bumped to, so a reader that remembers the highest version it has
+        seen can fetch exactly the rows written since.
         
         Args:
             location: The location name (e.g., "BlackMarket")
+            since_version: Highest row version already seen, -1 for all rows
+            
+        Returns:
+            DataFrame with id, quality, sell_min, buy_max, sell_min_datetime,
+            buy_max_datetime and version columns
         """
-        conn = self.connect()
-        conn.execute(f"""
-            CREATE TABLE IF NOT EXISTS {location} (
-                id TEXT,
-                quality INT,
-                enchant INT,
-                sell_min INT,
-                buy_max INTEGER,
-                sell_min_datetime DATETIME,
-                buy_max_datetime DATETIME
+        code = self.location_code(location)
+        if code is None:
+            return pd.DataFrame()
+        with self.connections.reader() as conn:
+            return pd.read_sql_query(
+                "SELECT id, quality, sell_min, buy_max, sell_min_datetime, buy_max_datetime, version "
+                "FROM market_prices WHERE location = ? AND version > ?",
+                conn, params=(code, since_version)
             )
-        """)
-        conn.commit()
+    
+    def get_location_names(self):
+        """
+        Get every location that was ever written.
+        
+        Returns:
+            Dict of location name to location code
+        """
+        with self.connections.reader() as conn:
+            rows = conn.execute("SELECT name, code FROM locations").fetchall()
+        self._location_codes.update(rows)
+        return dict(rows)
     
     def update_sell_order(self, location, item_id, quality, enchant, price):
         """
@@ -72,35 +347,7 @@ class MarketDatabase:
             enchant: The enchantment level
             price: The price in silver
         """
-        self.ensure_table_exists(location)
-        conn = self.connect()
-        cur = conn.cursor()
-        
-        # Check if record exists
-        entry = cur.execute(
-            f"SELECT * FROM {location} WHERE id = ? AND quality = ?", 
-            (item_id, quality)
-        ).fetchone()
-        
-        if entry is None:
-            # Insert new record
-            cur.execute(
-                f"INSERT INTO {location}(id, quality, sell_min, sell_min_datetime, enchant) VALUES(?, ?, ?, ?, ?)", 
-                (item_id, quality, price, datetime.now(timezone.utc), enchant)
-            )
-            logger.info(f"Added new sell order for item {item_id} at location {location} with price {price}.")
-        else:
-            # Update existing record if price is lower or data is outdated
-            if entry[3] is None or price < entry[3] or \
-               entry[5] is None or (datetime.now(timezone.utc) - datetime.fromisoformat(entry[5])).total_seconds() / 60 > 30:
-                cur.execute(
-                    f"UPDATE {location} SET sell_min = ?, sell_min_datetime = ? WHERE id = ? AND quality = ?", 
-                    (price, datetime.now(timezone.utc), item_id, quality)
-                )
-                
-                logger.info(f"Updated sell order for item {item_id} at location {location} with price {price}.")
-        
-        conn.commit()
+        self.apply_orders(location, "sell", [(item_id, price, quality, enchant)])
     
     def update_buy_order(self, location, item_id, quality, enchant, price):
         """
@@ -113,35 +360,7 @@ class MarketDatabase:
             enchant: The enchantment level
             price: The price in silver
         """
-        self.ensure_table_exists(location)
-        conn = self.connect()
-        cur = conn.cursor()
-        
-        # Check if record exists
-        entry = cur.execute(
-            f"SELECT * FROM {location} WHERE id = ? AND quality = ?", 
-            (item_id, quality)
-        ).fetchone()
-        
-        if entry is None:
-            # Insert new record
-            cur.execute(
-                f"INSERT INTO {location}(id, quality, buy_max, buy_max_datetime, enchant) VALUES(?, ?, ?, ?, ?)", 
-                (item_id, quality, price, datetime.now(timezone.utc), enchant)
-            )
-            logger.info(f"Added new buy order for item {item_id} at location {location} with price {price}.")
-        else:
-            # Update existing record if price is higher or data is outdated
-            if entry[4] is None or price > entry[4] or \
-               entry[6] is None or (datetime.now(timezone.utc) - datetime.fromisoformat(entry[6])).total_seconds() / 60 > 30:
-                cur.execute(
-                    f"UPDATE {location} SET buy_max = ?, buy_max_datetime = ? WHERE id = ? AND quality = ?", 
-                    (price, datetime.now(timezone.utc), item_id, quality)
-                )
-                
-                logger.info(f"Updated buy order for item {item_id} at location {location} with price {price}.")
-        
-        conn.commit()
+        self.apply_orders(location, "buy", [(item_id, price, quality, enchant)])
     
     def get_location_data(self, location, filter_obj=None):
         """
@@ -154,31 +373,65 @@ class MarketDatabase:
         Returns:
             DataFrame containing the filtered data
         """
-        conn = self.connect()
+        df = self.get_locations_data([location], filter_obj)
+        return df.drop(columns="location") if not df.empty else df
+    
+    def get_locations_data(self, locations, filter_obj=None):
+        """
+        Get data for several locations with a single indexed query.
         
-        # Check if the table exists
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{location}'")
-        if not cursor.fetchone():
+        Args:
+            locations: Iterable of location names
+            filter_obj: Optional Filter object to filter the data
+            
+        Returns:
+            DataFrame containing the filtered data with a location column,
+            ordered by location, id and quality
+        """
+        codes = {}
+        for location in locations:
+            code = self.location_code(location)
+            if code is not None:
+                codes[code] = location
+        if not codes:
             return pd.DataFrame()
         
-        # Get the data
-        df = pd.read_sql_query(f"SELECT * FROM {location}", conn)
+        # Push the quality, tier and age filters down into the query
+        columns = PRICE_COLUMNS
+        params = list(codes)
+        clause = f"location IN ({', '.join('?' * len(codes))})"
+        needs_regex = False
+        if filter_obj:
+            filter_clause, filter_params, needs_regex = filter_obj.to_sql()
+            clause += f" AND {filter_clause}"
+            params += filter_params
+            cutoff = filter_obj.cutoff()
+            if cutoff is not None:
+                # Blank out the side of a row whose price is too old
+                columns = FRESH_COLUMNS
+                params = [cutoff, cutoff] + params
+        
+        query = f"SELECT location, {columns} FROM market_prices WHERE {clause} ORDER BY location, id, quality"
+        with self.connections.reader() as conn:
+            df = pd.read_sql_query(query, conn, params=params)
         if df.empty:
             return pd.DataFrame()
         
-        # Apply filtering if provided
-        if filter_obj:
-            df = df.sort_values(by=["id", "quality"])
-            df = df[df.quality.isin(filter_obj.qualities)]
-            df = df[df["id"].apply(regex_filter, filters=filter_obj.tiers)]
+        # Fall back to the compiled tier pattern for specs SQL cannot express
+        if needs_regex:
+            df = df[filter_obj.mask(df["id"])].reset_index(drop=True)
         
+        df["location"] = df["location"].map(codes)
         return df
     
     def export_to_csv(self, location, filter_obj=None):
         """
         Export data for a location to a CSV file.
         
+        The file keeps the original export format: the EXPORT_COLUMNS, with
+        order times as UTC date strings rather than the epoch milliseconds
+        stored in the database.
+        
         Args:
             location: The location name (e.g., "BlackMarket")
             filter_obj: Optional Filter object to filter the data
@@ -190,6 +443,11 @@ class MarketDatabase:
         if df.empty:
             return None
         
+        df = df[EXPORT_COLUMNS].copy()
+        for column in ("sell_min_datetime", "buy_max_datetime"):
+            times = pd.to_datetime(df[column], unit="ms", utc=True)
+            df[column] = times.dt.strftime("%Y-%m-%d %H:%M:%S.%f+00:00").where(times.notna(), None)
+        
         os.makedirs(EXPORT_DIR, exist_ok=True)
         csv_path = f'{EXPORT_DIR}/{location}.csv'
         df.to_csv(csv_path, index=False)
@@ -205,17 +463,16 @@ class MarketDatabase:
         Returns:
             True if successful, False otherwise
         """
-        conn = self.connect()
-        
-        # Check if the table exists
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{location}'")
-        if not cursor.fetchone():
-            logger.info(f"No table found for {location}")
+        code = self.location_code(location)
+        if code is None:
+            logger.info(f"No data found for {location}")
             return False
         
-        # Delete the data
-        cursor.execute(f"DELETE FROM {location}")
-        conn.commit()
+        with self.connections.write() as conn:
+            conn.execute("DELETE FROM market_prices WHERE location = ?", (code,))
+            conn.execute("DELETE FROM order_book WHERE location = ?", (code,))
+            self._bump_version(conn, location)
+            self._bump_version(conn, depth_key(location))
+            self._bump_version(conn, cleared_key(location))
         logger.info(f"Deleted all data for location {location}.")
-        return True
\ No newline at end of file
+        return True
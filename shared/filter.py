@@ -3,20 +3,38 @@ Filter utility for market data handling.
 Used by both collector and market_app components.
 """
 import re
-from .constants import DEFAULT_TIER, DEFAULT_DIFF_SHOW, DEFAULT_QUALITIES
+import time
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from .constants import DEFAULT_TIER, DEFAULT_DIFF_SHOW, DEFAULT_QUALITIES, DEFAULT_MAX_AGE
+
+# Item IDs are encoded as tier * ENCHANT_SCALE + enchant, untiered items as -1
+ENCHANT_SCALE = 100
+TIER_PATTERN = r"^T(\d+)_[^@]*(?:@(\d+))?$"
+
+# Codes of every item ID seen by tier_codes
+_ID_CODES = {}
 
 class Filter:
     """Filter class for market data queries and display."""
     
-    def __init__(self, tiers=None, diff_show=None, qualities=None):
+    def __init__(self, tiers=None, diff_show=None, qualities=None, max_age=None):
         """Initialize filter with optional custom values or defaults."""
         self.tiers = tiers if tiers is not None else DEFAULT_TIER
         self.diff_show = diff_show if diff_show is not None else DEFAULT_DIFF_SHOW
         self.qualities = qualities if qualities is not None else DEFAULT_QUALITIES.copy()
+        self.max_age = max_age if max_age is not None else DEFAULT_MAX_AGE
+    
+    @property
+    def compiled(self):
+        """The compiled TierSpec for the current tier filter."""
+        return compile_tier_spec(self.tiers)
     
     def set_tier(self, tiers):
-        """Set the tier filter."""
+        """Set the tier filter and compile it."""
         self.tiers = tiers
+        compile_tier_spec(tiers)
     
     def set_quality(self, qualities):
         """Set the quality filter."""
@@ -26,6 +44,10 @@ class Filter:
         """Set the minimum price difference to show."""
         self.diff_show = diff
 
+    def set_max_age(self, minutes):
+        """Set the maximum price age in minutes, 0 to show prices of any age."""
+        self.max_age = minutes
+
     def get_tier(self):
         """Get the current tier filter."""
         return self.tiers
@@ -37,10 +59,265 @@ class Filter:
     def get_diff(self):
         """Get the current minimum price difference."""
         return self.diff_show
+
+    def get_max_age(self):
+        """Get the current maximum price age in minutes."""
+        return self.max_age
+    
+    def cutoff(self):
+        """
+        Oldest order timestamp accepted by the age filter.
+        
+        Rounded down to the minute, so results cached for this filter stay
+        valid for up to a minute.
+        
+        Returns:
+            Epoch milliseconds, or None when prices of any age are shown
+        """
+        if not self.max_age:
+            return None
+        minute = int(time.time() // 60) * 60000
+        return minute - int(self.max_age * 60000)
+        
+    def fingerprint(self):
+        """Hashable summary of the filter settings, used as a cache key."""
+        return (self.tiers, tuple(self.qualities), self.diff_show, self.cutoff())
+    
+    def snapshot(self):
+        """
+        Read-only copy of the current settings.
+        
+        Requests running in other threads work on a snapshot, so changing
+        the filter meanwhile does not change their results halfway.
+        
+        Returns:
+            FilterSnapshot instance
+        """
+        return FilterSnapshot(self.tiers, self.diff_show, tuple(self.qualities), self.max_age)
+    
+    def to_sql(self, time_columns=("sell_min_datetime", "buy_max_datetime")):
+        """
+        Translate the quality, tier and age filters into a parameterized WHERE clause.
+        
+        Args:
+            time_columns: Timestamp columns checked by the age filter, a row
+                passes if any of them is recent enough
+        
+        Returns:
+            Tuple of (clause, params, needs_regex). needs_regex is True when the
+            tier spec could not be expressed in SQL and rows still have to be
+            matched against the compiled tier pattern.
+        """
+        clauses = []
+        params = []
+        
+        clauses.append(f"quality IN ({', '.join('?' * len(self.qualities))})" if self.qualities else "0")
+        params.extend(self.qualities)
+        
+        spec = self.compiled
+        needs_regex = spec.pattern is not None
+        if spec.pairs:
+            tier_clauses = []
+            for tier, enchants in spec.pairs:
+                if enchants is None:
+                    tier_clauses.append("tier = ?")
+                    params.append(tier)
+                else:
+                    tier_clauses.append(f"(tier = ? AND enchant IN ({', '.join('?' * len(enchants))}))")
+                    params.append(tier)
+                    params.extend(enchants)
+            clauses.append(f"({' OR '.join(tier_clauses)})")
+        
+        cutoff = self.cutoff()
+        if cutoff is not None:
+            clauses.append(f"({' OR '.join(f'{column} >= ?' for column in time_columns)})")
+            params.extend([cutoff] * len(time_columns))
+        
+        return " AND ".join(clauses), params, needs_regex
+    
+    def mask(self, ids):
+        """
+        Vectorized tier match for a Series of item IDs.
+        
+        Args:
+            ids: pandas Series of item IDs
+            
+        Returns:
+            Boolean numpy array, True where the item matches the tier filter
+        """
+        return self.compiled.mask(ids)
         
     def __str__(self):
         """String representation of the filter."""
-        return f"Filter(tiers={self.tiers}, qualities={self.qualities}, diff_show={self.diff_show})"
+        return (f"Filter(tiers={self.tiers}, qualities={self.qualities}, diff_show={self.diff_show}, "
+                f"max_age={self.max_age})")
+
+class FilterSnapshot(Filter):
+    """Read-only Filter, safe to share between threads."""
+    
+    def __init__(self, tiers, diff_show, qualities, max_age):
+        """Freeze the given settings, qualities being a tuple."""
+        for name, value in (("tiers", tiers), ("diff_show", diff_show), ("qualities", qualities),
+                            ("max_age", max_age)):
+            object.__setattr__(self, name, value)
+    
+    def __setattr__(self, name, value):
+        """Refuse every change."""
+        raise AttributeError(f"Filter snapshots are read-only, cannot set {name}")
+    
+    def snapshot(self):
+        """A snapshot is its own snapshot."""
+        return self
+
+@lru_cache(maxsize=None)
+def parse_item_id(item_id):
+    """
+    Split an item ID into its tier and enchantment level.
+    
+    Args:
+        item_id: The item ID (e.g. "T4_BAG@1")
+        
+    Returns:
+        Tuple of (tier, enchant), tier is None for items without a tier prefix
+    """
+    if not item_id:
+        return None, 0
+    base, _, suffix = item_id.partition("@")
+    enchant = int(suffix) if suffix.isdigit() else 0
+    tier = None
+    if base.startswith("T") and "_" in base:
+        head = base[1:base.index("_")]
+        if head.isdigit():
+            tier = int(head)
+    return tier, enchant
+
+
+@lru_cache(maxsize=128)
+def parse_tiers(tiers):
+    """
+    Parse a tiers string (e.g. "4.0 5.1") into (tier, enchants) pairs.
+    
+    Matches the semantics of re_tiers: "4.0" selects unenchanted tier 4 items,
+    a tier without an enchantment level selects every enchantment.
+    
+    Args:
+        tiers: String describing tiers to filter for (e.g. "4.0 5.1")
+        
+    Returns:
+        Tuple of (tier, sorted enchant tuple or None for any), or None if the
+        string cannot be parsed
+    """
+    spec = {}
+    for token in tiers.split():
+        tier, _, enchant = token.partition(".")
+        if not tier.isdigit() or (enchant and not enchant.isdigit()):
+            return None
+        enchants = spec.setdefault(int(tier), set())
+        if enchants is not None:
+            if enchant:
+                enchants.add(int(enchant))
+            else:
+                spec[int(tier)] = None
+    return tuple((tier, None if enchants is None else tuple(sorted(enchants))) for tier, enchants in spec.items())
+
+
+@lru_cache(maxsize=128)
+def compile_tiers(tiers):
+    """
+    Compile the regex pattern for a tiers string once.
+    
+    Args:
+        tiers: String describing tiers to filter for (e.g. "4.0 5.1")
+        
+    Returns:
+        Compiled regex pattern
+    """
+    return re.compile(re_tiers(tiers))
+
+
+class TierSpec:
+    """
+    Compiled form of a tier filter string.
+    
+    Holds the parsed (tier, enchants) pairs used for SQL pushdown and their
+    integer codes used by the vectorized mask. Specs that cannot be parsed
+    keep the compiled regex as a fallback.
+    """
+    
+    def __init__(self, tiers):
+        """Compile a tier filter string (e.g. "4.0 5.1")."""
+        self.tiers = tiers
+        self.match_all = not tiers
+        pairs = () if self.match_all else parse_tiers(tiers)
+        self.pattern = compile_tiers(tiers) if pairs is None else None
+        self.pairs = pairs or ()
+        self.any_enchant_tiers = np.array([tier for tier, enchants in self.pairs if enchants is None], dtype=np.int64)
+        self.codes = np.array(
+            [tier * ENCHANT_SCALE + enchant for tier, enchants in self.pairs if enchants for enchant in enchants],
+            dtype=np.int64
+        )
+    
+    def mask(self, ids):
+        """
+        Vectorized tier match for a Series of item IDs.
+        
+        Args:
+            ids: pandas Series of item IDs
+            
+        Returns:
+            Boolean numpy array, True where the item matches
+        """
+        if self.match_all:
+            return (ids.notna() & (ids != "")).to_numpy()
+        if self.pattern is not None:
+            return ids.apply(regex_filter, filters=self.tiers).to_numpy(dtype=bool)
+        
+        codes = tier_codes(ids)
+        return np.isin(codes, self.codes) | ((codes >= 0) & np.isin(codes // ENCHANT_SCALE, self.any_enchant_tiers))
+    
+    def __repr__(self):
+        """String representation of the compiled spec."""
+        return f"TierSpec({self.tiers!r}, pairs={self.pairs})"
+
+
+@lru_cache(maxsize=128)
+def compile_tier_spec(tiers):
+    """
+    Compile a tier filter string once, keyed on the string.
+    
+    Args:
+        tiers: String describing tiers to filter for (e.g. "4.0 5.1")
+        
+    Returns:
+        TierSpec instance
+    """
+    return TierSpec(tiers)
+
+
+def tier_codes(ids):
+    """
+    Encode item IDs as tier * ENCHANT_SCALE + enchant integers.
+    
+    IDs are factorized first and only IDs not seen before go through
+    the string extraction, so repeated calls cost a few array operations.
+    
+    Args:
+        ids: pandas Series of item IDs
+        
+    Returns:
+        numpy int64 array, -1 for missing or untiered IDs
+    """
+    positions, uniques = pd.factorize(ids)
+    unknown = [item_id for item_id in uniques if item_id not in _ID_CODES]
+    if unknown:
+        parts = pd.Series(unknown, dtype=object).str.extract(TIER_PATTERN)
+        tier = pd.to_numeric(parts[0]).fillna(-1).to_numpy(dtype=np.int64)
+        enchant = pd.to_numeric(parts[1]).fillna(0).to_numpy(dtype=np.int64)
+        _ID_CODES.update(zip(unknown, np.where(tier >= 0, tier * ENCHANT_SCALE + enchant, -1).tolist()))
+    
+    unique_codes = np.fromiter((_ID_CODES[item_id] for item_id in uniques), dtype=np.int64, count=len(uniques))
+    return np.where(positions >= 0, unique_codes[positions] if len(uniques) else -1, -1)
+
 
 def re_tiers(tiers):
     """
@@ -85,7 +362,7 @@ def regex_filter(val, filters):
         True if item matches the filter, False otherwise
     """
     if val:
-        mo = re.search(re_tiers(filters), val)
+        mo = compile_tiers(filters).search(val)
         if mo:
             return True
         else:
@@ -0,0 +1,271 @@
+"""
+Interned catalog of the items listed in items.csv.
+Loaded once per process and cached in a binary file next to the CSV.
+"""
+import os
+import csv
+import threading
+import logging
+import numpy as np
+import pandas as pd
+from .constants import ITEMS_CSV_PATH, ITEMS_CACHE_PATH
+from .filter import parse_item_id
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# Bump when the layout of the cache file changes
+CACHE_FORMAT = 1
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def _pack(strings):
+    """Encode a list of strings as one newline separated UTF-8 byte array."""
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack(blob):
+    """Decode a byte array written by _pack."""
+    return blob.tobytes().decode("utf-8").split("\n")
+
+
+def base_type(item_id):
+    """
+    Strip the tier prefix and enchantment suffix from an item ID.
+
+    Args:
+        item_id: The item ID (e.g. "T4_BAG@1")
+
+    Returns:
+        The base type shared by all tiers and enchantments (e.g. "BAG")
+    """
+    base = item_id.partition("@")[0]
+    tier, _ = parse_item_id(item_id)
+    return base[base.index("_") + 1:] if tier is not None else base
+
+
+class ItemCatalog:
+    """
+    Items from items.csv with integer row codes.
+
+    Every item ID is interned to its row index. Names, id_num values and the
+    parsed tier, enchantment level and base type are stored in arrays
+    indexed by that code, so lookups are O(1) and joins against market data
+    only need the integer codes.
+    """
+
+    def __init__(self, ids, names, id_nums, tiers, enchants, base_codes, bases):
+        """
+        Build the catalog from column arrays.
+
+        Args:
+            ids: List of item IDs in CSV order
+            names: List of display names
+            id_nums: Array of the id_num column
+            tiers: Array of tiers, -1 for untiered items
+            enchants: Array of enchantment levels
+            base_codes: Array of indexes into bases
+            bases: List of distinct base types
+        """
+        self.ids = np.array(ids, dtype=object)
+        self.names = np.array(names, dtype=object)
+        self.id_nums = np.asarray(id_nums, dtype=np.int64)
+        self.tiers = np.asarray(tiers, dtype=np.int8)
+        self.enchants = np.asarray(enchants, dtype=np.int8)
+        self.base_codes = np.asarray(base_codes, dtype=np.int32)
+        self.bases = np.array(bases, dtype=object)
+        self._index = pd.Index(ids)
+        self._codes = {item_id: code for code, item_id in enumerate(ids)}
+        self._num_codes = {int(num): code for code, num in enumerate(self.id_nums)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_csv(cls, path=ITEMS_CSV_PATH):
+        """
+        Parse items.csv.
+
+        Args:
+            path: Path of the CSV file with id, name and id_num columns
+
+        Returns:
+            ItemCatalog instance
+        """
+        ids, names, id_nums = [], [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                ids.append(row["id"])
+                names.append(row["name"])
+                id_nums.append(int(row["id_num"]))
+
+        tiers, enchants, base_codes, bases, base_index = [], [], [], [], {}
+        for item_id in ids:
+            tier, enchant = parse_item_id(item_id)
+            tiers.append(-1 if tier is None else tier)
+            enchants.append(enchant)
+            base = base_type(item_id)
+            if base not in base_index:
+                base_index[base] = len(bases)
+                bases.append(base)
+            base_codes.append(base_index[base])
+        return cls(ids, names, id_nums, tiers, enchants, base_codes, bases)
+
+    @classmethod
+    def load(cls, path=ITEMS_CSV_PATH, cache_path=ITEMS_CACHE_PATH):
+        """
+        Load the catalog from the binary cache, rebuilding it if the CSV changed.
+
+        Args:
+            path: Path of items.csv
+            cache_path: Path of the binary cache file, None to always parse the CSV
+
+        Returns:
+            ItemCatalog instance
+        """
+        stat = os.stat(path)
+        stamp = np.array([CACHE_FORMAT, stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with np.load(cache_path) as data:
+                    if np.array_equal(data["stamp"], stamp):
+                        return cls(_unpack(data["ids"]), _unpack(data["names"]), data["id_nums"],
+                                   data["tiers"], data["enchants"], data["base_codes"],
+                                   _unpack(data["bases"]))
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable item cache {cache_path}: {str(e)}")
+
+        catalog = cls.from_csv(path)
+        if cache_path:
+            catalog.save(cache_path, stamp)
+        logger.debug(f"Loaded {len(catalog)} items from {path}")
+        return catalog
+
+    def save(self, cache_path, stamp):
+        """
+        Write the binary cache file, failures are only logged.
+
+        Args:
+            cache_path: Path of the cache file
+            stamp: Array identifying the CSV version the cache was built from
+        """
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, stamp=stamp, ids=_pack(self.ids), names=_pack(self.names),
+                         id_nums=self.id_nums, tiers=self.tiers, enchants=self.enchants,
+                         base_codes=self.base_codes, bases=_pack(self.bases))
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write item cache {cache_path}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def code(self, item_id):
+        """
+        Get the code of an item ID.
+
+        Args:
+            item_id: The item ID (e.g. "T4_BAG@1")
+
+        Returns:
+            Row code of the item, -1 if it is not in the catalog
+        """
+        return self._codes.get(item_id, -1)
+
+    def codes(self, ids):
+        """
+        Vectorized code lookup.
+
+        Args:
+            ids: Sequence or Series of item IDs
+
+        Returns:
+            numpy array of codes, -1 for unknown IDs
+        """
+        return self._index.get_indexer(ids)
+
+    def code_of_num(self, id_num):
+        """
+        Get the code of an id_num value.
+
+        Args:
+            id_num: The numeric item ID from items.csv
+
+        Returns:
+            Row code of the item, -1 if it is not in the catalog
+        """
+        return self._num_codes.get(id_num, -1)
+
+    def name(self, item_id):
+        """
+        Get the display name of an item ID.
+
+        Args:
+            item_id: The item ID (e.g. "T4_BAG@1")
+
+        Returns:
+            The item name, or None for unknown IDs
+        """
+        code = self._codes.get(item_id)
+        return None if code is None else self.names[code]
+
+    def id_num(self, item_id):
+        """
+        Get the numeric ID of an item ID.
+
+        Args:
+            item_id: The item ID (e.g. "T4_BAG@1")
+
+        Returns:
+            The id_num value, or None for unknown IDs
+        """
+        code = self._codes.get(item_id)
+        return None if code is None else int(self.id_nums[code])
+
+    def take(self, values, codes, missing=None):
+        """
+        Gather a catalog column for an array of codes.
+
+        Args:
+            values: One of the catalog arrays, e.g. self.names
+            codes: Array of codes as returned by codes()
+            missing: Value used for codes of -1
+
+        Returns:
+            numpy array aligned with codes
+        """
+        codes = np.asarray(codes)
+        known = codes >= 0
+        if known.all():
+            return values[codes]
+        result = values[np.where(known, codes, 0)]
+        if missing is None and result.dtype.kind in "iu":
+            # Integer columns become float so unknown items can be NaN, like a left join
+            result = result.astype(float)
+            missing = np.nan
+        result[~known] = missing
+        return result
+
+
+def get_item_catalog():
+    """
+    Get the process-wide item catalog, loading it on first use.
+
+    Returns:
+        The shared ItemCatalog instance
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = ItemCatalog.load()
+    return _catalog
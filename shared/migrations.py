@@ -0,0 +1,234 @@
+"""
+Versioned schema migrations for the market database.
+The applied version is stored in SQLite's user_version header field.
+"""
+import logging
+from .constants import LOCATIONS
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+def location_tables(conn):
+    """
+    List the legacy one-table-per-location tables present in the database.
+
+    Args:
+        conn: Open sqlite3 connection
+
+    Returns:
+        List of table names
+    """
+    known = set(LOCATIONS.values())
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+    return [name for (name,) in rows if name in known]
+
+
+def merge_duplicates(conn, table, keys):
+    """
+    Merge rows of a legacy location table that share the same key into one.
+
+    Each side keeps its most recent price: the merged row takes sell_min and
+    buy_max, each with its own timestamp, from the row with the newest
+    timestamp for that side, the better price breaking ties. Rows without a
+    price on a side are only used when no row has one.
+
+    Args:
+        conn: Open sqlite3 connection inside a transaction
+        table: Legacy location table name
+        keys: Columns identifying an item, e.g. ("id", "quality")
+
+    Returns:
+        Number of rows removed
+    """
+    group = ", ".join(keys)
+    same = " AND ".join(f"d.{key} IS {table}.{key}" for key in keys)
+    sides = []
+    for price, time, better in (("sell_min", "sell_min_datetime", "ASC"), ("buy_max", "buy_max_datetime", "DESC")):
+        newest = (f"FROM {table} AS d WHERE {same} "
+                  f"ORDER BY d.{price} IS NULL, d.{time} IS NULL, d.{time} DESC, d.{price} {better} LIMIT 1")
+        sides.append(f"{price} = (SELECT d.{price} {newest}), {time} = (SELECT d.{time} {newest})")
+    conn.execute(f"""
+        UPDATE {table} SET {", ".join(sides)}
+        WHERE rowid IN (SELECT MAX(rowid) FROM {table} GROUP BY {group} HAVING COUNT(*) > 1)
+    """)
+    return conn.execute(f"""
+        DELETE FROM {table} WHERE rowid NOT IN (
+            SELECT MAX(rowid) FROM {table} GROUP BY {group}
+        )
+    """).rowcount
+
+
+def _migrate_v1(conn):
+    """Merge duplicate rows and add the unique (id, quality, enchant) index."""
+    for table in location_tables(conn):
+        removed = merge_duplicates(conn, table, ("id", "quality", "enchant"))
+        if removed:
+            logger.info(f"Removed {removed} duplicate rows from {table}")
+        conn.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_item ON {table}(id, quality, enchant)"
+        )
+
+
+# SQL equivalents of shared.filter.parse_item_id
+TIER_SQL = """CASE WHEN id GLOB 'T[0-9]*_*' AND substr(id, 2, instr(id, '_') - 2) NOT GLOB '*[^0-9]*'
+    THEN CAST(substr(id, 2, instr(id, '_') - 2) AS INT) END"""
+ENCHANT_SQL = "CASE WHEN instr(id, '@') > 0 THEN CAST(substr(id, instr(id, '@') + 1) AS INT) ELSE 0 END"
+
+
+def _migrate_v2(conn):
+    """Add the parsed tier column, derive enchant from the item id and index both."""
+    for table in location_tables(conn):
+        # enchant becomes a function of id, so (id, quality) must already be unique
+        merge_duplicates(conn, table, ("id", "quality"))
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN tier INT")
+        conn.execute(f"UPDATE {table} SET tier = {TIER_SQL}, enchant = {ENCHANT_SQL}")
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_tier ON {table}(tier, enchant, quality)"
+        )
+
+
+def _migrate_v3(conn):
+    """Add the per-location change counters used to validate cached results."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS location_versions (
+            location TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+
+
+# SQL converting an ISO 8601 text timestamp to epoch milliseconds
+EPOCH_MS_SQL = "CAST(round((julianday({column}) - 2440587.5) * 86400000) AS INTEGER)"
+
+
+def _migrate_v4(conn):
+    """Convert the text order timestamps to epoch milliseconds and index them."""
+    for table in location_tables(conn):
+        for column in ("sell_min_datetime", "buy_max_datetime"):
+            conn.execute(
+                f"UPDATE {table} SET {column} = {EPOCH_MS_SQL.format(column=column)} "
+                f"WHERE typeof({column}) = 'text'"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table}({column})")
+
+
+def _migrate_v5(conn):
+    """Move every per-location table into the single market_prices table."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS locations (
+            code INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS market_prices (
+            location INTEGER NOT NULL,
+            id TEXT NOT NULL,
+            quality INT NOT NULL,
+            enchant INT NOT NULL,
+            sell_min INT,
+            buy_max INTEGER,
+            sell_min_datetime INTEGER,
+            buy_max_datetime INTEGER,
+            tier INT,
+            PRIMARY KEY (location, id, quality, enchant)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_market_prices_tier ON market_prices(tier, enchant, quality)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_market_prices_sell_time ON market_prices(sell_min_datetime)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_market_prices_buy_time ON market_prices(buy_max_datetime)")
+
+    for table in location_tables(conn):
+        conn.execute("INSERT OR IGNORE INTO locations(name) VALUES(?)", (table,))
+        code = conn.execute("SELECT code FROM locations WHERE name = ?", (table,)).fetchone()[0]
+        moved = conn.execute(f"""
+            INSERT OR REPLACE INTO market_prices(location, id, quality, enchant, sell_min, buy_max,
+                                                 sell_min_datetime, buy_max_datetime, tier)
+            SELECT ?, id, quality, enchant, sell_min, buy_max, sell_min_datetime, buy_max_datetime, tier
+            FROM {table} WHERE id IS NOT NULL AND quality IS NOT NULL AND enchant IS NOT NULL
+        """, (code,)).rowcount
+        conn.execute(f"DROP TABLE {table}")
+        logger.info(f"Moved {moved} rows from {table} into market_prices")
+
+
+def _migrate_v6(conn):
+    """Add the order_book table holding full depth ladders per item and side."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS order_book (
+            location INTEGER NOT NULL,
+            side INT NOT NULL,
+            id TEXT NOT NULL,
+            quality INT NOT NULL,
+            enchant INT NOT NULL,
+            tier INT,
+            updated INTEGER NOT NULL,
+            levels BLOB NOT NULL,
+            PRIMARY KEY (location, side, id, quality, enchant)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migrate_v7(conn):
+    """Stamp market_prices rows with the location version of their last change."""
+    conn.execute("ALTER TABLE market_prices ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_market_prices_version ON market_prices(location, version)")
+
+
+# Ordered list of (version, migration function)
+MIGRATIONS = [
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+    (5, _migrate_v5),
+    (6, _migrate_v6),
+    (7, _migrate_v7),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn):
+    """
+    Bring the database schema up to SCHEMA_VERSION.
+
+    Each migration runs in its own transaction together with the version bump,
+    an up-to-date database only costs a single header read. The transaction
+    takes the write lock up front and reads the version again, so a
+    collector and an analyzer opening an old database at the same time do
+    not both apply the same step.
+
+    Args:
+        conn: Open sqlite3 connection
+
+    Returns:
+        The schema version after migrating
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return version
+
+    for target, step in MIGRATIONS:
+        if version >= target:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another connection may have migrated while we waited for the lock
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < target:
+                logger.info(f"Migrating database schema from version {version} to {target}")
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {target}")
+                version = target
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return version
@@ -0,0 +1,214 @@
+"""
+Order book depth ladders.
+
+A ladder holds every order of one item (id, quality, enchant) on one side of
+a market, best price first, in a packed numpy structured array that is stored
+as a BLOB in the order_book table.
+"""
+from datetime import datetime, timezone
+import numpy as np
+
+# One order book level, 28 bytes
+LADDER_DTYPE = np.dtype([
+    ("price", "<f8"),     # silver per unit
+    ("amount", "<i4"),    # units offered or requested
+    ("expires", "<i8"),   # epoch milliseconds, 0 if unknown
+    ("order_id", "<i8"),  # game order id, 0 if unknown
+])
+
+EMPTY_LADDER = np.zeros(0, dtype=LADDER_DTYPE)
+
+
+def parse_expires(value):
+    """
+    Convert the Expires field of a market order to epoch milliseconds.
+
+    Args:
+        value: ISO 8601 timestamp string as sent by the game, assumed UTC
+
+    Returns:
+        Epoch milliseconds, or 0 if the value is missing or malformed
+    """
+    if not value:
+        return 0
+    try:
+        expires = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return 0
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return int(expires.timestamp() * 1000)
+
+
+def group_levels(records):
+    """
+    Group parsed orders into the levels of each item.
+
+    Args:
+        records: Iterable of (item_id, price, quality, enchant, amount, expires, order_id)
+
+    Returns:
+        Dict of (item_id, quality, enchant) -> list of (price, amount, expires, order_id)
+    """
+    levels = {}
+    for item_id, price, quality, enchant, amount, expires, order_id in records:
+        if item_id is None or quality is None:
+            continue
+        levels.setdefault((item_id, quality, enchant), []).append((price, amount, expires, order_id))
+    return levels
+
+
+def to_ladder(levels, side):
+    """
+    Pack the levels of one item into a ladder.
+
+    Args:
+        levels: List of (price, amount, expires, order_id) tuples
+        side: Either "sell" (lowest price first) or "buy" (highest price first)
+
+    Returns:
+        Ladder array sorted best price first
+    """
+    ladder = np.array(levels, dtype=LADDER_DTYPE)
+    order = np.argsort(ladder["price"], kind="stable")
+    return ladder[order if side == "sell" else order[::-1]]
+
+
+def ladder_from_bytes(blob):
+    """
+    Decode a ladder stored in the order_book table.
+
+    Args:
+        blob: Bytes written by ladder.tobytes()
+
+    Returns:
+        Read-only ladder array
+    """
+    return np.frombuffer(blob, dtype=LADDER_DTYPE) if blob else EMPTY_LADDER
+
+
+def live_levels(ladder, now_ms):
+    """
+    Drop expired levels from a ladder.
+
+    Args:
+        ladder: Ladder array
+        now_ms: Current time in epoch milliseconds
+
+    Returns:
+        Ladder with only orders that have not expired
+    """
+    expires = ladder["expires"]
+    return ladder[(expires == 0) | (expires > now_ms)]
+
+
+def depth_below(asks, limit):
+    """
+    Measure the sell orders priced below a limit.
+
+    Args:
+        asks: Sell ladder, lowest price first
+        limit: Price limit in silver
+
+    Returns:
+        Tuple of (units, silver) needed to buy every unit priced below the limit
+    """
+    below = asks[asks["price"] < limit]
+    amounts = below["amount"].astype(np.int64)
+    return int(amounts.sum()), float((below["price"] * amounts).sum())
+
+
+def ladder_segments(asks, bids, sell_fee):
+    """
+    Split a sell ladder matched against a buy ladder into profitable segments.
+
+    Args:
+        asks: Sell ladder to buy from, lowest price first
+        bids: Buy ladder to sell into, highest price first
+        sell_fee: Fraction of the sale price lost to fees
+
+    Returns:
+        Tuple of (units, buy_price, sell_price) arrays, one entry per segment
+    """
+    _, units, buy_price, sell_price = batch_segments([asks], [bids], sell_fee)
+    return units, buy_price, sell_price
+
+
+def batch_segments(asks, bids, sell_fee):
+    """
+    Split many pairs of matched ladders into profitable segments at once.
+
+    Units are bought from the cheapest sell orders and sold into the highest
+    buy orders. Both ladders are monotonic, so each segment has a constant
+    buy and sell price, margins never increase from one segment to the next
+    and the profitable segments of a pair form a prefix.
+
+    Args:
+        asks: Sequence of sell ladders to buy from, lowest price first
+        bids: Sequence of buy ladders to sell into, aligned with asks, highest price first
+        sell_fee: Fraction of the sale price lost to fees
+
+    Returns:
+        Tuple of (pair, units, buy_price, sell_price) arrays, one entry per
+        segment, pair being the position of the segment's ladders in the
+        inputs, ordered by pair and then by depth
+    """
+    ask_sizes = np.fromiter((len(ladder) for ladder in asks), dtype=np.int64, count=len(asks))
+    bid_sizes = np.fromiter((len(ladder) for ladder in bids), dtype=np.int64, count=len(bids))
+    if not ask_sizes.sum() or not bid_sizes.sum():
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+    # Joining the raw bytes is much faster than concatenating many small structured arrays
+    ask = np.frombuffer(b"".join(ladder.tobytes() for ladder in asks), dtype=LADDER_DTYPE)
+    bid = np.frombuffer(b"".join(ladder.tobytes() for ladder in bids), dtype=LADDER_DTYPE)
+    ask_pair = np.repeat(np.arange(len(asks)), ask_sizes)
+    bid_pair = np.repeat(np.arange(len(bids)), bid_sizes)
+
+    # Cumulative amounts restarting at every pair
+    ask_cum = np.concatenate(([0], np.cumsum(ask["amount"], dtype=np.int64)))
+    bid_cum = np.concatenate(([0], np.cumsum(bid["amount"], dtype=np.int64)))
+    ask_ends, bid_ends = np.cumsum(ask_sizes), np.cumsum(bid_sizes)
+    ask_before, bid_before = ask_cum[ask_ends - ask_sizes], bid_cum[bid_ends - bid_sizes]
+    total = np.minimum(ask_cum[ask_ends] - ask_before, bid_cum[bid_ends] - bid_before)
+    ask_cum = ask_cum[1:] - ask_before[ask_pair]
+    bid_cum = bid_cum[1:] - bid_before[bid_pair]
+
+    # Segment boundaries where either ladder moves to its next level, keyed by
+    # pair * stride + cumulative amount so one sorted array covers every pair
+    stride = int(total.max()) + 1
+    pairs = np.flatnonzero(total > 0)
+    ends = np.unique(np.concatenate((
+        (ask_pair * stride + ask_cum)[ask_cum < total[ask_pair]],
+        (bid_pair * stride + bid_cum)[bid_cum < total[bid_pair]],
+        pairs * stride + total[pairs],
+    )))
+    if not len(ends):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+    pair = ends // stride
+    starts = np.concatenate(([0], ends[:-1]))
+    first = np.concatenate(([True], pair[1:] != pair[:-1]))
+    starts[first] = pair[first] * stride
+    units = ends - starts
+
+    ask_key = np.where(ask_cum < stride, ask_pair * stride + ask_cum, (ask_pair + 1) * stride - 1)
+    bid_key = np.where(bid_cum < stride, bid_pair * stride + bid_cum, (bid_pair + 1) * stride - 1)
+    buy_price = ask["price"][np.searchsorted(ask_key, starts, side="right")]
+    sell_price = bid["price"][np.searchsorted(bid_key, starts, side="right")]
+    profitable = sell_price * (1 - sell_fee) > buy_price
+    return pair[profitable], units[profitable], buy_price[profitable], sell_price[profitable]
+
+
+def match_ladders(asks, bids, sell_fee):
+    """
+    Walk a sell ladder against a buy ladder for as long as trades stay profitable.
+
+    Args:
+        asks: Sell ladder to buy from, lowest price first
+        bids: Buy ladder to sell into, highest price first
+        sell_fee: Fraction of the sale price lost to fees
+
+    Returns:
+        Tuple of (units, cost, profit) of the profitable trades
+    """
+    units, buy_price, sell_price = ladder_segments(asks, bids, sell_fee)
+    margin = sell_price * (1 - sell_fee) - buy_price
+    return int(units.sum()), float((buy_price * units).sum()), float((margin * units).sum())
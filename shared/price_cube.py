@@ -0,0 +1,386 @@
+"""
+Dense in-memory copy of the market_prices table.
+
+Prices and timestamps are held in NumPy arrays indexed by
+(item code, quality, location code) and refreshed incrementally from the
+row versions written by MarketDatabase.apply_orders.
+"""
+import threading
+import logging
+import numpy as np
+import pandas as pd
+from .database import cleared_key
+from .filter import parse_item_id
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# Quality levels 0 (unknown) to 5 (masterpiece)
+QUALITIES = 6
+
+# Spare rows allocated for item IDs missing from the catalog, so new ones rarely copy the arrays
+EXTRA_ITEM_ROWS = 1024
+
+
+def _sql_column(values, missing):
+    """
+    Build a column with the dtype pandas gives the same values read from SQLite.
+
+    Args:
+        values: numpy array of values
+        missing: Boolean array, True where the value is NULL
+
+    Returns:
+        int64 array when nothing is missing and every value is integral,
+        float64 with NaN when something is missing, object None when all is
+    """
+    if missing.all() and len(values):
+        return np.full(len(values), None, dtype=object)
+    if missing.any():
+        return np.where(missing, np.nan, values.astype(float))
+    if values.dtype.kind == "f" and not np.all(np.mod(values, 1) == 0):
+        return values
+    return values.astype(np.int64)
+
+
+class PriceCube:
+    """
+    Best prices of every item, quality and location in aligned arrays.
+
+    The item axis starts with the item catalog in CSV order, so an item's
+    code is its catalog code. IDs missing from the catalog are appended as
+    they are seen. The enchantment level is part of the item ID and so of
+    the item code. The location axis is the location code of the locations
+    table.
+
+    refresh() compares the version counters of all locations with the ones
+    seen last and only reads rows stamped with a newer version. Clearing a
+    location reloads it. Every read method refreshes first, so results are
+    always as current as the database.
+    """
+
+    def __init__(self, db, catalog):
+        """
+        Initialize an empty cube, rows are loaded on first use.
+
+        Args:
+            db: MarketDatabase to read from
+            catalog: ItemCatalog providing the item axis
+        """
+        self.db = db
+        self.ids = list(catalog.ids)
+        self.tiers = catalog.tiers.astype(np.int64)
+        self.enchants = catalog.enchants.astype(np.int64)
+        self._index = pd.Index(self.ids)
+        self._extra = {}
+        self._order = None
+        self.locations = {}
+        self._seen = {}
+        self._lock = threading.RLock()
+        self._allocate(len(self.ids), 0)
+
+    def _allocate(self, items, cities):
+        """Grow the arrays to hold at least this many items and locations."""
+        old = getattr(self, "present", None)
+        shape = (items, QUALITIES, cities)
+        present = np.zeros(shape, dtype=bool)
+        sell = np.full(shape, np.nan)
+        buy = np.full(shape, np.nan)
+        sell_time = np.zeros(shape, dtype=np.int64)
+        buy_time = np.zeros(shape, dtype=np.int64)
+        if old is not None:
+            i, _, c = old.shape
+            present[:i, :, :c] = old
+            sell[:i, :, :c] = self.sell
+            buy[:i, :, :c] = self.buy
+            sell_time[:i, :, :c] = self.sell_time
+            buy_time[:i, :, :c] = self.buy_time
+        self.present, self.sell, self.buy = present, sell, buy
+        self.sell_time, self.buy_time = sell_time, buy_time
+
+    @property
+    def nbytes(self):
+        """Memory used by the price arrays."""
+        return sum(a.nbytes for a in (self.present, self.sell, self.buy, self.sell_time, self.buy_time))
+
+    def _codes(self, ids):
+        """Item codes of IDs, appending IDs that are not on the item axis yet."""
+        codes = self._index.get_indexer(ids)
+        unknown = codes < 0
+        if unknown.any():
+            for position in np.flatnonzero(unknown):
+                item_id = ids[position]
+                code = self._extra.get(item_id)
+                if code is None:
+                    code = self._extra[item_id] = len(self.ids)
+                    self.ids.append(item_id)
+                    tier, enchant = parse_item_id(item_id)
+                    self.tiers = np.append(self.tiers, -1 if tier is None else tier)
+                    self.enchants = np.append(self.enchants, enchant)
+                codes[position] = code
+            self._index = pd.Index(self.ids)
+            self._order = None
+            if len(self.ids) > self.present.shape[0]:
+                self._allocate(len(self.ids) + EXTRA_ITEM_ROWS, self.present.shape[2])
+        return codes
+
+    def refresh(self):
+        """
+        Apply every change written to the database since the last refresh.
+
+        Returns:
+            Number of rows read
+        """
+        with self._lock:
+            locations, changes = self._changes()
+            return self._apply_changes(locations, changes)
+
+    def _changes(self):
+        """
+        Read the rows written since the last refresh without touching the arrays.
+
+        Returns:
+            Tuple of (location name -> code dict, list of (name, version,
+            cleared, reload, rows) tuples for the locations that changed)
+        """
+        locations = self.db.get_location_names()
+        names = list(locations)
+        versions = self.db.get_location_versions(names + [cleared_key(name) for name in names])
+        changes = []
+        for name, version, cleared in zip(names, versions, versions[len(names):]):
+            seen_version, seen_rows, seen_cleared = self._seen.get(name, (None, -1, 0))
+            if version == seen_version:
+                continue
+            reload = cleared != seen_cleared
+            rows = self.db.get_price_changes(name, -1 if reload else seen_rows)
+            changes.append((name, version, cleared, reload, rows))
+        return locations, changes
+
+    def _apply_changes(self, locations, changes):
+        """
+        Write the changes read by _changes() into the arrays.
+
+        Returns:
+            Number of rows applied
+        """
+        if locations.keys() != self.locations.keys():
+            self.locations = locations
+            cities = max(locations.values()) + 1 if locations else 0
+            if cities > self.present.shape[2]:
+                self._allocate(self.present.shape[0], cities)
+
+        loaded = 0
+        for name, version, cleared, reload, rows in changes:
+            code = locations[name]
+            seen_rows = self._seen.get(name, (None, -1, 0))[1]
+            if reload:
+                self.present[:, :, code] = False
+                self.sell[:, :, code] = np.nan
+                self.buy[:, :, code] = np.nan
+                self.sell_time[:, :, code] = 0
+                self.buy_time[:, :, code] = 0
+                seen_rows = -1
+            if not rows.empty:
+                self._apply(code, rows)
+                seen_rows = int(rows["version"].max())
+                loaded += len(rows)
+            self._seen[name] = (version, seen_rows, cleared)
+
+        if loaded:
+            logger.debug(f"Price cube refreshed with {loaded} rows, {self.nbytes / 1e6:.1f} MB")
+        return loaded
+
+    def _read(self, read):
+        """
+        Run a read of the arrays on refreshed data.
+
+        Args:
+            read: Function reading the arrays
+
+        Returns:
+            The result of read
+        """
+        with self._lock:
+            self.refresh()
+            return read()
+
+    def versions(self, locations):
+        """
+        Get the location versions the cube holds the data of, after refreshing.
+
+        Args:
+            locations: Location names
+
+        Returns:
+            Tuple of versions in the same order, 0 for locations never written
+        """
+        return self._read(lambda: tuple(self._seen.get(name, (0,))[0] for name in locations))
+
+    def _apply(self, code, rows):
+        """Write changed rows of one location into the arrays."""
+        items = self._codes(rows["id"].to_numpy(dtype=object))
+        qualities = rows["quality"].to_numpy(dtype=np.int64)
+        valid = (qualities >= 0) & (qualities < QUALITIES)
+        if not valid.all():
+            logger.warning(f"Ignoring {int((~valid).sum())} rows with unknown quality levels")
+        items, qualities = items[valid], qualities[valid]
+
+        def column(name, fill):
+            values = pd.to_numeric(rows[name], errors="coerce").to_numpy(dtype=float)[valid]
+            return np.where(np.isnan(values), fill, values)
+
+        self.present[items, qualities, code] = True
+        self.sell[items, qualities, code] = column("sell_min", np.nan)
+        self.buy[items, qualities, code] = column("buy_max", np.nan)
+        self.sell_time[items, qualities, code] = column("sell_min_datetime", 0).astype(np.int64)
+        self.buy_time[items, qualities, code] = column("buy_max_datetime", 0).astype(np.int64)
+
+    def _id_order(self):
+        """Item codes sorted by item ID, the row order of SQL queries."""
+        if self._order is None:
+            self._order = np.argsort(np.array(self.ids, dtype=object), kind="stable")
+        return self._order
+
+    def _item_mask(self, filter_obj):
+        """Boolean mask over the item axis for the tier filter."""
+        spec = filter_obj.compiled
+        if spec.match_all:
+            return np.ones(len(self.ids), dtype=bool)
+        if spec.pattern is not None:
+            return spec.mask(pd.Series(self.ids, dtype=object))
+        mask = np.zeros(len(self.ids), dtype=bool)
+        for tier, enchants in spec.pairs:
+            match = self.tiers == tier
+            if enchants is not None:
+                match &= np.isin(self.enchants, enchants)
+            mask |= match
+        return mask
+
+    def select(self, codes, filter_obj=None):
+        """
+        Find the (item, quality) keys with a row in any of some locations.
+
+        Args:
+            codes: Location codes
+            filter_obj: Optional Filter object, rows outside it are excluded
+
+        Returns:
+            Tuple of (items, qualities, mask) where mask is the boolean
+            (key, location) array of rows passing the filter, keys ordered by
+            item ID and quality
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        # Only the rows of known items in the requested locations are copied, in item code order
+        count = len(self.ids)
+        present = self.present[:count, :, codes]
+        if filter_obj is not None:
+            quality_mask = np.zeros(QUALITIES, dtype=bool)
+            quality_mask[[q for q in filter_obj.qualities if 0 <= q < QUALITIES]] = True
+            present &= self._item_mask(filter_obj)[:, None, None] & quality_mask[None, :, None]
+            cutoff = filter_obj.cutoff()
+            if cutoff is not None:
+                present &= (self.sell_time[:count, :, codes] >= cutoff) | (self.buy_time[:count, :, codes] >= cutoff)
+        # Sorting by item ID only reorders the small (item, quality) matrix
+        order = self._id_order()
+        item_idx, qualities = np.nonzero(present.any(axis=2)[order])
+        items = order[item_idx]
+        return items, qualities, present[items, qualities]
+
+    def prices(self, locations, filter_obj=None):
+        """
+        Get aligned price arrays of several locations.
+
+        Args:
+            locations: Location names
+            filter_obj: Optional Filter object to filter the data
+
+        Returns:
+            Tuple of (items, qualities, sell, buy), sell and buy being float
+            (key, location) arrays with NaN where there is no price, or the
+            price is older than the filter's age limit
+        """
+        return self._read(lambda: self._prices(locations, filter_obj))
+
+    def _prices(self, locations, filter_obj):
+        """Gather the price arrays of prices() from the current arrays."""
+        codes = [self.locations.get(name, -1) for name in locations]
+        known = [code for code in codes if code >= 0]
+        items, qualities, mask = self.select(known, filter_obj)
+        sell = np.full((len(items), len(codes)), np.nan)
+        buy = np.full((len(items), len(codes)), np.nan)
+        columns = [i for i, code in enumerate(codes) if code >= 0]
+        # (key, location) index gathering only the selected cells
+        index = (items[:, None], qualities[:, None], np.asarray(known, dtype=np.int64)[None, :])
+        sell[:, columns] = np.where(mask, self.sell[index], np.nan)
+        buy[:, columns] = np.where(mask, self.buy[index], np.nan)
+        cutoff = filter_obj.cutoff() if filter_obj is not None else None
+        if cutoff is not None:
+            sell[:, columns] = np.where(self.sell_time[index] >= cutoff, sell[:, columns], np.nan)
+            buy[:, columns] = np.where(self.buy_time[index] >= cutoff, buy[:, columns], np.nan)
+        return items, qualities, sell, buy
+
+    def locations_data(self, locations, filter_obj=None):
+        """
+        Get the rows of several locations, like MarketDatabase.get_locations_data.
+
+        Args:
+            locations: Iterable of location names
+            filter_obj: Optional Filter object to filter the data
+
+        Returns:
+            DataFrame with a location column, ordered by location code, id and quality
+        """
+        gathered = self._read(lambda: self._gather(locations, filter_obj))
+        if gathered is None:
+            return pd.DataFrame()
+        cities, items, qualities, sell, buy, sell_time, buy_time, names = gathered
+        tiers = self.tiers[items]
+
+        cutoff = filter_obj.cutoff() if filter_obj is not None else None
+        sell_missing = np.isnan(sell) | ((sell_time < cutoff) if cutoff is not None else False)
+        buy_missing = np.isnan(buy) | ((buy_time < cutoff) if cutoff is not None else False)
+        return pd.DataFrame({
+            "location": pd.Series(cities).map(names).to_numpy(dtype=object),
+            "id": np.array(self.ids, dtype=object)[items],
+            "quality": qualities.astype(np.int64),
+            "enchant": self.enchants[items],
+            "sell_min": _sql_column(sell, sell_missing),
+            "buy_max": _sql_column(buy, buy_missing),
+            "sell_min_datetime": _sql_column(sell_time, sell_time == 0),
+            "buy_max_datetime": _sql_column(buy_time, buy_time == 0),
+            "tier": _sql_column(tiers, tiers < 0),
+        })
+
+    def _gather(self, locations, filter_obj):
+        """Copy the rows of locations_data() out of the current arrays, None if there are none."""
+        codes = sorted({self.locations[name] for name in locations if name in self.locations})
+        if not codes:
+            return None
+        items, qualities, mask = self.select(codes, filter_obj)
+        city_idx, key_idx = np.nonzero(mask.T)
+        if not len(key_idx):
+            return None
+        items, qualities = items[key_idx], qualities[key_idx]
+        cities = np.asarray(codes)[city_idx]
+        names = {code: name for name, code in self.locations.items()}
+        return (cities, items, qualities, self.sell[items, qualities, cities], self.buy[items, qualities, cities],
+                self.sell_time[items, qualities, cities], self.buy_time[items, qualities, cities], names)
+
+    def location_data(self, location, filter_obj=None):
+        """
+        Get the rows of one location, like MarketDatabase.get_location_data.
+
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            filter_obj: Optional Filter object to filter the data
+
+        Returns:
+            DataFrame ordered by id and quality
+        """
+        df = self.locations_data([location], filter_obj)
+        return df.drop(columns="location") if not df.empty else df
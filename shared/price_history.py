@@ -0,0 +1,293 @@
+"""
+Append-only price history stored in Average.db.
+Raw observations are rolled up into hourly and daily OHLC buckets over time.
+"""
+import time
+import threading
+import logging
+import pandas as pd
+from .constants import (
+    DATABASE_AVG_PATH, HISTORY_RAW_RETENTION_HOURS, HISTORY_HOURLY_RETENTION_DAYS,
+    HISTORY_DAILY_RETENTION_DAYS, HISTORY_COMPACT_INTERVAL
+)
+from .connection import ConnectionManager
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+HOUR = 3600
+DAY = 86400
+
+# Side codes stored in the series table
+SIDE_CODES = {"sell": 0, "buy": 1}
+
+HISTORY_SCHEMA_VERSION = 1
+
+
+def create_history_schema(conn):
+    """
+    Create the history tables if they do not exist.
+
+    Args:
+        conn: Open sqlite3 connection to Average.db
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= HISTORY_SCHEMA_VERSION:
+        return
+    conn.executescript(f"""
+        BEGIN;
+        CREATE TABLE IF NOT EXISTS series (
+            series_id INTEGER PRIMARY KEY,
+            location TEXT NOT NULL,
+            id TEXT NOT NULL,
+            quality INT NOT NULL,
+            enchant INT NOT NULL,
+            side INT NOT NULL,
+            UNIQUE (location, id, quality, enchant, side)
+        );
+        -- ts is a unix timestamp in seconds
+        CREATE TABLE IF NOT EXISTS price_points (
+            series_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            price INTEGER NOT NULL,
+            PRIMARY KEY (series_id, ts, price)
+        ) WITHOUT ROWID;
+        -- resolution is the bucket width in seconds, bucket its start time
+        CREATE TABLE IF NOT EXISTS price_ohlc (
+            series_id INTEGER NOT NULL,
+            resolution INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            open INTEGER NOT NULL,
+            high INTEGER NOT NULL,
+            low INTEGER NOT NULL,
+            close INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (series_id, resolution, bucket)
+        ) WITHOUT ROWID;
+        PRAGMA user_version = {HISTORY_SCHEMA_VERSION};
+        COMMIT;
+    """)
+
+
+class PriceHistory:
+    """
+    Time-series store of every observed best price.
+
+    Each (location, item, quality, enchant, side) gets an integer series id,
+    observations are appended as (series_id, ts, price) rows. A background
+    job rolls old points into 1-hour and 1-day OHLC buckets and applies the
+    retention policy, so the file size stays bounded.
+    """
+
+    def __init__(self, db_path=DATABASE_AVG_PATH):
+        """Initialize the history store."""
+        self.db_path = db_path
+        self.connections = ConnectionManager(db_path, migrate=create_history_schema)
+        self._series = {}
+        self._compactor = None
+        self._stop_compaction = threading.Event()
+
+    def _series_ids(self, conn, keys):
+        """
+        Resolve series keys to ids, creating missing series.
+
+        Args:
+            conn: Writer connection inside a transaction
+            keys: Iterable of (location, item_id, quality, enchant, side_code)
+
+        Returns:
+            Dict mapping each key to its series id
+        """
+        missing = [key for key in keys if key not in self._series]
+        if missing:
+            conn.executemany(
+                "INSERT OR IGNORE INTO series(location, id, quality, enchant, side) VALUES(?, ?, ?, ?, ?)",
+                missing
+            )
+            for key in missing:
+                self._series[key] = conn.execute(
+                    "SELECT series_id FROM series WHERE location = ? AND id = ? AND quality = ? "
+                    "AND enchant = ? AND side = ?",
+                    key
+                ).fetchone()[0]
+        return self._series
+
+    def record(self, location, side, orders, ts=None):
+        """
+        Append the best price per item from a batch of orders.
+
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            side: Either "sell" or "buy"
+            orders: Iterable of (item_id, price, quality, enchant) tuples
+            ts: Optional unix timestamp in seconds, defaults to now
+
+        Returns:
+            Number of points recorded
+        """
+        side_code = SIDE_CODES[side]
+        best = {}
+        for item_id, price, quality, enchant in orders:
+            key = (location, item_id, quality, enchant, side_code)
+            current = best.get(key)
+            if current is None or (price < current if side == "sell" else price > current):
+                best[key] = price
+
+        if not best:
+            return 0
+
+        ts = int(time.time()) if ts is None else int(ts)
+        with self.connections.write() as conn:
+            series = self._series_ids(conn, best.keys())
+            conn.executemany(
+                "INSERT OR IGNORE INTO price_points(series_id, ts, price) VALUES(?, ?, ?)",
+                [(series[key], ts, int(price)) for key, price in best.items()]
+            )
+        return len(best)
+
+    def _rollup(self, conn, source, resolution, cutoff):
+        """
+        Merge rows older than cutoff from a source into OHLC buckets.
+
+        Args:
+            conn: Writer connection inside a transaction
+            source: "points" for raw points or a resolution in seconds for buckets
+            resolution: Target bucket width in seconds
+            cutoff: Unix timestamp, only rows strictly older are rolled up
+
+        Returns:
+            Number of source rows consumed
+        """
+        if source == "points":
+            rows = "SELECT series_id, ts, price AS open, price AS high, price AS low, price AS close, " \
+                   "1 AS samples FROM price_points WHERE ts < :cutoff"
+            delete = "DELETE FROM price_points WHERE ts < :cutoff"
+        else:
+            rows = "SELECT series_id, bucket AS ts, open, high, low, close, samples FROM price_ohlc " \
+                   "WHERE resolution = :source AND bucket < :cutoff"
+            delete = "DELETE FROM price_ohlc WHERE resolution = :source AND bucket < :cutoff"
+
+        params = {"source": source, "resolution": resolution, "cutoff": cutoff}
+        conn.execute(f"""
+            INSERT INTO price_ohlc(series_id, resolution, bucket, open, high, low, close, samples)
+            SELECT series_id, :resolution, bucket,
+                   MAX(CASE WHEN first = 1 THEN open END),
+                   MAX(high), MIN(low),
+                   MAX(CASE WHEN last = 1 THEN close END),
+                   SUM(samples)
+            FROM (
+                SELECT *, ts / :resolution * :resolution AS bucket,
+                       ROW_NUMBER() OVER (PARTITION BY series_id, ts / :resolution ORDER BY ts) AS first,
+                       ROW_NUMBER() OVER (PARTITION BY series_id, ts / :resolution ORDER BY ts DESC) AS last
+                FROM ({rows})
+            )
+            WHERE true
+            GROUP BY series_id, bucket
+            ON CONFLICT(series_id, resolution, bucket) DO UPDATE SET
+                high = MAX(high, excluded.high),
+                low = MIN(low, excluded.low),
+                close = excluded.close,
+                samples = samples + excluded.samples
+        """, params)
+        return conn.execute(delete, params).rowcount
+
+    def compact(self, now=None):
+        """
+        Roll old data into coarser buckets and apply the retention policy.
+
+        Cutoffs are aligned to the target bucket width so every bucket is
+        built from a complete interval.
+
+        Args:
+            now: Optional unix timestamp in seconds, defaults to now
+
+        Returns:
+            Dict with the number of raw points, hourly and daily buckets removed
+        """
+        now = int(time.time()) if now is None else int(now)
+        raw_cutoff = (now - HISTORY_RAW_RETENTION_HOURS * HOUR) // HOUR * HOUR
+        hourly_cutoff = (now - HISTORY_HOURLY_RETENTION_DAYS * DAY) // DAY * DAY
+        daily_cutoff = now - HISTORY_DAILY_RETENTION_DAYS * DAY
+
+        with self.connections.write() as conn:
+            result = {
+                "points": self._rollup(conn, "points", HOUR, raw_cutoff),
+                "hourly": self._rollup(conn, HOUR, DAY, hourly_cutoff),
+                "daily": conn.execute(
+                    "DELETE FROM price_ohlc WHERE resolution = ? AND bucket < ?", (DAY, daily_cutoff)
+                ).rowcount,
+            }
+        logger.debug(f"Compacted price history: {result}")
+        return result
+
+    def start_compaction(self, interval=HISTORY_COMPACT_INTERVAL):
+        """
+        Run compact() periodically on a background thread.
+
+        Args:
+            interval: Seconds between compactions
+        """
+        if self._compactor is not None:
+            return
+
+        def run():
+            while not self._stop_compaction.wait(interval):
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error(f"Compacting price history: {str(e)}", exc_info=True)
+
+        self._stop_compaction.clear()
+        self._compactor = threading.Thread(target=run, name="HistoryCompactor", daemon=True)
+        self._compactor.start()
+
+    def get_history(self, location, item_id, quality, side="sell", since=None):
+        """
+        Get the price history of one item, coarsest buckets first.
+
+        Daily buckets, hourly buckets and raw points never overlap, so the
+        union of the three covers the whole retained history.
+
+        Args:
+            location: The location name (e.g., "BlackMarket")
+            item_id: The item identifier, including any "@enchant" suffix
+            quality: The quality level
+            side: Either "sell" or "buy"
+            since: Optional unix timestamp in seconds to start from
+
+        Returns:
+            DataFrame with time, resolution, open, high, low, close and samples columns
+        """
+        params = {
+            "location": location, "id": item_id, "quality": quality,
+            "side": SIDE_CODES[side], "since": since or 0,
+        }
+        with self.connections.reader() as conn:
+            df = pd.read_sql_query("""
+                WITH s AS (
+                    SELECT series_id FROM series
+                    WHERE location = :location AND id = :id AND quality = :quality AND side = :side
+                )
+                SELECT bucket AS time, resolution, open, high, low, close, samples
+                FROM price_ohlc WHERE series_id IN (SELECT series_id FROM s) AND bucket >= :since
+                UNION ALL
+                SELECT ts AS time, 0 AS resolution, price, price, price, price, 1
+                FROM price_points WHERE series_id IN (SELECT series_id FROM s) AND ts >= :since
+                ORDER BY time
+            """, conn, params=params)
+
+        if not df.empty:
+            df["time"] = pd.to_datetime(df["time"], unit="s", utc=True)
+        return df
+
+    def close(self):
+        """Stop background compaction and close the database connections."""
+        if self._compactor is not None:
+            self._stop_compaction.set()
+            self._compactor.join()
+            self._compactor = None
+        self.connections.close()
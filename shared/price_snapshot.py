@@ -0,0 +1,377 @@
+"""
+Memory-mapped price snapshot shared between the collector and the market app.
+
+The collector keeps the arrays of its PriceCube in a fixed-layout file and
+updates them in place after every write to the database. The market app maps
+the same file read-only and reads prices straight from it, without querying
+SQLite. A sequence counter in the header is odd while an update is in
+progress, readers retry whenever it was odd or changed during their read.
+"""
+import os
+import time
+import zlib
+import logging
+import numpy as np
+from .price_cube import PriceCube, QUALITIES, EXTRA_ITEM_ROWS
+from .database import now_ms
+from .constants import SNAPSHOT_LOCATIONS, SNAPSHOT_STALE_SECONDS, SNAPSHOT_BUSY_SECONDS
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+SNAPSHOT_MAGIC = b"AOMKTSNP"
+SNAPSHOT_LAYOUT = 1
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("layout", "<u4"),
+    ("open", "<u4"),           # 1 while a collector owns the file
+    ("seq", "<u8"),            # odd while the collector updates the file
+    ("generation", "<i8"),     # changes every time a collector starts over
+    ("heartbeat", "<i8"),      # epoch milliseconds of the last refresh
+    ("catalog_items", "<u4"),
+    ("catalog_crc", "<u4"),
+    ("items", "<u4"),
+    ("cities", "<u4"),
+    ("extra_items", "<u4"),    # item IDs appended after the catalog
+    ("overflow", "<u4"),       # 1 once the data stopped fitting, readers then ignore the file
+])
+LOCATION_DTYPE = np.dtype([("name", "S64"), ("version", "<i8"), ("rows", "<i8"), ("cleared", "<i8")])
+ITEM_ID_DTYPE = np.dtype("S128")
+ARRAYS = (("present", np.bool_), ("sell", "<f8"), ("buy", "<f8"), ("sell_time", "<i8"), ("buy_time", "<i8"))
+
+# Sections start on cache line boundaries
+SECTION_ALIGN = 64
+
+
+class SnapshotFull(Exception):
+    """Raised when a location code or item ID does not fit in the snapshot file."""
+
+
+def catalog_crc(catalog):
+    """Checksum of the catalog item IDs, the item axis of writer and readers must agree."""
+    return zlib.crc32("\n".join(catalog.ids).encode())
+
+
+def _layout(items, cities, catalog_items):
+    """
+    Compute where every section of a snapshot file starts.
+
+    Returns:
+        Tuple of (dict of section name -> (offset, dtype, shape), file size)
+    """
+    sections = [("header", HEADER_DTYPE, ()),
+                ("locations", LOCATION_DTYPE, (cities,)),
+                ("extra_ids", ITEM_ID_DTYPE, (items - catalog_items,))]
+    sections += [(name, np.dtype(dtype), (items, QUALITIES, cities)) for name, dtype in ARRAYS]
+    layout, offset = {}, 0
+    for name, dtype, shape in sections:
+        layout[name] = (offset, dtype, shape)
+        size = dtype.itemsize * int(np.prod(shape))
+        offset += -(-size // SECTION_ALIGN) * SECTION_ALIGN
+    return layout, offset
+
+
+def _map(path, mode, geometry=None):
+    """
+    Map a snapshot file and create a view of every section.
+
+    Args:
+        path: Snapshot file path
+        mode: "r" for readers, "r+" for the writer
+        geometry: Optional (items, cities, catalog_items) the file must have
+
+    Returns:
+        Tuple of (memmap, dict of section name -> numpy view)
+
+    Raises:
+        ValueError: If the file is not a snapshot of the expected layout
+    """
+    data = np.memmap(path, dtype=np.uint8, mode=mode)
+    if len(data) < HEADER_DTYPE.itemsize:
+        raise ValueError(f"{path} is too small to be a price snapshot")
+    header = np.ndarray((), HEADER_DTYPE, buffer=data, offset=0)
+    if header["magic"] != SNAPSHOT_MAGIC or header["layout"] != SNAPSHOT_LAYOUT:
+        raise ValueError(f"{path} is not a price snapshot of layout {SNAPSHOT_LAYOUT}")
+
+    found = (int(header["items"]), int(header["cities"]), int(header["catalog_items"]))
+    layout, size = _layout(*found)
+    if len(data) != size or (geometry is not None and found != tuple(geometry)):
+        raise ValueError(f"{path} has an unexpected size")
+    views = {name: np.ndarray(shape, dtype, buffer=data, offset=offset)
+             for name, (offset, dtype, shape) in layout.items()}
+    return data, views
+
+
+class SnapshotWriter(PriceCube):
+    """
+    Price cube whose arrays live in a memory-mapped snapshot file.
+
+    The file has room for a fixed number of location codes and of item IDs
+    missing from the catalog. Once either runs out the file is marked as
+    overflowed, readers stop using it and the collector stops updating it.
+
+    Only one writer may use a file at a time. Every refresh runs inside the
+    sequence counter, but the SQL reads happen before the counter is made
+    odd, so readers are held up only while the arrays are written.
+    """
+
+    def __init__(self, db, catalog, path, cities=SNAPSHOT_LOCATIONS, extra_items=EXTRA_ITEM_ROWS):
+        """
+        Create or take over the snapshot file and load the current prices.
+
+        An existing file of the same layout is reset in place, so readers
+        that have it mapped see the new data. Other files are replaced.
+
+        Args:
+            db: MarketDatabase to read from
+            catalog: ItemCatalog providing the item axis
+            path: Snapshot file path
+            cities: Number of location codes to make room for
+            extra_items: Number of item IDs missing from the catalog to make room for
+        """
+        self.path = path
+        self.overflow = False
+        geometry = (len(catalog) + extra_items, cities, len(catalog))
+        try:
+            self._file, self._views = _map(path, "r+", geometry)
+        except (OSError, ValueError):
+            self._file, self._views = self._create(path, geometry)
+        self.header = self._views["header"]
+
+        self._begin()
+        self.header["open"] = 1
+        self.header["overflow"] = 0
+        self.header["generation"] = now_ms()
+        self.header["catalog_crc"] = catalog_crc(catalog)
+        self.header["extra_items"] = 0
+        self._views["locations"][:] = np.zeros(cities, dtype=LOCATION_DTYPE)
+        self._views["present"][:] = False
+        self._views["sell"][:] = np.nan
+        self._views["buy"][:] = np.nan
+        self._views["sell_time"][:] = 0
+        self._views["buy_time"][:] = 0
+        self._end()
+
+        super().__init__(db, catalog)
+        self.catalog_items = len(catalog)
+        self.refresh()
+        logger.info(f"Price snapshot {path} holds {self.nbytes / 1e6:.1f} MB of prices")
+
+    @staticmethod
+    def _create(path, geometry):
+        """Write an empty snapshot file next to the path and move it in place."""
+        items, cities, catalog_items = geometry
+        _, size = _layout(items, cities, catalog_items)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        data = np.memmap(temp_path, dtype=np.uint8, mode="w+", shape=(size,))
+        header = np.ndarray((), HEADER_DTYPE, buffer=data, offset=0)
+        header["magic"] = SNAPSHOT_MAGIC
+        header["layout"] = SNAPSHOT_LAYOUT
+        header["items"], header["cities"], header["catalog_items"] = items, cities, catalog_items
+        data.flush()
+        del header, data
+        os.replace(temp_path, path)
+        return _map(path, "r+", geometry)
+
+    def _begin(self):
+        """Make the sequence counter odd before changing the file."""
+        self.header["seq"] = int(self.header["seq"]) + 1
+
+    def _end(self):
+        """Make the sequence counter even again once the file is consistent."""
+        self.header["seq"] = int(self.header["seq"]) + 1
+
+    def _allocate(self, items, cities):
+        """Use the arrays of the file, which cannot grow."""
+        if items > self._views["present"].shape[0] or cities > self._views["present"].shape[2]:
+            raise SnapshotFull(f"{items} items at {cities} locations do not fit in {self.path}")
+        self.present, self.sell, self.buy = self._views["present"], self._views["sell"], self._views["buy"]
+        self.sell_time, self.buy_time = self._views["sell_time"], self._views["buy_time"]
+
+    def refresh(self):
+        """
+        Apply every change written to the database since the last refresh.
+
+        Returns:
+            Number of rows read
+        """
+        with self._lock:
+            if self.overflow:
+                return 0
+            locations, changes = self._changes()
+            loaded = 0
+            if changes or locations.keys() != self.locations.keys():
+                self._begin()
+                try:
+                    loaded = self._apply_changes(locations, changes)
+                    self._publish()
+                except SnapshotFull as e:
+                    self.overflow = True
+                    self.header["overflow"] = 1
+                    logger.warning(f"Price snapshot disabled: {str(e)}")
+                finally:
+                    self._end()
+            self.header["heartbeat"] = now_ms()
+            return loaded
+
+    def _publish(self):
+        """Write the location table and the appended item IDs for readers."""
+        table = self._views["locations"]
+        for name, code in self.locations.items():
+            encoded = name.encode()
+            if len(encoded) > LOCATION_DTYPE["name"].itemsize:
+                raise SnapshotFull(f"Location name {name} is too long")
+            table[code] = (encoded,) + self._seen.get(name, (0, -1, 0))
+
+        published = int(self.header["extra_items"])
+        extra = self.ids[self.catalog_items + published:]
+        for offset, item_id in enumerate(extra, start=published):
+            encoded = item_id.encode()
+            if len(encoded) > ITEM_ID_DTYPE.itemsize:
+                raise SnapshotFull(f"Item ID {item_id} is too long")
+            self._views["extra_ids"][offset] = encoded
+        self.header["extra_items"] = published + len(extra)
+
+    def close(self):
+        """Mark the file as abandoned and write it to disk."""
+        with self._lock:
+            self.header["open"] = 0
+            self._file.flush()
+
+
+class SnapshotUnavailable(Exception):
+    """Raised by a read of a snapshot that stopped being live, the caller should use SQLite."""
+
+
+class SnapshotReader(PriceCube):
+    """
+    Read-only price cube backed by a snapshot file written by the collector.
+
+    The arrays are zero-copy views of the file. Every read copies what it
+    needs out of them and is retried if the collector changed the file in
+    the meantime, so results are always consistent with one location
+    version per location. A read that cannot finish because the collector
+    stopped or kept the file busy detaches the reader, which is not live
+    from then on.
+    """
+
+    def __init__(self, db, catalog, path):
+        """
+        Map a snapshot file.
+
+        Args:
+            db: MarketDatabase, only kept for the PriceCube interface
+            catalog: ItemCatalog, must be the one the collector uses
+            path: Snapshot file path
+
+        Raises:
+            OSError: If the file cannot be opened
+            ValueError: If the file is not a snapshot for this item catalog
+        """
+        self.path = path
+        self._file, self._views = _map(path, "r")
+        self.header = self._views["header"]
+        if self.header["catalog_items"] != len(catalog) or self.header["catalog_crc"] != catalog_crc(catalog):
+            raise ValueError(f"{path} was written for another item catalog")
+        self.generation = int(self.header["generation"])
+        self.detached = False
+        super().__init__(db, catalog)
+        self.catalog_items = len(catalog)
+
+    @classmethod
+    def attach(cls, db, catalog, path):
+        """
+        Map a snapshot file if a collector is currently updating it.
+
+        Returns:
+            SnapshotReader, or None if there is no live snapshot at the path
+        """
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            reader = cls(db, catalog, path)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Not using price snapshot {path}: {str(e)}")
+            return None
+        if not reader.live():
+            return None
+        logger.info(f"Reading prices from the collector's snapshot {path}")
+        return reader
+
+    def live(self):
+        """
+        Check that a collector still updates the file this reader has mapped.
+
+        Returns:
+            True if the data is current, False if the reader should fall back to SQLite
+        """
+        return bool(not self.detached and self.header["open"] and not self.header["overflow"]
+                    and self.header["generation"] == self.generation
+                    and now_ms() - int(self.header["heartbeat"]) <= SNAPSHOT_STALE_SECONDS * 1000)
+
+    def _allocate(self, items, cities):
+        """Use the read-only arrays of the file."""
+        self.present, self.sell, self.buy = self._views["present"], self._views["sell"], self._views["buy"]
+        self.sell_time, self.buy_time = self._views["sell_time"], self._views["buy_time"]
+
+    def refresh(self):
+        """The collector keeps the arrays current, there is nothing to read from the database."""
+        return 0
+
+    def _sync(self):
+        """Take over the location table and new item IDs from the file."""
+        table = self._views["locations"].copy()
+        extra = self._views["extra_ids"][len(self.ids) - self.catalog_items:int(self.header["extra_items"])].copy()
+        return table, extra
+
+    def _read(self, read):
+        """
+        Run a read of the arrays between two equal even sequence numbers.
+
+        Args:
+            read: Function reading the arrays
+
+        Returns:
+            The result of read
+
+        Raises:
+            SnapshotUnavailable: If the reader is detached, or the collector
+                stopped or kept the file busy for SNAPSHOT_BUSY_SECONDS
+        """
+        deadline = time.monotonic() + SNAPSHOT_BUSY_SECONDS
+        with self._lock:
+            while True:
+                if self.detached:
+                    raise SnapshotUnavailable(f"Price snapshot {self.path} is detached")
+                start = int(self.header["seq"])
+                if not start & 1:
+                    table, extra = self._sync()
+                    if int(self.header["seq"]) == start:
+                        if len(extra):
+                            self._codes(np.array([item_id.decode() for item_id in extra], dtype=object))
+                        self.locations = {row["name"].decode(): code for code, row in enumerate(table) if row["name"]}
+                        self._seen = {row["name"].decode(): (int(row["version"]), int(row["rows"]), int(row["cleared"]))
+                                      for row in table if row["name"]}
+                        result = read()
+                        if int(self.header["seq"]) == start:
+                            return result
+                        continue
+                if not self.live() or time.monotonic() > deadline:
+                    # An odd sequence number left by a crashed collector never becomes even again
+                    self.detached = True
+                    logger.info(f"Price snapshot {self.path} stayed busy or stopped updating, detaching it")
+                    raise SnapshotUnavailable(f"Price snapshot {self.path} is not live")
+                time.sleep(0.001)
+
+    def close(self):
+        """Unmap the file."""
+        with self._lock:
+            self._views = self.header = None
+            self.present = self.sell = self.buy = self.sell_time = self.buy_time = None
+            self._file = None
@@ -0,0 +1,42 @@
+"""
+Tests for the trade planner's knapsack solver.
+"""
+import sys
+import os
+import itertools
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_app.trade_planner import solve
+
+
+def best_profit(units, cost, profit, budget, slots):
+    """Exact optimum by enumerating every plan of a small instance."""
+    best = 0.0
+    for take in itertools.product(*(range(int(count) + 1) for count in units)):
+        take = np.array(take)
+        if take.sum() <= slots and (take * cost).sum() <= budget:
+            best = max(best, float((take * profit).sum()))
+    return best
+
+
+def test_expensive_segment_beats_profit_per_silver():
+    take = solve(np.array([2, 1, 1]), np.array([7.0, 3.0, 30.0]), np.array([17.0, 8.0, 7.0]), 7, 2)
+    assert take.tolist() == [1, 0, 0]
+
+
+def test_plans_fit_and_keep_half_of_the_optimum():
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        count = int(rng.integers(1, 5))
+        units = rng.integers(1, 4, count)
+        cost = rng.integers(1, 40, count).astype(float)
+        profit = rng.integers(1, 30, count).astype(float)
+        budget, slots = float(rng.integers(1, 80)), int(rng.integers(1, 6))
+
+        take = solve(units, cost, profit, budget, slots)
+        assert (take >= 0).all() and (take <= units).all()
+        assert take.sum() <= slots and (take * cost).sum() <= budget
+        assert (take * profit).sum() >= best_profit(units, cost, profit, budget, slots) / 2
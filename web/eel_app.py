@@ -19,8 +19,11 @@ logging.basicConfig(
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from market_app.market_analyzer import MarketAnalyzer
+from market_app.live_updates import LiveUpdates
+from market_app.payload import encode_frame
+from market_app.request_executor import RequestExecutor, RequestCancelled
 from shared.filter import Filter
-from shared.constants import SHORTNAME, LOCATIONS
+from shared.constants import SHORTNAME, LOCATIONS, TABLE_PAGE_SIZE, REQUEST_POLL_INTERVAL
 
 # Initialize Eel
 eel.init('web')  # Specify the web directory containing HTML/JS/CSS
@@ -28,7 +31,30 @@ eel.init('web')  # Specify the web directory containing HTML/JS/CSS
 # Global instance of our application
 app_instance = None
 
+def _run_request(view, function, *args, query=None):
+    """
+    Run a request in a worker thread, letting eel serve other calls meanwhile.
+    
+    Args:
+        view: What the request shows, a newer request for the same view replaces it,
+            see RequestExecutor.submit
+        function: Function computing the response
+        *args: Arguments of the function
+        query: Requests for the same view with an equal query do not replace each other
+        
+    Returns:
+        The response, or a failed response with cancelled set if a newer request replaced it
+    """
+    future = app_instance.requests.submit(view, function, *args, query=query)
+    while not future.done():
+        eel.sleep(REQUEST_POLL_INTERVAL)
+    try:
+        return future.result()
+    except RequestCancelled:
+        return {"success": False, "cancelled": True, "message": "Replaced by a newer request"}
+
 # Exposed functions for Eel - these are standalone functions that use the global app_instance
+# Requests reading market data run in worker threads on a snapshot of the filter
 @eel.expose
 def get_locations():
     """Return all available locations for the frontend."""
@@ -41,14 +67,70 @@ def get_market_data(location):
     global app_instance
     logger.info(f"Getting market data for {location}")
     location = SHORTNAME.get(location, location)
-    df = app_instance.analyzer.get_location_data(location, app_instance.filter)
+    filter_obj = app_instance.filter.snapshot()
+    
+    def market_data():
+        df = app_instance.analyzer.get_location_data(location, filter_obj)
+        if df.empty:
+            return {"success": False, "message": f"No data found for {location}"}
+        return {"success": True, "data": encode_frame(df)}
+    
+    return _run_request("market_data", market_data)
+
+@eel.expose
+def get_table_page(table, location, offset=0, limit=TABLE_PAGE_SIZE, sort_by=None, descending=False, search=""):
+    """Get one page of the market data, quick sell or sell order table, sorted and searched on the server."""
+    global app_instance
+    location = SHORTNAME.get(location, location)
+    filter_obj = app_instance.filter.snapshot()
     
-    if df.empty:
-        return {"success": False, "message": f"No data found for {location}"}
+    def table_page():
+        try:
+            page, total = app_instance.analyzer.table_page(table, location, filter_obj, offset, limit,
+                                                           sort_by, bool(descending), search)
+        except (TypeError, ValueError) as e:
+            return {"success": False, "message": str(e)}
         
-    # Convert DataFrame to JSON-serializable format
-    result = df.to_dict(orient='records')
-    return {"success": True, "data": result}
+        if not total and not search:
+            return {"success": False, "message": f"No {table.replace('_', ' ')} data found for {location}"}
+        
+        return {"success": True, "total": total, "offset": offset, "rows": encode_frame(page)}
+    
+    # Other pages of the same sorted and searched table are not replaced
+    query = (location, sort_by, bool(descending), search, filter_obj.fingerprint())
+    return _run_request(("table", table), table_page, query=query)
+
+@eel.expose
+def watch_table(table, location):
+    """Push changed rows of a table to the frontend from now on, call before fetching its rows."""
+    global app_instance
+    location = SHORTNAME.get(location, location)
+    
+    def watch():
+        try:
+            app_instance.live.watch(table, location)
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+        return {"success": True}
+    
+    return _run_request(("watch", table), watch)
+
+@eel.expose
+def unwatch_table(table=None):
+    """Stop pushing changed rows of a table, or of all tables."""
+    global app_instance
+    app_instance.live.unwatch(table)
+    return {"success": True}
+
+def push_table_delta(table, delta):
+    """Send the changed and removed rows of a table to the frontend's applyTableDelta."""
+    eel.applyTableDelta(table, {
+        "location": delta["location"],
+        "total": delta["total"],
+        "added": delta["added"],
+        "changed": encode_frame(delta["changed"]),
+        "removed": encode_frame(delta["removed"])
+    })
 
 @eel.expose
 def compare_markets(royal_city):
@@ -56,31 +138,79 @@ def compare_markets(royal_city):
     global app_instance
     logger.info(f"Comparing {royal_city} with BlackMarket")
     royal_city = SHORTNAME.get(royal_city, royal_city)
+    filter_obj = app_instance.filter.snapshot()
     
-    comparison = app_instance.analyzer.compare_markets(royal_city, app_instance.filter)
+    def compare():
+        comparison = app_instance.analyzer.compare_markets(royal_city, filter_obj)
+        
+        if comparison.empty:
+            return {"success": False, "message": f"No comparison data available for {royal_city}"}
+        
+        # Process quick sell opportunities
+        df_qs = comparison[["name", "enchant", "sell_min_rl", "buy_max_bm", 
+                          "diff_quick_sell", "quick_sell_desired"]]
+        df_qs = df_qs[df_qs["diff_quick_sell"] > filter_obj.diff_show]
+        
+        # Process sell order opportunities
+        df_so = comparison[["name", "enchant", "sell_min_rl", "sell_min_bm", 
+                          "diff_sell_order", "sell_order_desired"]]
+        df_so = df_so[df_so["diff_sell_order"] > filter_obj.diff_show]
+        
+        return {
+            "success": True, 
+            "quick_sell": encode_frame(df_qs), 
+            "sell_order": encode_frame(df_so)
+        }
     
-    if comparison.empty:
-        return {"success": False, "message": f"No comparison data available for {royal_city}"}
+    return _run_request("compare", compare)
+
+@eel.expose
+def get_depth_metrics(buy_city, sell_city="bm"):
+    """Get order book depth metrics for buying in one city and selling in another."""
+    global app_instance
+    logger.info(f"Getting order book depth from {buy_city} to {sell_city}")
+    buy_city = SHORTNAME.get(buy_city, buy_city)
+    sell_city = SHORTNAME.get(sell_city, sell_city)
+    filter_obj = app_instance.filter.snapshot()
     
-    # Process quick sell opportunities
-    df_qs = comparison[["name", "enchant", "sell_min_rl", "buy_max_bm", 
-                      "diff_quick_sell", "quick_sell_desired"]]
-    df_qs = df_qs[df_qs["diff_quick_sell"] > app_instance.filter.diff_show]
+    def depth():
+        df = app_instance.analyzer.depth_metrics(buy_city, sell_city, filter_obj)
+        if df.empty:
+            return {"success": False, "message": f"No order book depth for {buy_city} -> {sell_city}"}
+        return {"success": True, "data": encode_frame(df)}
     
-    # Process sell order opportunities
-    df_so = comparison[["name", "enchant", "sell_min_rl", "sell_min_bm", 
-                      "diff_sell_order", "sell_order_desired"]]
-    df_so = df_so[df_so["diff_sell_order"] > app_instance.filter.diff_show]
+    return _run_request("depth", depth)
+
+@eel.expose
+def plan_trades(buy_city, sell_city, budget, slots, sell_orders=False):
+    """Plan purchases in one city for a silver budget and inventory slots."""
+    global app_instance
+    logger.info(f"Planning trades from {buy_city} to {sell_city} with {budget} silver and {slots} slots")
+    buy_city = SHORTNAME.get(buy_city, buy_city)
+    sell_city = SHORTNAME.get(sell_city, sell_city)
     
-    # Convert DataFrames to JSON-serializable format
-    qs_data = df_qs.to_dict(orient='records')
-    so_data = df_so.to_dict(orient='records')
+    try:
+        budget = float(budget)
+        slots = int(slots)
+    except (TypeError, ValueError):
+        return {"success": False, "message": "Budget and slots must be numbers"}
     
-    return {
-        "success": True, 
-        "quick_sell": qs_data, 
-        "sell_order": so_data
-    }
+    filter_obj = app_instance.filter.snapshot()
+    
+    def plan():
+        df = app_instance.analyzer.plan_trades(buy_city, sell_city, budget, slots, filter_obj, bool(sell_orders))
+        
+        if df.empty:
+            return {"success": False, "message": f"No profitable trades from {buy_city} to {sell_city}"}
+        
+        return {
+            "success": True,
+            "data": encode_frame(df),
+            "spend": float(df["spend"].sum()),
+            "profit": float(df["profit"].sum())
+        }
+    
+    return _run_request("plan", plan)
 
 @eel.expose
 def export_to_csv(location):
@@ -89,7 +219,9 @@ def export_to_csv(location):
     logger.info(f"Exporting {location} data to CSV")
     location = SHORTNAME.get(location, location)
     
-    result = app_instance.analyzer.export_location_to_csv(location, app_instance.filter)
+    # Exports and clears are never replaced by later requests
+    result = _run_request(None, app_instance.analyzer.export_location_to_csv, location,
+                          app_instance.filter.snapshot())
     
     if result:
         return {"success": True, "message": f"Data exported to {result}"}
@@ -103,7 +235,7 @@ def clear_location_data(location):
     logger.info(f"Clearing data for {location}")
     location = SHORTNAME.get(location, location)
     
-    result = app_instance.analyzer.clear_location_data(location)
+    result = _run_request(None, app_instance.analyzer.clear_location_data, location)
     
     if result:
         return {"success": True, "message": f"Data cleared for {location}"}
@@ -141,6 +273,14 @@ def set_diff_filter(diff):
     app_instance.filter.set_diff(float(diff))
     return {"success": True, "message": f"Difference filter set to {diff}"}
 
+@eel.expose
+def set_age_filter(minutes):
+    """Set maximum price age filter in minutes, 0 for any age."""
+    global app_instance
+    logger.info(f"Setting age filter: {minutes}")
+    app_instance.filter.set_max_age(int(minutes or 0))
+    return {"success": True, "message": f"Maximum price age set to {minutes or 0} minutes"}
+
 @eel.expose
 def get_current_filters():
     """Get current filter settings."""
@@ -148,9 +288,16 @@ def get_current_filters():
     return {
         "tier": app_instance.filter.get_tier(),
         "quality": app_instance.filter.get_quality(),
-        "diff": app_instance.filter.get_diff()
+        "diff": app_instance.filter.get_diff(),
+        "age": app_instance.filter.get_max_age()
     }
 
+@eel.expose
+def get_cache_stats():
+    """Get analyzer result cache statistics."""
+    global app_instance
+    return app_instance.analyzer.cache_stats()
+
 class EelMarketApp:
     """
     Eel-based GUI for interacting with the Albion Online market data.
@@ -161,11 +308,15 @@ class EelMarketApp:
         logger.info("Initializing Eel Market Application")
         self.analyzer = MarketAnalyzer()
         self.filter = Filter()
-        logger.info("Using Market.db database with separate tables")
+        self.live = LiveUpdates(self.analyzer, self.filter, push_table_delta)
+        self.requests = RequestExecutor()
+        logger.info("Using the market_prices table of the Market.db database")
     
     def close(self):
         """Close the analyzer and clean up resources."""
         logger.info("Closing Eel app resources")
+        self.live.stop()
+        self.requests.shutdown()
         if self.analyzer:
             self.analyzer.close()
 
@@ -177,6 +328,10 @@ def main():
     app_instance = EelMarketApp()
     
     try:
+        # Push price changes of the open tables while the app runs, the tables
+        # are rebuilt in a worker thread and pushed from eel's loop
+        eel.spawn(app_instance.live.run, eel.sleep, lambda collect: _run_request(None, collect))
+        
         # Start the Eel app
         eel.start('index.html', size=(1200, 800))
     except Exception as e:
@@ -17,11 +17,476 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
 });
 
-// Sort state to keep track of which column is sorted and in which direction
-const sortState = {
-    column: null,
-    ascending: true
-};
+// Rows fetched per page request, rows rendered beyond the visible ones and the row height in pixels
+const PAGE_SIZE = 200;
+const OVERSCAN_ROWS = 10;
+const ROW_HEIGHT = 48;
+
+// Rows sent by the server as columns, see market_app/payload.py. Every column is an array
+// with null for missing values, string columns hold indexes into their dictionary
+class ColumnarRows {
+    constructor(payload) {
+        this.length = payload.length;
+        this.columns = payload.columns;
+        this.dicts = payload.dicts;
+        this.values = {};
+        this.codes = {};
+        payload.columns.forEach((name, index) => {
+            this.values[name] = payload.values[index];
+        });
+    }
+    
+    has(name) {
+        return name in this.values;
+    }
+    
+    // Value of a column in a row, undefined for columns that were not sent
+    get(name, index) {
+        const values = this.values[name];
+        if (!values) {
+            return undefined;
+        }
+        const value = values[index];
+        const dict = this.dicts[name];
+        return dict && value !== null ? dict[value] : value;
+    }
+    
+    // Change the value of a column in a row, adding new strings to the dictionary
+    set(name, index, value) {
+        const values = this.values[name];
+        if (!values) {
+            return;
+        }
+        const dict = this.dicts[name];
+        if (!dict || value === null) {
+            values[index] = value;
+            return;
+        }
+        if (!this.codes[name]) {
+            this.codes[name] = new Map(dict.map((entry, code) => [entry, code]));
+        }
+        let code = this.codes[name].get(value);
+        if (code === undefined) {
+            code = dict.push(value) - 1;
+            this.codes[name].set(value, code);
+        }
+        values[index] = code;
+    }
+}
+
+// Table that only keeps the rows in view in the DOM and fetches them page by page,
+// sorting and searching happen on the server, changed rows are pushed by the server
+class VirtualTable {
+    constructor(containerId, table, keys, columns, emptyMessage) {
+        this.container = document.getElementById(containerId);
+        this.table = table;
+        this.keys = keys;
+        this.columns = columns;
+        this.emptyMessage = emptyMessage;
+        this.location = null;
+        this.sortBy = null;
+        this.descending = false;
+        this.search = '';
+        this.generation = 0;
+        this.reset();
+    }
+    
+    // Forget the fetched rows, responses to older requests are ignored,
+    // kept rows are still shown until their pages are fetched again
+    reset(keepRows = false) {
+        this.stalePages = keepRows ? new Map([...this.stalePages, ...this.pages]) : new Map();
+        this.pages = new Map();
+        this.rowIndex = new Map();
+        this.renderedRows = new Map();
+        this.pending = new Set();
+        if (!keepRows) {
+            this.total = 0;
+        }
+        this.generation++;
+    }
+    
+    // Key of a row, the same for all versions of the row
+    rowKey(rows, index) {
+        return this.keys.map(key => rows.get(key, index)).join('|');
+    }
+    
+    // Replace the table with a message
+    showMessage(message) {
+        this.built = false;
+        this.container.innerHTML = '';
+        const p = document.createElement('p');
+        p.className = 'empty-message';
+        p.textContent = message;
+        this.container.appendChild(p);
+    }
+    
+    // Clear the table
+    clear() {
+        this.location = null;
+        this.reset();
+        this.showMessage(this.emptyMessage);
+        eel.unwatch_table(this.table)();
+    }
+    
+    // Show the table of a location from its first row, returns whether there is data
+    async load(location) {
+        this.location = location;
+        this.search = '';
+        this.reset();
+        // Watch before fetching, so changes made in between are pushed
+        await eel.watch_table(this.table, location)();
+        if (!await this.fetchPage(0)) {
+            return false;
+        }
+        this.build();
+        this.render();
+        return true;
+    }
+    
+    // Fetch one page of rows unless it is already there or on its way
+    async fetchPage(index) {
+        if (this.pages.has(index) || this.pending.has(index)) {
+            return true;
+        }
+        const generation = this.generation;
+        const pending = this.pending;
+        pending.add(index);
+        try {
+            const result = await eel.get_table_page(this.table, this.location, index * PAGE_SIZE, PAGE_SIZE,
+                                                    this.sortBy, this.descending, this.search)();
+            // Replaced by a newer request for this table on the server
+            if (generation !== this.generation || result.cancelled) {
+                return false;
+            }
+            if (!result.success) {
+                this.showMessage(result.message);
+                showNotification(result.message, 'error');
+                return false;
+            }
+            const rows = new ColumnarRows(result.rows);
+            this.pages.set(index, rows);
+            this.stalePages.delete(index);
+            for (let i = 0; i < rows.length; i++) {
+                this.rowIndex.set(this.rowKey(rows, i), index * PAGE_SIZE + i);
+            }
+            this.total = result.total;
+            return true;
+        } catch (error) {
+            showNotification(`Error loading table rows: ${error}`, 'error');
+            return false;
+        } finally {
+            pending.delete(index);
+        }
+    }
+    
+    // Column widths shared by the header and body tables
+    colgroup() {
+        const colgroup = document.createElement('colgroup');
+        this.columns.forEach(column => {
+            const col = document.createElement('col');
+            if (column.width) {
+                col.style.width = column.width;
+            }
+            colgroup.appendChild(col);
+        });
+        return colgroup;
+    }
+    
+    // Create the search box, the header and the scrolling viewport
+    build() {
+        this.container.innerHTML = '';
+        
+        const toolbar = document.createElement('div');
+        toolbar.className = 'table-toolbar';
+        const searchInput = document.createElement('input');
+        searchInput.type = 'search';
+        searchInput.placeholder = 'Search items';
+        searchInput.addEventListener('input', () => {
+            clearTimeout(this.searchTimeout);
+            this.searchTimeout = setTimeout(() => this.setSearch(searchInput.value), 250);
+        });
+        this.countLabel = document.createElement('span');
+        this.countLabel.className = 'row-count';
+        toolbar.append(searchInput, this.countLabel);
+        
+        const headerWrap = document.createElement('div');
+        headerWrap.className = 'virtual-header';
+        const header = document.createElement('table');
+        header.appendChild(this.colgroup());
+        const thead = document.createElement('thead');
+        const headerRow = document.createElement('tr');
+        this.headers = this.columns.map(column => {
+            const th = document.createElement('th');
+            th.textContent = column.label;
+            if (column.sortable !== false) {
+                th.classList.add('sortable');
+                th.addEventListener('click', () => this.sort(column.key));
+            }
+            headerRow.appendChild(th);
+            return th;
+        });
+        thead.appendChild(headerRow);
+        header.appendChild(thead);
+        headerWrap.appendChild(header);
+        
+        this.viewport = document.createElement('div');
+        this.viewport.className = 'virtual-viewport';
+        this.spacer = document.createElement('div');
+        this.spacer.className = 'virtual-spacer';
+        this.body = document.createElement('table');
+        this.body.className = 'virtual-body';
+        this.body.appendChild(this.colgroup());
+        this.tbody = document.createElement('tbody');
+        this.body.appendChild(this.tbody);
+        this.spacer.appendChild(this.body);
+        this.viewport.appendChild(this.spacer);
+        this.viewport.addEventListener('scroll', () => this.scheduleRender());
+        
+        this.container.append(toolbar, headerWrap, this.viewport);
+        this.built = true;
+        this.updateHeaders();
+    }
+    
+    // Show the sort indicator on the sorted column
+    updateHeaders() {
+        this.headers.forEach((th, index) => {
+            th.classList.remove('sort-asc', 'sort-desc');
+            if (this.columns[index].key === this.sortBy) {
+                th.classList.add(this.descending ? 'sort-desc' : 'sort-asc');
+            }
+        });
+    }
+    
+    // Start over from the first row after the sort order or search changed
+    async refetch() {
+        this.reset();
+        if (await this.fetchPage(0) && this.built) {
+            this.viewport.scrollTop = 0;
+            this.render();
+        }
+    }
+    
+    // Sort by a column, clicking the sorted column again reverses the order
+    async sort(key) {
+        if (this.sortBy === key) {
+            this.descending = !this.descending;
+        } else {
+            this.sortBy = key;
+            this.descending = false;
+        }
+        this.updateHeaders();
+        await this.refetch();
+    }
+    
+    // Only show items whose name or ID contains the text
+    async setSearch(text) {
+        this.search = text.trim();
+        await this.refetch();
+    }
+    
+    // Render at the next animation frame, scroll events come faster than that
+    scheduleRender() {
+        if (!this.built || this.frame) {
+            return;
+        }
+        this.frame = requestAnimationFrame(() => {
+            this.frame = null;
+            this.render();
+        });
+    }
+    
+    // Put the rows in view into the DOM and fetch the pages they are on
+    render() {
+        if (!this.built) {
+            return;
+        }
+        this.spacer.style.height = `${this.total * ROW_HEIGHT}px`;
+        this.countLabel.textContent = `${this.total.toLocaleString()} rows`;
+        
+        const visible = Math.ceil(this.viewport.clientHeight / ROW_HEIGHT);
+        let first = Math.max(0, Math.floor(this.viewport.scrollTop / ROW_HEIGHT) - OVERSCAN_ROWS);
+        // Start on an even row so the row stripes do not flip while scrolling
+        first -= first % 2;
+        const last = Math.min(this.total, first + visible + 2 * OVERSCAN_ROWS);
+        
+        const tbody = document.createElement('tbody');
+        const missing = new Set();
+        this.renderedRows = new Map();
+        for (let i = first; i < last; i++) {
+            const index = Math.floor(i / PAGE_SIZE);
+            if (!this.pages.has(index)) {
+                missing.add(index);
+            }
+            const page = this.pages.get(index) || this.stalePages.get(index);
+            const offset = i % PAGE_SIZE;
+            const rows = page && offset < page.length ? page : null;
+            const row = this.renderRow(rows, offset);
+            if (rows) {
+                this.renderedRows.set(this.rowKey(rows, offset), row);
+            }
+            tbody.appendChild(row);
+        }
+        if (!this.total) {
+            const row = document.createElement('tr');
+            const cell = document.createElement('td');
+            cell.colSpan = this.columns.length;
+            cell.className = 'empty-message';
+            cell.textContent = 'No matching items';
+            row.appendChild(cell);
+            tbody.appendChild(row);
+        }
+        this.body.style.transform = `translateY(${first * ROW_HEIGHT}px)`;
+        this.body.replaceChild(tbody, this.tbody);
+        this.tbody = tbody;
+        
+        missing.forEach(index => {
+            this.fetchPage(index).then(loaded => {
+                if (loaded) {
+                    this.scheduleRender();
+                }
+            });
+        });
+    }
+    
+    // Create the row of an item, or an empty row while its page is loading
+    renderRow(rows, index) {
+        const row = document.createElement('tr');
+        this.columns.forEach(column => row.appendChild(this.renderCell(column, rows, index)));
+        return row;
+    }
+    
+    // Create one cell of a row
+    renderCell(column, rows, index) {
+        const cell = document.createElement('td');
+        if (rows) {
+            column.render(cell, rows, index);
+        }
+        return cell;
+    }
+    
+    // Apply rows pushed by the server: changed cells are patched in place, rows that
+    // were added, removed or moved by the sort order make the rows in view be fetched again
+    applyDelta(delta) {
+        if (!this.built || delta.location !== this.location) {
+            return;
+        }
+        let refetch = delta.added > 0 || delta.removed.length > 0;
+        const changed = new ColumnarRows(delta.changed);
+        for (let j = 0; j < changed.length; j++) {
+            const key = this.rowKey(changed, j);
+            const position = this.rowIndex.get(key);
+            if (position === undefined) {
+                // New, or on a page that is not loaded
+                continue;
+            }
+            const rows = this.pages.get(Math.floor(position / PAGE_SIZE));
+            const index = position % PAGE_SIZE;
+            if (this.sortBy && rows.get(this.sortBy, index) !== changed.get(this.sortBy, j)) {
+                refetch = true;
+            }
+            changed.columns.forEach(name => rows.set(name, index, changed.get(name, j)));
+            
+            const row = this.renderedRows.get(key);
+            if (row) {
+                this.columns.forEach((column, c) => {
+                    if (changed.has(column.key)) {
+                        row.replaceChild(this.renderCell(column, rows, index), row.cells[c]);
+                    }
+                });
+                row.classList.remove('row-updated');
+                void row.offsetWidth;  // restart the highlight animation
+                row.classList.add('row-updated');
+            }
+        }
+        if (refetch) {
+            this.reset(true);
+            if (!this.search) {
+                this.total = delta.total;
+            }
+            this.render();
+        }
+    }
+}
+
+// Column showing the item image
+function imageColumn() {
+    return {
+        key: 'id',
+        label: 'Image',
+        sortable: false,
+        width: '70px',
+        render: (cell, rows, index) => cell.appendChild(
+            createItemImage(rows.get('id', index), rows.get('quality', index) || 1, rows.get('name', index)))
+    };
+}
+
+// Column showing a value as text, missing values as N/A
+function textColumn(key, label, format = value => value) {
+    return {
+        key,
+        label,
+        render: (cell, rows, index) => {
+            const value = rows.get(key, index);
+            cell.textContent = value === null ? 'N/A' : format(value);
+        }
+    };
+}
+
+// Column showing a price, missing and zero prices as N/A
+function priceColumn(key, label) {
+    return textColumn(key, label, value => value ? formatPrice(value) : 'N/A');
+}
+
+// Column showing a profit ratio, colored by whether it is profitable
+function ratioColumn(key, label) {
+    return {
+        key,
+        label,
+        render: (cell, rows, index) => {
+            const value = rows.get(key, index);
+            cell.textContent = value ? value.toFixed(2) : 'N/A';
+            cell.classList.add(value > 1 ? 'profit-positive' : 'profit-negative');
+        }
+    };
+}
+
+const marketTable = new VirtualTable('marketDataContainer', 'market', ['id', 'quality'], [
+    imageColumn(),
+    textColumn('name', 'Item Name'),
+    textColumn('enchant', 'Enchantment'),
+    textColumn('quality', 'Quality', getQualityName),
+    priceColumn('sell_min', 'Sell Price (Min)'),
+    priceColumn('buy_max', 'Buy Price (Max)')
+], 'Select a location and click "Show Market Data"');
+
+const quickSellTable = new VirtualTable('quickSellContainer', 'quick_sell', ['id'], [
+    imageColumn(),
+    textColumn('name', 'Item Name'),
+    textColumn('enchant', 'Enchantment'),
+    priceColumn('sell_min_rl', 'Royal Sell Min'),
+    priceColumn('buy_max_bm', 'BM Buy Max'),
+    ratioColumn('diff_quick_sell', 'Profit Ratio'),
+    priceColumn('quick_sell_desired', 'Desired Buy Price')
+], 'Select a location and click "Compare with Black Market"');
+
+const sellOrderTable = new VirtualTable('sellOrderContainer', 'sell_order', ['id'], [
+    imageColumn(),
+    textColumn('name', 'Item Name'),
+    textColumn('enchant', 'Enchantment'),
+    priceColumn('sell_min_rl', 'Royal Sell Min'),
+    priceColumn('sell_min_bm', 'BM Sell Min'),
+    ratioColumn('diff_sell_order', 'Profit Ratio'),
+    priceColumn('sell_order_desired', 'Desired Sell Price')
+], 'Select a location and click "Compare with Black Market"');
+
+// Called by the server with the rows of a table that changed since the last push
+function applyTableDelta(table, delta) {
+    const tables = {market: marketTable, quick_sell: quickSellTable, sell_order: sellOrderTable};
+    if (tables[table]) {
+        tables[table].applyDelta(delta);
+    }
+}
+eel.expose(applyTableDelta);
 
 // Create a placeholder image in the DOM
 function createItemPlaceholder() {
@@ -85,6 +550,7 @@ async function loadCurrentFilters() {
         document.getElementById('tierFilter').value = filters.tier;
         document.getElementById('qualityFilter').value = filters.quality;
         document.getElementById('diffFilter').value = filters.diff;
+        document.getElementById('ageFilter').value = filters.age;
         
         document.getElementById('currentFilters').innerHTML = `
             <p>Current filters:</p>
@@ -92,6 +558,7 @@ async function loadCurrentFilters() {
                 <li>Tier: ${filters.tier || 'None'}</li>
                 <li>Quality: ${filters.quality || 'None'}</li>
                 <li>Minimum Price Difference: ${filters.diff}</li>
+                <li>Maximum Price Age: ${filters.age ? filters.age + ' minutes' : 'Any'}</li>
             </ul>
         `;
     } catch (error) {
@@ -147,6 +614,22 @@ async function setDiffFilter() {
     }
 }
 
+// Set maximum price age filter
+async function setAgeFilter() {
+    const ageFilter = document.getElementById('ageFilter').value;
+    try {
+        const result = await eel.set_age_filter(ageFilter)();
+        if (result.success) {
+            showNotification(result.message, 'success');
+            await loadCurrentFilters();
+        } else {
+            showNotification(result.message, 'error');
+        }
+    } catch (error) {
+        showNotification(`Error setting age filter: ${error}`, 'error');
+    }
+}
+
 // Get market data for a location
 async function getMarketData() {
     const location = document.getElementById('locationSelect').value;
@@ -157,13 +640,8 @@ async function getMarketData() {
     
     try {
         showNotification('Loading market data...', 'success');
-        const result = await eel.get_market_data(location)();
-        if (result.success) {
-            displayMarketData(result.data);
+        if (await marketTable.load(location)) {
             showTab('marketDataTab');
-        } else {
-            document.getElementById('marketDataContainer').innerHTML = `<p class="empty-message">${result.message}</p>`;
-            showNotification(result.message, 'error');
         }
     } catch (error) {
         showNotification(`Error getting market data: ${error}`, 'error');
@@ -185,274 +663,20 @@ function getItemImageUrl(itemId, quality = 1) {
     return `https://render.albiononline.com/v1/item/${identifier}.png?quality=${quality}`;
 }
 
-// Display market data in a table
-function displayMarketData(data) {
-    if (data.length === 0) {
-        document.getElementById('marketDataContainer').innerHTML = '<p class="empty-message">No data available for this location</p>';
-        return;
-    }
-    
-    const table = document.createElement('table');
-    
-    // Create table header
-    const thead = document.createElement('thead');
-    const headerRow = document.createElement('tr');
-    const headers = ['Image', 'Item Name', 'Enchantment', 'Quality', 'Sell Price (Min)', 'Buy Price (Max)'];
-    
-    headers.forEach((headerText, index) => {
-        const th = document.createElement('th');
-        th.textContent = headerText;
-        
-        // Don't add sorting to the Image column
-        if (index > 0) {
-            th.classList.add('sortable');
-            th.addEventListener('click', () => sortTable('marketDataContainer', index, headerText));
-        }
-        
-        headerRow.appendChild(th);
-    });
-    
-    thead.appendChild(headerRow);
-    table.appendChild(thead);
-    
-    // Create table body
-    const tbody = document.createElement('tbody');
-    
-    data.forEach(item => {
-        const row = document.createElement('tr');
-        
-        // Add item image
-        const imgCell = document.createElement('td');
-        const img = document.createElement('img');
-        img.src = getItemImageUrl(item.id, item.quality);
-        img.alt = item.name;
-        img.classList.add('item-image');
-        img.width = 40;
-        img.height = 40;
-        img.onerror = function() {
-            this.src = document.getElementById('item-placeholder').src;
-        };
-        imgCell.appendChild(img);
-        row.appendChild(imgCell);
-        
-        const idCell = document.createElement('td');
-        idCell.textContent = item.name;
-        row.appendChild(idCell);
-        
-        const enchantCell = document.createElement('td');
-        enchantCell.textContent = item.enchant;
-        row.appendChild(enchantCell);
-        
-        const qualityCell = document.createElement('td');
-        qualityCell.textContent = getQualityName(item.quality);
-        row.appendChild(qualityCell);
-        
-        const sellMinCell = document.createElement('td');
-        sellMinCell.textContent = item.sell_min ? formatPrice(item.sell_min) : 'N/A';
-        row.appendChild(sellMinCell);
-        
-        const buyMaxCell = document.createElement('td');
-        buyMaxCell.textContent = item.buy_max ? formatPrice(item.buy_max) : 'N/A';
-        row.appendChild(buyMaxCell);
-        
-        tbody.appendChild(row);
-    });
-    
-    table.appendChild(tbody);
-    document.getElementById('marketDataContainer').innerHTML = '';
-    document.getElementById('marketDataContainer').appendChild(table);
-}
-
-// Display quick sell opportunities
-function displayQuickSellData(data) {
-    if (data.length === 0) {
-        document.getElementById('quickSellContainer').innerHTML = '<p class="empty-message">No quick sell opportunities found</p>';
-        return;
-    }
-    
-    const table = document.createElement('table');
-    
-    // Create table header
-    const thead = document.createElement('thead');
-    const headerRow = document.createElement('tr');
-    const headers = ['Image', 'Item Name', 'Enchantment', 'Royal Sell Min', 'BM Buy Max', 'Profit Ratio', 'Desired Buy Price'];
-    
-    headers.forEach((headerText, index) => {
-        const th = document.createElement('th');
-        th.textContent = headerText;
-        
-        // Don't add sorting to the Image column
-        if (index > 0) {
-            th.classList.add('sortable');
-            th.addEventListener('click', () => sortTable('quickSellContainer', index, headerText));
-        }
-        
-        headerRow.appendChild(th);
-    });
-    
-    thead.appendChild(headerRow);
-    table.appendChild(thead);
-    
-    // Create table body
-    const tbody = document.createElement('tbody');
-    
-    data.forEach(item => {
-        const row = document.createElement('tr');
-        
-        // Add item image
-        const imgCell = document.createElement('td');
-        const img = document.createElement('img');
-        
-        // Attempt to extract item ID from the name (assuming format like "T4_ITEM_NAME")
-        let itemId = item.name;
-        if (item.name && item.name.includes('T')) {
-            const match = item.name.match(/T\d+_[A-Z0-9_]+/);
-            if (match) {
-                itemId = match[0];
-                if (item.enchant > 0) {
-                    itemId += `@${item.enchant}`;
-                }
-            }
-        }
-        
-        img.src = getItemImageUrl(itemId);
-        img.alt = item.name;
-        img.classList.add('item-image');
-        img.width = 40;
-        img.height = 40;
-        img.onerror = function() {
-            this.src = document.getElementById('item-placeholder').src;
-        };
-        imgCell.appendChild(img);
-        row.appendChild(imgCell);
-        
-        const nameCell = document.createElement('td');
-        nameCell.textContent = item.name;
-        row.appendChild(nameCell);
-        
-        const enchantCell = document.createElement('td');
-        enchantCell.textContent = item.enchant;
-        row.appendChild(enchantCell);
-        
-        const sellRlCell = document.createElement('td');
-        sellRlCell.textContent = item.sell_min_rl ? formatPrice(item.sell_min_rl) : 'N/A';
-        row.appendChild(sellRlCell);
-        
-        const buyBmCell = document.createElement('td');
-        buyBmCell.textContent = item.buy_max_bm ? formatPrice(item.buy_max_bm) : 'N/A';
-        row.appendChild(buyBmCell);
-        
-        const diffCell = document.createElement('td');
-        diffCell.textContent = item.diff_quick_sell ? item.diff_quick_sell.toFixed(2) : 'N/A';
-        diffCell.classList.add(item.diff_quick_sell > 1 ? 'profit-positive' : 'profit-negative');
-        row.appendChild(diffCell);
-        
-        const desiredCell = document.createElement('td');
-        desiredCell.textContent = item.quick_sell_desired ? formatPrice(item.quick_sell_desired) : 'N/A';
-        row.appendChild(desiredCell);
-        
-        tbody.appendChild(row);
-    });
-    
-    table.appendChild(tbody);
-    document.getElementById('quickSellContainer').innerHTML = '';
-    document.getElementById('quickSellContainer').appendChild(table);
-}
-
-// Display sell order opportunities
-function displaySellOrderData(data) {
-    if (data.length === 0) {
-        document.getElementById('sellOrderContainer').innerHTML = '<p class="empty-message">No sell order opportunities found</p>';
-        return;
-    }
-    
-    const table = document.createElement('table');
-    
-    // Create table header
-    const thead = document.createElement('thead');
-    const headerRow = document.createElement('tr');
-    const headers = ['Image', 'Item Name', 'Enchantment', 'Royal Sell Min', 'BM Sell Min', 'Profit Ratio', 'Desired Sell Price'];
-    
-    headers.forEach((headerText, index) => {
-        const th = document.createElement('th');
-        th.textContent = headerText;
-        
-        // Don't add sorting to the Image column
-        if (index > 0) {
-            th.classList.add('sortable');
-            th.addEventListener('click', () => sortTable('sellOrderContainer', index, headerText));
-        }
-        
-        headerRow.appendChild(th);
-    });
-    
-    thead.appendChild(headerRow);
-    table.appendChild(thead);
-    
-    // Create table body
-    const tbody = document.createElement('tbody');
-    
-    data.forEach(item => {
-        const row = document.createElement('tr');
-        
-        // Add item image
-        const imgCell = document.createElement('td');
-        const img = document.createElement('img');
-        
-        // Attempt to extract item ID from the name (assuming format like "T4_ITEM_NAME")
-        let itemId = item.name;
-        if (item.name && item.name.includes('T')) {
-            const match = item.name.match(/T\d+_[A-Z0-9_]+/);
-            if (match) {
-                itemId = match[0];
-                if (item.enchant > 0) {
-                    itemId += `@${item.enchant}`;
-                }
-            }
-        }
-        
-        img.src = getItemImageUrl(itemId);
-        img.alt = item.name;
-        img.classList.add('item-image');
-        img.width = 40;
-        img.height = 40;
-        img.onerror = function() {
-            this.src = document.getElementById('item-placeholder').src;
-        };
-        imgCell.appendChild(img);
-        row.appendChild(imgCell);
-        
-        const nameCell = document.createElement('td');
-        nameCell.textContent = item.name;
-        row.appendChild(nameCell);
-        
-        const enchantCell = document.createElement('td');
-        enchantCell.textContent = item.enchant;
-        row.appendChild(enchantCell);
-        
-        const sellRlCell = document.createElement('td');
-        sellRlCell.textContent = item.sell_min_rl ? formatPrice(item.sell_min_rl) : 'N/A';
-        row.appendChild(sellRlCell);
-        
-        const sellBmCell = document.createElement('td');
-        sellBmCell.textContent = item.sell_min_bm ? formatPrice(item.sell_min_bm) : 'N/A';
-        row.appendChild(sellBmCell);
-        
-        const diffCell = document.createElement('td');
-        diffCell.textContent = item.diff_sell_order ? item.diff_sell_order.toFixed(2) : 'N/A';
-        diffCell.classList.add(item.diff_sell_order > 1 ? 'profit-positive' : 'profit-negative');
-        row.appendChild(diffCell);
-        
-        const desiredCell = document.createElement('td');
-        desiredCell.textContent = item.sell_order_desired ? formatPrice(item.sell_order_desired) : 'N/A';
-        row.appendChild(desiredCell);
-        
-        tbody.appendChild(row);
-    });
-    
-    table.appendChild(tbody);
-    document.getElementById('sellOrderContainer').innerHTML = '';
-    document.getElementById('sellOrderContainer').appendChild(table);
+// Create the image of an item, falling back to the placeholder when it cannot be loaded
+function createItemImage(itemId, quality, name) {
+    const img = document.createElement('img');
+    img.src = getItemImageUrl(itemId, quality);
+    img.alt = name || itemId;
+    img.classList.add('item-image');
+    img.width = 40;
+    img.height = 40;
+    img.loading = 'lazy';
+    img.onerror = function() {
+        this.onerror = null;
+        this.src = document.getElementById('item-placeholder').src;
+    };
+    return img;
 }
 
 // Get quality name from quality number
@@ -487,276 +711,15 @@ async function compareWithBlackMarket() {
     
     try {
         showNotification('Comparing markets...', 'success');
-        const result = await eel.compare_markets(location)();
-        
-        if (result.success) {
-            displayQuickSellData(result.quick_sell);
-            displaySellOrderData(result.sell_order);
-            showTab('quickSellTab');
-        } else {
-            document.getElementById('quickSellContainer').innerHTML = `<p class="empty-message">${result.message}</p>`;
-            document.getElementById('sellOrderContainer').innerHTML = `<p class="empty-message">${result.message}</p>`;
-            showNotification(result.message, 'error');
+        const loaded = await Promise.all([quickSellTable.load(location), sellOrderTable.load(location)]);
+        if (loaded.some(Boolean)) {
+            showTab(loaded[0] ? 'quickSellTab' : 'sellOrderTab');
         }
     } catch (error) {
         showNotification(`Error comparing markets: ${error}`, 'error');
     }
 }
 
-// Display quick sell opportunities
-function displayQuickSellData(data) {
-    if (data.length === 0) {
-        document.getElementById('quickSellContainer').innerHTML = '<p class="empty-message">No quick sell opportunities found</p>';
-        return;
-    }
-    
-    const table = document.createElement('table');
-    
-    // Create table header
-    const thead = document.createElement('thead');
-    const headerRow = document.createElement('tr');
-    const headers = ['Image', 'Item Name', 'Enchantment', 'Royal Sell Min', 'BM Buy Max', 'Profit Ratio', 'Desired Buy Price'];
-    
-    headers.forEach((headerText, index) => {
-        const th = document.createElement('th');
-        th.textContent = headerText;
-        
-        // Don't add sorting to the Image column
-        if (index > 0) {
-            th.classList.add('sortable');
-            th.addEventListener('click', () => sortTable('quickSellContainer', index, headerText));
-        }
-        
-        headerRow.appendChild(th);
-    });
-    
-    thead.appendChild(headerRow);
-    table.appendChild(thead);
-    
-    // Create table body
-    const tbody = document.createElement('tbody');
-    
-    data.forEach(item => {
-        const row = document.createElement('tr');
-        
-        // Add item image
-        const imgCell = document.createElement('td');
-        const img = document.createElement('img');
-        
-        // Attempt to extract item ID from the name (assuming format like "T4_ITEM_NAME")
-        let itemId = item.name;
-        if (item.name && item.name.includes('T')) {
-            const match = item.name.match(/T\d+_[A-Z0-9_]+/);
-            if (match) {
-                itemId = match[0];
-                if (item.enchant > 0) {
-                    itemId += `@${item.enchant}`;
-                }
-            }
-        }
-        
-        img.src = getItemImageUrl(itemId);
-        img.alt = item.name;
-        img.classList.add('item-image');
-        img.width = 40;
-        img.height = 40;
-        img.onerror = function() {
-            this.src = document.getElementById('item-placeholder').src;
-        };
-        imgCell.appendChild(img);
-        row.appendChild(imgCell);
-        
-        const nameCell = document.createElement('td');
-        nameCell.textContent = item.name;
-        row.appendChild(nameCell);
-        
-        const enchantCell = document.createElement('td');
-        enchantCell.textContent = item.enchant;
-        row.appendChild(enchantCell);
-        
-        const sellRlCell = document.createElement('td');
-        sellRlCell.textContent = item.sell_min_rl ? formatPrice(item.sell_min_rl) : 'N/A';
-        row.appendChild(sellRlCell);
-        
-        const buyBmCell = document.createElement('td');
-        buyBmCell.textContent = item.buy_max_bm ? formatPrice(item.buy_max_bm) : 'N/A';
-        row.appendChild(buyBmCell);
-        
-        const diffCell = document.createElement('td');
-        diffCell.textContent = item.diff_quick_sell ? item.diff_quick_sell.toFixed(2) : 'N/A';
-        diffCell.classList.add(item.diff_quick_sell > 1 ? 'profit-positive' : 'profit-negative');
-        row.appendChild(diffCell);
-        
-        const desiredCell = document.createElement('td');
-        desiredCell.textContent = item.quick_sell_desired ? formatPrice(item.quick_sell_desired) : 'N/A';
-        row.appendChild(desiredCell);
-        
-        tbody.appendChild(row);
-    });
-    
-    table.appendChild(tbody);
-    document.getElementById('quickSellContainer').innerHTML = '';
-    document.getElementById('quickSellContainer').appendChild(table);
-}
-
-// Display sell order opportunities
-function displaySellOrderData(data) {
-    if (data.length === 0) {
-        document.getElementById('sellOrderContainer').innerHTML = '<p class="empty-message">No sell order opportunities found</p>';
-        return;
-    }
-    
-    const table = document.createElement('table');
-    
-    // Create table header
-    const thead = document.createElement('thead');
-    const headerRow = document.createElement('tr');
-    const headers = ['Image', 'Item Name', 'Enchantment', 'Royal Sell Min', 'BM Sell Min', 'Profit Ratio', 'Desired Sell Price'];
-    
-    headers.forEach((headerText, index) => {
-        const th = document.createElement('th');
-        th.textContent = headerText;
-        
-        // Don't add sorting to the Image column
-        if (index > 0) {
-            th.classList.add('sortable');
-            th.addEventListener('click', () => sortTable('sellOrderContainer', index, headerText));
-        }
-        
-        headerRow.appendChild(th);
-    });
-    
-    thead.appendChild(headerRow);
-    table.appendChild(thead);
-    
-    // Create table body
-    const tbody = document.createElement('tbody');
-    
-    data.forEach(item => {
-        const row = document.createElement('tr');
-        
-        // Add item image
-        const imgCell = document.createElement('td');
-        const img = document.createElement('img');
-        
-        // Attempt to extract item ID from the name (assuming format like "T4_ITEM_NAME")
-        let itemId = item.name;
-        if (item.name && item.name.includes('T')) {
-            const match = item.name.match(/T\d+_[A-Z0-9_]+/);
-            if (match) {
-                itemId = match[0];
-                if (item.enchant > 0) {
-                    itemId += `@${item.enchant}`;
-                }
-            }
-        }
-        
-        img.src = getItemImageUrl(itemId);
-        img.alt = item.name;
-        img.classList.add('item-image');
-        img.width = 40;
-        img.height = 40;
-        img.onerror = function() {
-            this.src = document.getElementById('item-placeholder').src;
-        };
-        imgCell.appendChild(img);
-        row.appendChild(imgCell);
-        
-        const nameCell = document.createElement('td');
-        nameCell.textContent = item.name;
-        row.appendChild(nameCell);
-        
-        const enchantCell = document.createElement('td');
-        enchantCell.textContent = item.enchant;
-        row.appendChild(enchantCell);
-        
-        const sellRlCell = document.createElement('td');
-        sellRlCell.textContent = item.sell_min_rl ? formatPrice(item.sell_min_rl) : 'N/A';
-        row.appendChild(sellRlCell);
-        
-        const sellBmCell = document.createElement('td');
-        sellBmCell.textContent = item.sell_min_bm ? formatPrice(item.sell_min_bm) : 'N/A';
-        row.appendChild(sellBmCell);
-        
-        const diffCell = document.createElement('td');
-        diffCell.textContent = item.diff_sell_order ? item.diff_sell_order.toFixed(2) : 'N/A';
-        diffCell.classList.add(item.diff_sell_order > 1 ? 'profit-positive' : 'profit-negative');
-        row.appendChild(diffCell);
-        
-        const desiredCell = document.createElement('td');
-        desiredCell.textContent = item.sell_order_desired ? formatPrice(item.sell_order_desired) : 'N/A';
-        row.appendChild(desiredCell);
-        
-        tbody.appendChild(row);
-    });
-    
-    table.appendChild(tbody);
-    document.getElementById('sellOrderContainer').innerHTML = '';
-    document.getElementById('sellOrderContainer').appendChild(table);
-}
-
-// Function to sort table by column
-function sortTable(containerId, columnIndex, headerText) {
-    const container = document.getElementById(containerId);
-    const table = container.querySelector('table');
-    const tbody = table.querySelector('tbody');
-    const rows = Array.from(tbody.querySelectorAll('tr'));
-    
-    // Toggle sorting direction if clicking the same column again
-    if (sortState.column === headerText) {
-        sortState.ascending = !sortState.ascending;
-    } else {
-        sortState.column = headerText;
-        sortState.ascending = true;
-    }
-    
-    // Update sort indicators in table headers
-    const headers = table.querySelectorAll('th');
-    headers.forEach(header => {
-        header.classList.remove('sort-asc', 'sort-desc');
-    });
-    
-    // Add sort indicator to the current header
-    const currentHeader = headers[columnIndex];
-    currentHeader.classList.add(sortState.ascending ? 'sort-asc' : 'sort-desc');
-    
-    // Sort rows
-    rows.sort((rowA, rowB) => {
-        // Get cell content, skip the image cell if it exists
-        const cellA = rowA.cells[columnIndex].textContent.trim();
-        const cellB = rowB.cells[columnIndex].textContent.trim();
-        
-        // Handle numeric values (like prices and profit ratios)
-        if (!isNaN(parseFloat(cellA)) && !isNaN(parseFloat(cellB))) {
-            const numA = parseFloat(cellA.replace(/,/g, ''));
-            const numB = parseFloat(cellB.replace(/,/g, ''));
-            
-            return sortState.ascending ? numA - numB : numB - numA;
-        }
-        
-        // Handle N/A values
-        if (cellA === 'N/A' && cellB !== 'N/A') return sortState.ascending ? 1 : -1;
-        if (cellA !== 'N/A' && cellB === 'N/A') return sortState.ascending ? -1 : 1;
-        if (cellA === 'N/A' && cellB === 'N/A') return 0;
-        
-        // Default to string comparison
-        return sortState.ascending ? 
-            cellA.localeCompare(cellB) : 
-            cellB.localeCompare(cellA);
-    });
-    
-    // Remove all existing rows
-    while (tbody.firstChild) {
-        tbody.removeChild(tbody.firstChild);
-    }
-    
-    // Add sorted rows back to the table
-    rows.forEach(row => tbody.appendChild(row));
-    
-    // Show notification about sorting
-    showNotification(`Sorted by ${headerText} ${sortState.ascending ? 'ascending' : 'descending'}`, 'success');
-}
-
 // Export to CSV
 async function exportToCsv() {
     const location = document.getElementById('locationSelect').value;
@@ -792,9 +755,9 @@ async function clearLocationData() {
     try {
         const result = await eel.clear_location_data(location)();
         if (result.success) {
-            document.getElementById('marketDataContainer').innerHTML = '<p class="empty-message">Select a location and click "Show Market Data"</p>';
-            document.getElementById('quickSellContainer').innerHTML = '<p class="empty-message">Select a location and click "Compare with Black Market"</p>';
-            document.getElementById('sellOrderContainer').innerHTML = '<p class="empty-message">Select a location and click "Compare with Black Market"</p>';
+            marketTable.clear();
+            quickSellTable.clear();
+            sellOrderTable.clear();
             showNotification(result.message, 'success');
         } else {
             showNotification(result.message, 'error');
@@ -825,6 +788,9 @@ function showTab(tabId) {
     if (activeButton) {
         activeButton.classList.add('active');
     }
+    
+    // Hidden tables have no height, render the rows that came into view
+    [marketTable, quickSellTable, sellOrderTable].forEach(table => table.scheduleRender());
 }
 
 // Show notification